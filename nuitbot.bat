@@ -18,5 +18,6 @@ if not exist ".venv" (
     call .venv\Scripts\activate.bat
 )
 
-rem Start the Flask server for authentication
-flask --app src/main run 
\ No newline at end of file
+rem Start the bot with the cached Twitch tokens (authorizing in the browser the
+rem first time) and serve the overlays, metrics and status pages
+python src\cli.py --web %* 
\ No newline at end of file
@@ -20,5 +20,6 @@ if (-not (Test-Path -Path ".venv")) {
     & .\.venv\Scripts\Activate.ps1
 }
 
-# Start the Flask server for authentication
-flask --app src/main run
+# Start the bot with the cached Twitch tokens (authorizing in the browser the
+# first time) and serve the overlays, metrics and status pages
+python src/cli.py --web @args
@@ -0,0 +1,364 @@
+# Standard library imports
+import asyncio
+import os
+import string
+import time
+from collections import deque
+from typing import Callable, Optional
+
+# Local imports
+from metrics import histogram
+
+ANALYTICS_SECONDS = histogram("nuitbot_trending_seconds", "Time spent counting one chat message for the trending stats")
+
+# Seconds of chat the trending stats cover, and how many steps the window
+# slides in (counts leave the window one step at a time)
+TRENDING_WINDOW_SECONDS = float(os.getenv("TRENDING_WINDOW_SECONDS", "300"))
+TRENDING_BUCKETS = int(os.getenv("TRENDING_BUCKETS", "10"))
+
+# Emotes and words listed per channel
+TRENDING_TOP = int(os.getenv("TRENDING_TOP", "10"))
+
+# Count-min sketch size: counters per row and rows. Counts are overestimated
+# by at most about 2.7 / width of the window's total, with a probability
+# that falls exponentially with the number of rows
+TRENDING_SKETCH_WIDTH = int(os.getenv("TRENDING_SKETCH_WIDTH", "512"))
+TRENDING_SKETCH_DEPTH = int(os.getenv("TRENDING_SKETCH_DEPTH", "4"))
+
+# At most this many distinct words of one message are counted, so a wall of
+# text costs no more than a normal message
+MAX_WORDS = 25
+
+# Characters stripped from both ends of a word
+_PUNCTUATION = string.punctuation + "…“”‘’"
+
+# Words too common to ever be interesting
+STOP_WORDS = frozenset("""
+a an and are as at be but by can do for from have he her his i i'm im in is it it's its just me my no not of on or
+so that the this to u was we what with you your
+""".split())
+
+_MASK = (1 << 64) - 1
+
+class SlidingCountMin:
+    """Count-min sketch over a sliding time window.
+
+    The window is split into buckets, each with its own sketch, and a
+    running total sketch is kept next to them. Counting touches only the
+    newest bucket and the total; rotating subtracts the oldest bucket from
+    the total and starts an empty newest one. Memory is fixed by the sketch
+    size, however many distinct keys are counted.
+    """
+
+    def __init__(self, width: int, depth: int, buckets: int) -> None:
+        """Initialize an empty sketch.
+
+        Args:
+            width: Counters per row
+            depth: Rows, each with its own hash
+            buckets: Steps the window slides in
+        """
+        self.width = width
+        self.depth = depth
+        self._offsets = [row * width for row in range(depth)]
+        self._total = [0] * (width * depth)
+        self._buckets = deque([0] * (width * depth) for _ in range(buckets))
+
+    def _indexes(self, key: str) -> list[int]:
+        """The counter of the key in every row, from two halves of one hash (double hashing)."""
+        h = hash(key) & _MASK
+        step = (h >> 32) | 1
+        width = self.width
+        return [offset + (h + row * step) % width for row, offset in enumerate(self._offsets)]
+
+    def add(self, key: str) -> int:
+        """Count a key once.
+
+        Returns:
+            The key's estimated count in the window, this one included
+        """
+        # Same indexes as _indexes(), inlined because this runs for every word of every message
+        h = hash(key) & _MASK
+        step = (h >> 32) | 1
+        width = self.width
+        total = self._total
+        current = self._buckets[-1]
+        estimate = _MASK
+        for offset in self._offsets:
+            index = offset + h % width
+            h += step
+            current[index] += 1
+            count = total[index] = total[index] + 1
+            if count < estimate:
+                estimate = count
+        return estimate
+
+    def estimate(self, key: str) -> int:
+        """A key's estimated count in the window (never less than the true count)."""
+        total = self._total
+        return min(total[index] for index in self._indexes(key))
+
+    def rotate(self) -> None:
+        """Slide the window by one bucket, forgetting the oldest counts."""
+        oldest = self._buckets.popleft()
+        self._total = [count - old for count, old in zip(self._total, oldest)]
+        self._buckets.append([0] * len(oldest))
+
+class TopK:
+    """The keys with the highest counts, tracked from a sketch's estimates.
+
+    Keeps a few more candidates than it reports, so keys near the cut-off
+    are not lost to estimation noise. A key enters once its estimate beats
+    the weakest candidate; candidate counts are refreshed from the sketch
+    whenever the window slides.
+    """
+
+    def __init__(self, size: int, spare: int) -> None:
+        """Initialize an empty tracker.
+
+        Args:
+            size: Keys reported
+            spare: Extra candidates kept beyond size
+        """
+        self.size = size
+        self._capacity = size + spare
+        self._counts: dict[str, int] = {}
+        # Extra details of the candidates (e.g. emote IDs), dropped with them
+        self._details: dict[str, str] = {}
+        self._weakest: Optional[str] = None
+
+    def offer(self, key: str, count: int, detail: str = "") -> None:
+        """Update a key's count, admitting it if it beats the weakest candidate.
+
+        Args:
+            key: The key
+            count: Its current estimated count
+            detail: Kept next to the key while it is a candidate
+        """
+        counts = self._counts
+        if key in counts:
+            counts[key] = count
+            if key == self._weakest:
+                self._weakest = min(counts, key=counts.__getitem__)
+            return
+
+        if len(counts) < self._capacity:
+            weakest = self._weakest
+            if weakest is None or count < counts[weakest]:
+                self._weakest = key
+        else:
+            weakest = self._weakest
+            if count <= counts[weakest]:
+                return
+            del counts[weakest]
+            self._details.pop(weakest, None)
+        counts[key] = count
+        if detail:
+            self._details[key] = detail
+        if len(counts) == self._capacity:
+            self._weakest = min(counts, key=counts.__getitem__)
+
+    def refresh(self, estimate: Callable[[str], int]) -> None:
+        """Re-estimate every candidate, dropping those no longer in the window."""
+        counts = self._counts
+        for key in list(counts):
+            count = estimate(key)
+            if count > 0:
+                counts[key] = count
+            else:
+                del counts[key]
+                self._details.pop(key, None)
+        self._weakest = min(counts, key=counts.__getitem__) if counts else None
+
+    def top(self, limit: Optional[int] = None) -> list[tuple[str, int, str]]:
+        """The highest counted keys with their counts and details, highest first."""
+        ranked = sorted(self._counts.items(), key=lambda item: item[1], reverse=True)
+        details = self._details
+        return [(key, count, details.get(key, "")) for key, count in ranked[:self.size if limit is None else limit]]
+
+class TrendingCounter:
+    """Sliding-window counts of keys and their current top list."""
+
+    def __init__(self, top: int, width: int, depth: int, buckets: int) -> None:
+        """Initialize an empty counter.
+
+        Args:
+            top: Keys in the top list
+            width: Sketch counters per row
+            depth: Sketch rows
+            buckets: Steps the window slides in
+        """
+        self.sketch = SlidingCountMin(width, depth, buckets)
+        self.top = TopK(top, top)
+
+    def add(self, key: str, detail: str = "") -> None:
+        """Count a key once.
+
+        Args:
+            key: What is counted, e.g. an emote name
+            detail: Shown next to the key while it is a candidate
+        """
+        self.top.offer(key, self.sketch.add(key), detail)
+
+    def rotate(self) -> None:
+        """Slide the window by one bucket."""
+        self.sketch.rotate()
+        self.top.refresh(self.sketch.estimate)
+
+def parse_emotes(text: str, tag: str) -> dict[str, str]:
+    """Find the emotes in a chat message.
+
+    Args:
+        text: Message text
+        tag: The message's "emotes" tag, e.g. "25:0-4,12-16/1902:6-10"
+
+    Returns:
+        Emote names (as typed) to emote IDs, each emote once
+    """
+    emotes: dict[str, str] = {}
+    if not tag:
+        return emotes
+    for emote in tag.split("/"):
+        emote_id, _, positions = emote.partition(":")
+        # Every position is the same emote, so the first one names it
+        first = positions.split(",", 1)[0]
+        start, _, end = first.partition("-")
+        try:
+            name = text[int(start):int(end) + 1]
+        except ValueError:
+            continue
+        if name:
+            emotes[name] = emote_id
+    return emotes
+
+def words(text: str, skip: Optional[dict[str, str]] = None) -> set[str]:
+    """The distinct countable words of a chat message.
+
+    Lowercased and stripped of punctuation. Stop words, mentions, links,
+    and anything in skip (the message's emotes) are left out.
+
+    Args:
+        text: Message text
+        skip: Tokens to leave out
+
+    Returns:
+        At most MAX_WORDS words
+    """
+    found: set[str] = set()
+    for token in text.split():
+        if skip and token in skip:
+            continue
+        if token.startswith("@") or "://" in token:
+            continue
+        word = token.strip(_PUNCTUATION).lower()
+        if len(word) < 2 or word in STOP_WORDS:
+            continue
+        found.add(word)
+        if len(found) >= MAX_WORDS:
+            break
+    return found
+
+class _ChannelStats:
+    """Trending emotes and words of one channel."""
+
+    def __init__(self, top: int, width: int, depth: int, buckets: int) -> None:
+        self.emotes = TrendingCounter(top, width, depth, buckets)
+        self.words = TrendingCounter(top, width, depth, buckets)
+        self.messages = deque([0] * buckets)
+
+    def rotate(self) -> None:
+        self.emotes.rotate()
+        self.words.rotate()
+        self.messages.popleft()
+        self.messages.append(0)
+
+class ChatAnalytics:
+    """Live "trending in chat" stats: the most used emotes and words per channel.
+
+    Counting a message costs a few list increments per emote and word, so
+    it runs inline on every message; memory per channel is fixed by the
+    sketch size. The window slides on a timer in run().
+    """
+
+    def __init__(
+        self,
+        window: float = TRENDING_WINDOW_SECONDS,
+        buckets: int = TRENDING_BUCKETS,
+        top: int = TRENDING_TOP,
+        width: int = TRENDING_SKETCH_WIDTH,
+        depth: int = TRENDING_SKETCH_DEPTH,
+    ) -> None:
+        """Initialize empty stats.
+
+        Args:
+            window: Seconds of chat the stats cover
+            buckets: Steps the window slides in
+            top: Emotes and words listed per channel
+            width: Sketch counters per row
+            depth: Sketch rows
+        """
+        self.window = window
+        self._buckets = max(1, buckets)
+        self._top = top
+        self._width = width
+        self._depth = depth
+        self._channels: dict[str, _ChannelStats] = {}
+
+    def record(self, channel: str, text: str, emotes_tag: str = "") -> None:
+        """Count a chat message.
+
+        Args:
+            channel: Channel name (without "#" prefix)
+            text: Message text
+            emotes_tag: The message's "emotes" tag
+        """
+        start = time.perf_counter()
+        stats = self._channels.get(channel)
+        if stats is None:
+            stats = self._channels[channel] = _ChannelStats(self._top, self._width, self._depth, self._buckets)
+        stats.messages[-1] += 1
+
+        emotes = parse_emotes(text, emotes_tag)
+        for name, emote_id in emotes.items():
+            stats.emotes.add(name, emote_id)
+
+        # Commands are not chat
+        if not text.startswith(("!", "#")):
+            for word in words(text, emotes):
+                stats.words.add(word)
+        ANALYTICS_SECONDS.observe(time.perf_counter() - start)
+
+    def trending(self, channel: str, limit: Optional[int] = None) -> dict:
+        """A snapshot of a channel's stats, for overlays.
+
+        Args:
+            channel: Channel name (without "#" prefix)
+            limit: Emotes and words listed (default: the configured top size)
+
+        Returns:
+            The window length, messages in it, and the top emotes (name, ID,
+            count) and words (word, count), highest first
+        """
+        stats = self._channels.get(channel)
+        if stats is None:
+            return {"window_seconds": self.window, "messages": 0, "emotes": [], "words": []}
+        return {
+            "window_seconds": self.window,
+            "messages": sum(stats.messages),
+            "emotes": [
+                {"name": name, "id": emote_id, "count": count}
+                for name, count, emote_id in stats.emotes.top.top(limit)
+            ],
+            "words": [{"word": word, "count": count} for word, count, _ in stats.words.top.top(limit)],
+        }
+
+    def rotate(self) -> None:
+        """Slide every channel's window by one bucket."""
+        for stats in self._channels.values():
+            stats.rotate()
+
+    async def run(self) -> None:
+        """Slide the window on a timer until cancelled."""
+        while True:
+            await asyncio.sleep(self.window / self._buckets)
+            self.rotate()
@@ -0,0 +1,445 @@
+# Standard library imports
+import asyncio
+import os
+import shutil
+import subprocess
+import threading
+import time
+import warnings
+import wave
+from array import array
+from typing import Optional
+
+# Optional imports
+with warnings.catch_warnings():
+    # audioop is deprecated since Python 3.11; the audioop-lts package provides it on 3.13+
+    warnings.simplefilter("ignore", DeprecationWarning)
+    try:
+        import audioop
+    except ImportError:
+        audioop = None
+
+try:
+    import alsaaudio
+except ImportError:
+    alsaaudio = None
+
+# Local imports
+from log import get_logger
+from metrics import histogram
+
+log = get_logger("audio")
+
+TRIGGER_SECONDS = histogram("nuitbot_sound_trigger_seconds", "Time from play() until the first block of a sound was written to the sink")
+
+# Every sound is converted to this format when it is loaded
+SAMPLE_RATE = 44100
+CHANNELS = 2
+SAMPLE_WIDTH = 2  # 16-bit signed little-endian
+FRAME_SIZE = CHANNELS * SAMPLE_WIDTH
+
+# Frames mixed per block (about 12 ms at 44.1 kHz)
+BLOCK_FRAMES = 512
+BLOCK_BYTES = BLOCK_FRAMES * FRAME_SIZE
+BLOCK_SECONDS = BLOCK_FRAMES / SAMPLE_RATE
+
+# A failing sink fails every block, so its errors are logged at most this often
+SINK_ERROR_LOG_SECONDS = 30.0
+
+def _convert(data: bytes, channels: int, width: int, rate: int) -> bytes:
+    """Convert raw PCM to the engine format."""
+    if (channels, width, rate) == (CHANNELS, SAMPLE_WIDTH, SAMPLE_RATE):
+        return data
+    if audioop is None:
+        raise ValueError(f"unsupported format ({channels}ch, {width * 8}-bit, {rate} Hz) and audioop is not available")
+
+    if width == 1:
+        # 8-bit WAV is unsigned
+        data = audioop.bias(data, 1, -128)
+    if width != SAMPLE_WIDTH:
+        data = audioop.lin2lin(data, width, SAMPLE_WIDTH)
+    if channels == 2 and CHANNELS == 1:
+        data = audioop.tomono(data, SAMPLE_WIDTH, 0.5, 0.5)
+    elif channels == 1 and CHANNELS == 2:
+        data = audioop.tostereo(data, SAMPLE_WIDTH, 1, 1)
+    elif channels != CHANNELS:
+        raise ValueError(f"unsupported channel count {channels}")
+    if rate != SAMPLE_RATE:
+        data, _ = audioop.ratecv(data, SAMPLE_WIDTH, CHANNELS, rate, SAMPLE_RATE, None)
+    return data
+
+def load_sounds(directory: str) -> dict[str, bytes]:
+    """Decode every WAV file in a directory into engine-format PCM.
+
+    Args:
+        directory: Directory containing .wav files
+
+    Returns:
+        Mapping of sound name (file name without extension) to PCM data
+    """
+    sounds: dict[str, bytes] = {}
+    for filename in sorted(os.listdir(directory)):
+        name, extension = os.path.splitext(filename)
+        if extension.lower() != ".wav":
+            continue
+
+        try:
+            with wave.open(os.path.join(directory, filename), "rb") as wav:
+                data = wav.readframes(wav.getnframes())
+                sounds[name] = _convert(data, wav.getnchannels(), wav.getsampwidth(), wav.getframerate())
+        except (wave.Error, ValueError) as e:
+            log.warning("Audio: Skipping %s: %s", filename, e)
+    return sounds
+
+def _scale(data: bytes, gain: float) -> bytes:
+    """Apply a gain to a block of samples."""
+    if gain == 1.0:
+        return data
+    if audioop is not None:
+        return audioop.mul(data, SAMPLE_WIDTH, gain)
+
+    samples = array("h", data)
+    for i, sample in enumerate(samples):
+        samples[i] = max(-32768, min(32767, int(sample * gain)))
+    return samples.tobytes()
+
+def _add(a: bytes, b: bytes) -> bytes:
+    """Mix two blocks of the same length with clipping."""
+    if audioop is not None:
+        return audioop.add(a, b, SAMPLE_WIDTH)
+
+    left = array("h", a)
+    right = array("h", b)
+    for i, sample in enumerate(right):
+        left[i] = max(-32768, min(32767, left[i] + sample))
+    return left.tobytes()
+
+class Voice:
+    """A sound that is currently playing.
+
+    Attributes:
+        name: Name of the sound
+        gain: Volume multiplier for this voice
+    """
+
+    def __init__(self, name: str, data: bytes, gain: float, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        self.name = name
+        self.gain = gain
+        self.triggered_at = time.perf_counter()
+        self._data = data
+        self._position = 0
+        self._stopped = False
+        self._loop = loop
+        self._done = loop.create_future() if loop else None
+
+    def _read(self, size: int) -> bytes:
+        """Take the next block of samples (mixer thread only)."""
+        if self._stopped:
+            return b""
+        chunk = self._data[self._position:self._position + size]
+        self._position += len(chunk)
+        return chunk
+
+    @property
+    def finished(self) -> bool:
+        """True once the whole sound was mixed or the voice was stopped."""
+        return self._stopped or self._position >= len(self._data)
+
+    def stop(self) -> None:
+        """Stop the voice at the next block."""
+        self._stopped = True
+
+    def _finish(self) -> None:
+        """Resolve the waiting future (mixer thread only)."""
+        if self._done is not None:
+            try:
+                self._loop.call_soon_threadsafe(lambda: self._done.done() or self._done.set_result(None))
+            except RuntimeError:
+                # The event loop is already closed
+                pass
+
+    async def wait(self) -> None:
+        """Wait until the voice finished playing. Cancelling the wait stops the voice."""
+        if self._done is None:
+            raise RuntimeError("Voice was not started from an event loop")
+        try:
+            await asyncio.shield(self._done)
+        except asyncio.CancelledError:
+            self.stop()
+            raise
+
+class NullSink:
+    """Sink that discards audio. Used for headless runs and benchmarks.
+
+    Attributes:
+        realtime: Pace output at the playback rate if True
+        first_sample_at: perf_counter() time the first non-silent block was written
+    """
+
+    def __init__(self, realtime: bool = False) -> None:
+        self.realtime = realtime
+        self.first_sample_at: Optional[float] = None
+        self.bytes_written = 0
+
+    def open(self) -> None:
+        """Nothing to open."""
+
+    def write(self, data: bytes) -> None:
+        """Count the data and note when the first audible block arrives."""
+        if self.first_sample_at is None and data.strip(b"\x00"):
+            self.first_sample_at = time.perf_counter()
+        self.bytes_written += len(data)
+
+    def close(self) -> None:
+        """Nothing to close."""
+
+class FileSink:
+    """Sink that writes everything it is given into a WAV file."""
+
+    realtime = False
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._wav: Optional[wave.Wave_write] = None
+
+    def open(self) -> None:
+        self._wav = wave.open(self._path, "wb")
+        self._wav.setnchannels(CHANNELS)
+        self._wav.setsampwidth(SAMPLE_WIDTH)
+        self._wav.setframerate(SAMPLE_RATE)
+
+    def write(self, data: bytes) -> None:
+        self._wav.writeframes(data)
+
+    def close(self) -> None:
+        if self._wav is not None:
+            self._wav.close()
+            self._wav = None
+
+class AlsaSink:
+    """Sink that plays audio on an ALSA device.
+
+    Uses pyalsaaudio when it is installed. Otherwise a single long-lived
+    aplay process is fed raw PCM over stdin, so there is still no process
+    spawn or disk read per sound.
+    """
+
+    realtime = True
+
+    def __init__(self, device: str = "default") -> None:
+        self._device = device
+        self._pcm = None
+        self._proc: Optional[subprocess.Popen] = None
+
+    def open(self) -> None:
+        if alsaaudio is not None:
+            self._pcm = alsaaudio.PCM(
+                alsaaudio.PCM_PLAYBACK,
+                device=self._device,
+                channels=CHANNELS,
+                rate=SAMPLE_RATE,
+                format=alsaaudio.PCM_FORMAT_S16_LE,
+                periodsize=BLOCK_FRAMES,
+            )
+            return
+
+        if shutil.which("aplay") is None:
+            raise RuntimeError("neither pyalsaaudio nor aplay is available")
+        self._proc = subprocess.Popen(
+            ["aplay", "-q", "-D", self._device, "-t", "raw", "-f", "S16_LE",
+             "-r", str(SAMPLE_RATE), "-c", str(CHANNELS)],
+            stdin=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def write(self, data: bytes) -> None:
+        if self._pcm is not None:
+            self._pcm.write(data)
+        elif self._proc is not None:
+            self._proc.stdin.write(data)
+            self._proc.stdin.flush()
+
+    def close(self) -> None:
+        if self._pcm is not None:
+            self._pcm.close()
+            self._pcm = None
+        if self._proc is not None:
+            self._proc.stdin.close()
+            self._proc.wait()
+            self._proc = None
+
+def create_sink(spec: str):
+    """Create a sink from a config string.
+
+    Args:
+        spec: "alsa", "alsa:<device>", "file:<path>" or "null"
+
+    Returns:
+        The sink instance
+    """
+    kind, _, argument = spec.partition(":")
+    if kind == "alsa":
+        return AlsaSink(argument or "default")
+    if kind == "file":
+        return FileSink(argument or "nuitbot_audio.wav")
+    if kind == "null":
+        return NullSink()
+    raise ValueError(f"Unknown audio sink: {spec}")
+
+class AudioEngine:
+    """Mixes preloaded sounds on a dedicated audio thread.
+
+    All sounds are decoded once at startup. Triggering a sound only adds a
+    voice to the mixer, so several sounds can overlap, each with its own gain.
+    """
+
+    def __init__(self, sounds: dict[str, bytes], sink, master_gain: float = 1.0, lead: float = 0.05) -> None:
+        """Initialize the engine.
+
+        Args:
+            sounds: Preloaded PCM data by name (see load_sounds)
+            sink: Where mixed audio is written
+            master_gain: Volume multiplier applied to every voice
+            lead: How far ahead of real time a realtime sink may be fed, in seconds
+        """
+        self.sounds = sounds
+        self.master_gain = master_gain
+        self._sink = sink
+        self._lead = lead
+
+        self._voices: list[Voice] = []
+        # Voices whose first block is in the block being written (mixer thread only)
+        self._started: list[Voice] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+    @property
+    def active(self) -> int:
+        """Number of voices currently playing."""
+        return len(self._voices)
+
+    def start(self) -> None:
+        """Open the sink and start the mixer thread."""
+        if self._thread is not None:
+            return
+
+        self._sink.open()
+        self._running = True
+        self._thread = threading.Thread(target=self._mix_loop, name="nuitbot-audio", daemon=True)
+        self._thread.start()
+
+    def play(self, name: str, gain: float = 1.0) -> Voice:
+        """Start playing a sound.
+
+        Args:
+            name: Sound name (WAV file name without extension)
+            gain: Volume multiplier for this voice
+
+        Returns:
+            The playing voice; await voice.wait() to wait for it to finish
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        voice = Voice(name, self.sounds[name], gain, loop)
+        with self._lock:
+            self._voices.append(voice)
+        self._wakeup.set()
+        return voice
+
+    def _mix_block(self) -> Optional[bytes]:
+        """Mix the next block of every voice, or return None if nothing is playing."""
+        with self._lock:
+            voices = list(self._voices)
+        if not voices:
+            return None
+
+        block: Optional[bytes] = None
+        for voice in voices:
+            if voice._position == 0:
+                self._started.append(voice)
+            chunk = voice._read(BLOCK_BYTES)
+            if not chunk:
+                continue
+            if len(chunk) < BLOCK_BYTES:
+                chunk += bytes(BLOCK_BYTES - len(chunk))
+            chunk = _scale(chunk, voice.gain * self.master_gain)
+            block = chunk if block is None else _add(block, chunk)
+
+        finished = [voice for voice in voices if voice.finished]
+        if finished:
+            with self._lock:
+                self._voices = [voice for voice in self._voices if voice not in finished]
+            for voice in finished:
+                voice._finish()
+
+        return block if block is not None else bytes(BLOCK_BYTES)
+
+    def _mix_loop(self) -> None:
+        """Mixer thread: mix blocks and hand them to the sink."""
+        stream_start = 0.0
+        stream_time = 0.0
+        # Sink errors not logged yet, and when one was last logged (None while the sink works)
+        sink_errors = 0
+        sink_error_logged: Optional[float] = None
+
+        while self._running:
+            block = self._mix_block()
+            if block is None:
+                # Nothing playing: sleep until the next trigger
+                self._wakeup.wait()
+                self._wakeup.clear()
+                stream_start = time.perf_counter()
+                stream_time = 0.0
+                continue
+
+            if self._sink.realtime:
+                # Stay at most `lead` seconds ahead of the device so new
+                # triggers are not stuck behind a long buffer
+                ahead = stream_time - (time.perf_counter() - stream_start)
+                if ahead > self._lead:
+                    time.sleep(ahead - self._lead)
+
+            try:
+                self._sink.write(block)
+            except Exception as e:
+                sink_errors += 1
+                now = time.monotonic()
+                if sink_error_logged is None or now - sink_error_logged >= SINK_ERROR_LOG_SECONDS:
+                    repeats = f" ({sink_errors} errors since the last report)" if sink_error_logged is not None else ""
+                    log.error("Audio: Sink error%s: %s", repeats, e)
+                    sink_error_logged = now
+                    sink_errors = 0
+            else:
+                if sink_error_logged is not None:
+                    log.info("Audio: Sink recovered")
+                    sink_error_logged = None
+                    sink_errors = 0
+            stream_time += BLOCK_SECONDS
+
+            if self._started:
+                written_at = time.perf_counter()
+                for voice in self._started:
+                    TRIGGER_SECONDS.observe(written_at - voice.triggered_at, sound=voice.name)
+                self._started.clear()
+
+    def stop(self) -> None:
+        """Stop the mixer thread and close the sink."""
+        if self._thread is None:
+            return
+
+        self._running = False
+        self._wakeup.set()
+        self._thread.join()
+        self._thread = None
+
+        with self._lock:
+            voices, self._voices = self._voices, []
+        for voice in voices:
+            voice.stop()
+            voice._finish()
+        self._sink.close()
@@ -0,0 +1,299 @@
+# Standard library imports
+import asyncio
+import json
+import multiprocessing
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+# Third-party imports
+import websockets
+from websockets import State
+
+# Local imports
+from log import get_logger, setup_logging
+from outbound import RateLimits, SendQueue, TokenBucket
+
+log = get_logger("channels")
+
+# Twitch allows 20 JOINs per 10 seconds per account
+JOIN_RATE_LIMIT = 20
+JOIN_RATE_PERIOD = 10.0
+
+@dataclass(frozen=True)
+class ChannelConfig:
+    """Per-channel settings.
+
+    Attributes:
+        name: Channel name (lowercase, without "#" prefix)
+        disabled_commands: Commands that are ignored in this channel
+        effects: Whether chat triggers OBS/sound effects
+        game: Whether "#" commands are relayed to the game server
+    """
+    name: str
+    disabled_commands: frozenset[str] = frozenset()
+    effects: bool = True
+    game: bool = True
+
+    def allows(self, command: str) -> bool:
+        """Check if a command may run in this channel.
+
+        Args:
+            command: Command name (lowercase, without "!")
+        """
+        return command not in self.disabled_commands
+
+def load_channel_configs(path: str) -> dict[str, ChannelConfig]:
+    """Load per-channel settings from a JSON file.
+
+    The file maps channel names to settings, e.g.
+    {"rheddev": {"effects": true}, "friend": {"disabled_commands": ["tts"], "effects": false}}
+
+    Args:
+        path: Path to the JSON file
+
+    Returns:
+        Settings by channel name (empty if the file does not exist)
+    """
+    if not os.path.exists(path):
+        return {}
+
+    with open(path) as f:
+        data: dict[str, dict] = json.load(f)
+
+    configs: dict[str, ChannelConfig] = {}
+    for name, settings in data.items():
+        name = name.lower().lstrip("#")
+        configs[name] = ChannelConfig(
+            name,
+            frozenset(command.lower() for command in settings.get("disabled_commands", [])),
+            settings.get("effects", True),
+            settings.get("game", True),
+        )
+    return configs
+
+class Shard:
+    """One IRC connection and the channels joined on it.
+
+    Attributes:
+        index: Shard number, used in log messages
+        channels: Channels assigned to this shard
+        outbound: Send queue written to this shard's connection
+        ws: Current connection once Twitch accepted the login, or None while disconnected
+    """
+
+    def __init__(self, index: int, outbound: SendQueue) -> None:
+        """Initialize an empty, disconnected shard."""
+        self.index = index
+        self.channels: set[str] = set()
+        self.outbound = outbound
+        self.ws: Optional[websockets.ClientConnection] = None
+
+    @property
+    def connected(self) -> bool:
+        """True while the shard has an open, logged-in connection."""
+        return self.ws is not None and self.ws.state is State.OPEN
+
+class ChannelManager:
+    """Spreads channels across several IRC connections.
+
+    Channels are assigned round-robin at startup. When a shard disconnects
+    its channels move to the least loaded connected shards, and when it
+    comes back, channels are moved back until the shards are even again.
+    JOINs for all shards share one rate limit.
+    """
+
+    def __init__(
+        self,
+        channels: list[str],
+        shard_count: int = 1,
+        configs: Optional[dict[str, ChannelConfig]] = None,
+        coalesce_window: float = 10.0,
+        rate_share: float = 1.0,
+    ) -> None:
+        """Initialize the manager.
+
+        Args:
+            channels: Channels to join (without "#" prefix)
+            shard_count: Number of IRC connections to spread them over
+            configs: Per-channel settings (channels without one use the defaults)
+            coalesce_window: Seconds during which an identical chat reply is only sent once
+            rate_share: Fraction of the account's chat and JOIN limits this process may use
+        """
+        self.limits = RateLimits(rate_share)
+        self._join_bucket = TokenBucket(max(1, int(JOIN_RATE_LIMIT * rate_share)), JOIN_RATE_PERIOD)
+        self._configs = configs or {}
+
+        shard_count = max(1, min(shard_count, len(channels)))
+        self.shards = [Shard(i, SendQueue(coalesce_window, self.limits)) for i in range(shard_count)]
+        self._owner: dict[str, Shard] = {}
+        # Background JOINs, kept so they are not garbage collected and can be cancelled on shutdown
+        self._joins: set[asyncio.Task] = set()
+        for i, channel in enumerate(dict.fromkeys(channel.lower().lstrip("#") for channel in channels)):
+            shard = self.shards[i % shard_count]
+            shard.channels.add(channel)
+            self._owner[channel] = shard
+
+    @property
+    def channels(self) -> list[str]:
+        """Every channel served by this manager."""
+        return list(self._owner)
+
+    def config(self, channel: str) -> ChannelConfig:
+        """Get the settings for a channel.
+
+        Args:
+            channel: Channel name (without "#" prefix)
+        """
+        config = self._configs.get(channel)
+        if config is None:
+            config = self._configs[channel] = ChannelConfig(channel)
+        return config
+
+    def set_configs(self, configs: dict[str, ChannelConfig]) -> None:
+        """Replace the per-channel settings, e.g. after the settings file changed.
+
+        Args:
+            configs: Settings by channel name (channels without one use the defaults)
+        """
+        self._configs = dict(configs)
+
+    def queue_for(self, channel: str) -> SendQueue:
+        """Get the send queue of the shard that joined a channel.
+
+        Args:
+            channel: Channel name (without "#" prefix)
+        """
+        return self._owner[channel].outbound
+
+    def _move(self, channel: str, target: Shard) -> None:
+        """Reassign a channel to another shard."""
+        source = self._owner[channel]
+        source.channels.discard(channel)
+        target.channels.add(channel)
+        self._owner[channel] = target
+
+    async def join(self, shard: Shard, channels: list[str]) -> None:
+        """JOIN channels on a shard, respecting the JOIN rate limit.
+
+        Args:
+            shard: Shard whose connection should join
+            channels: Channels to join
+        """
+        for channel in channels:
+            await self._join_bucket.acquire()
+            # The channel may have moved while we waited for a token
+            if self._owner.get(channel) is shard:
+                shard.outbound.raw(f"JOIN #{channel}")
+                log.info("Shard %s: Joining #%s", shard.index, channel)
+
+    def _join_later(self, shard: Shard, channels: list[str]) -> None:
+        """JOIN channels on a shard in the background."""
+        task = asyncio.create_task(self.join(shard, channels))
+        self._joins.add(task)
+        task.add_done_callback(self._joined)
+
+    def _joined(self, task: asyncio.Task) -> None:
+        """Forget a finished background JOIN and report its error, if any."""
+        self._joins.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.error("Joining channels failed: %s", task.exception())
+
+    async def close(self) -> None:
+        """Cancel the JOINs still waiting for the rate limit."""
+        for task in self._joins:
+            task.cancel()
+        await asyncio.gather(*self._joins, return_exceptions=True)
+
+    def shard_down(self, shard: Shard) -> None:
+        """Move a disconnected shard's channels to the connected shards.
+
+        Args:
+            shard: The shard that lost its connection
+        """
+        targets = [other for other in self.shards if other is not shard and other.connected]
+        if not targets:
+            # Nowhere to go; the shard rejoins its channels when it is back
+            return
+
+        moved: dict[Shard, list[str]] = {}
+        for channel in sorted(shard.channels):
+            target = min(targets, key=lambda other: len(other.channels))
+            self._move(channel, target)
+            moved.setdefault(target, []).append(channel)
+
+        for target, channels in moved.items():
+            log.warning("Shard %s down, moving %s channels to shard %s", shard.index, len(channels), target.index)
+            self._join_later(target, channels)
+
+    def shard_up(self, shard: Shard) -> None:
+        """Rebalance channels onto a shard that just connected and join them.
+
+        JOINs are sent in the background so the shard can start reading
+        while it waits for the JOIN rate limit.
+
+        Args:
+            shard: The shard that just connected
+        """
+        connected = [other for other in self.shards if other.connected or other is shard]
+
+        # Take channels from the most loaded shard until the loads are even
+        while True:
+            donor = max(connected, key=lambda other: len(other.channels))
+            if len(donor.channels) <= len(shard.channels) + 1:
+                break
+            channel = sorted(donor.channels)[-1]
+            self._move(channel, shard)
+            if donor.connected:
+                donor.outbound.raw(f"PART #{channel}")
+
+        self._join_later(shard, sorted(shard.channels))
+
+def _run_worker(nick: str, channels: list[str], access_token: str, refresh_token: str, rate_share: float, integrations: bool) -> None:
+    """Entry point of a worker process: run a bot for a subset of channels."""
+    # Imported here so the parent does not need the bot module loaded
+    from nuitbot import NuitBot
+    from tokens import TokenManager, TokenStore
+
+    setup_logging()
+    bot = NuitBot(nick, channels, integrations=integrations, rate_share=rate_share)
+    bot.set_tokens(access_token, refresh_token)
+
+    # Share the parent's token store, so a refresh by one worker reaches the others
+    client_id = os.getenv("TWITCH_CLIENT_ID")
+    if client_id:
+        manager = TokenManager(client_id, os.getenv("TWITCH_CLIENT_SECRET", ""), TokenStore())
+        manager.load_cached()
+        bot.use_tokens(manager)
+    asyncio.run(bot.run())
+
+def start_workers(nick: str, channels: list[str], workers: int, access_token: str, refresh_token: str) -> list[multiprocessing.Process]:
+    """Split channels across worker processes, each running its own bot.
+
+    Every worker gets an equal share of the account's rate limits. Only the
+    first worker connects to OBS, the game server and the audio device.
+
+    Args:
+        nick: Bot's nickname on Twitch
+        channels: Channels to join (the first one is the home channel)
+        workers: Number of worker processes
+        access_token: OAuth access token
+        refresh_token: OAuth refresh token
+
+    Returns:
+        The started processes
+    """
+    workers = max(1, min(workers, len(channels)))
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for i in range(workers):
+        process = context.Process(
+            target=_run_worker,
+            args=(nick, channels[i::workers], access_token, refresh_token, 1 / workers, i == 0),
+            name=f"nuitbot-worker-{i}",
+            daemon=True,
+        )
+        process.start()
+        processes.append(process)
+    log.info("Started %s worker processes for %s channels", workers, len(channels))
+    return processes
@@ -0,0 +1,204 @@
+# Standard library imports
+import time
+
+# Measured from here, so the startup report covers everything the bot loads
+STARTED = time.perf_counter()
+
+import argparse
+import asyncio
+import os
+import signal
+import sys
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from nuitbot import NuitBot
+
+# Bot account name
+NICK = "NuitBot"
+
+# Directory holding the .env file (the launchers run from there too)
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    """Parse the command line."""
+    parser = argparse.ArgumentParser(
+        prog="nuitbot",
+        description="Run NuitBot on the main event loop, starting with the cached Twitch tokens.",
+    )
+    parser.add_argument(
+        "--channels", default=None,
+        help="Channels to join, comma-separated (default: TWITCH_CHANNELS or RhedDev)",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=int(os.getenv("TWITCH_WORKERS", "1")),
+        help="Worker processes to spread the channels over (default: TWITCH_WORKERS or 1)",
+    )
+    parser.add_argument(
+        "--web", action="store_true",
+        help="Serve the OAuth callback, overlays, metrics, song queues and status, and authorize "
+             "in the browser if there are no cached tokens",
+    )
+    parser.add_argument(
+        "--no-integrations", action="store_true",
+        help="Chat only: don't connect to OBS or the game server and don't open the audio device",
+    )
+    parser.add_argument("--log-level", default=None, help="Log level (default: LOG_LEVEL or INFO)")
+    return parser.parse_args(argv)
+
+def load_env() -> None:
+    """Load the .env file, if there is one, before any module reads its settings."""
+    for directory in (os.getcwd(), ROOT):
+        path = os.path.join(directory, ".env")
+        if os.path.exists(path):
+            # Only imported when there is something for it to load
+            from dotenv import load_dotenv
+
+            load_dotenv(path)
+            return
+
+async def run_workers(bot: "NuitBot", workers: int) -> None:
+    """Run the channels in worker processes until they exit or this process is stopped.
+
+    Args:
+        bot: The bot whose channels and tokens the workers get (it does not run itself)
+        workers: Number of worker processes
+    """
+    from channels import start_workers
+
+    processes = start_workers(NICK, bot.channels.channels, workers, bot.get_access_token(), bot.get_refresh_token())
+
+    def stop() -> None:
+        # Each worker shuts down cleanly on SIGTERM
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    loop = asyncio.get_running_loop()
+    installed = []
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop)
+            installed.append(signum)
+        except (NotImplementedError, RuntimeError, ValueError):
+            pass
+
+    try:
+        await asyncio.gather(*(asyncio.to_thread(process.join) for process in processes))
+    finally:
+        stop()
+        for signum in installed:
+            loop.remove_signal_handler(signum)
+
+async def run(bot: "NuitBot", authorized: bool, web: bool, workers: int, timings: dict[str, float]) -> None:
+    """Serve the web app if wanted, authorize if needed, and run the bot or its workers.
+
+    Args:
+        bot: The bot to run
+        authorized: Whether there are usable cached tokens
+        web: Serve the web app alongside the bot
+        workers: Worker processes to run the channels in (1 runs the bot on this loop)
+        timings: Startup phases so far (name to seconds)
+    """
+    from log import get_logger
+    from tokens import SCOPES, TWITCH_CLIENT_ID, TWITCH_REDIRECT_URI
+
+    log = get_logger("cli")
+    tokens_ready = asyncio.Event()
+    if authorized:
+        tokens_ready.set()
+
+    runner = None
+    if web:
+        # aiohttp's web server is only loaded when the pages are wanted. It
+        # runs on this loop, next to the bot
+        from web import create_app, serve
+
+        try:
+            runner = await serve(create_app(bot, tokens_ready.set, workers))
+        except OSError as e:
+            if not tokens_ready.is_set():
+                raise
+            log.error("Web server unavailable (%s). Continuing without it.", e)
+
+    try:
+        if not tokens_ready.is_set():
+            bot.authorize(TWITCH_CLIENT_ID, TWITCH_REDIRECT_URI, SCOPES)
+            log.info("Waiting for Twitch authorization in the browser...")
+            await tokens_ready.wait()
+
+        if workers > 1:
+            await run_workers(bot, workers)
+        else:
+            await run_bot(bot, timings)
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+
+async def run_bot(bot: "NuitBot", timings: dict[str, float]) -> None:
+    """Run the bot on this loop and report the startup time once chat is joined.
+
+    Args:
+        bot: The bot to run
+        timings: Startup phases so far (name to seconds); the connect time, until
+            Twitch confirmed the first channel join, is added
+    """
+    from log import get_logger
+
+    log = get_logger("cli")
+    connecting = time.perf_counter()
+    bot_task = asyncio.create_task(bot.run())
+    ready = asyncio.create_task(bot.ready.wait())
+    await asyncio.wait({bot_task, ready}, return_when=asyncio.FIRST_COMPLETED)
+
+    if ready.done():
+        timings["connect"] = time.perf_counter() - connecting
+        breakdown = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in timings.items())
+        log.info("Joined chat in %.0f ms (%s)", sum(timings.values()) * 1000, breakdown)
+    else:
+        ready.cancel()
+    await bot_task
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Run the bot until it is stopped.
+
+    Returns:
+        Exit status
+    """
+    args = parse_args(argv)
+    load_env()
+    if args.log_level:
+        os.environ["LOG_LEVEL"] = args.log_level.upper()
+
+    # Imported only now, because modules read their settings when imported
+    from log import get_logger, setup_logging
+    from nuitbot import NuitBot
+    from tokens import TWITCH_CLIENT_ID, TWITCH_CLIENT_SECRET, TokenManager, TokenStore
+
+    setup_logging()
+    log = get_logger("cli")
+    timings = {"imports": time.perf_counter() - STARTED}
+
+    # Tokens are kept encrypted on disk, so a restart does not need the browser
+    phase = time.perf_counter()
+    manager = TokenManager(TWITCH_CLIENT_ID, TWITCH_CLIENT_SECRET, TokenStore())
+    cached = manager.load_cached() is not None
+    if not cached and not args.web:
+        log.error("No cached Twitch tokens. Run once with --web to authorize the bot in the browser.")
+        return 1
+    timings["tokens"] = time.perf_counter() - phase
+
+    phase = time.perf_counter()
+    channels = (args.channels or os.getenv("TWITCH_CHANNELS", "RhedDev")).split(",")
+    bot = NuitBot(NICK, [channel.strip() for channel in channels if channel.strip()], not args.no_integrations)
+    bot.use_tokens(manager)
+    timings["bot"] = time.perf_counter() - phase
+
+    try:
+        asyncio.run(run(bot, cached, args.web, args.workers, timings))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
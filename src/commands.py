@@ -0,0 +1,207 @@
+# Standard library imports
+import importlib
+import sys
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Iterator, NamedTuple, Optional, Union
+
+# Local imports
+from cooldowns import NO_COOLDOWN, Cooldown
+from irc import IrcMessage
+from log import get_logger
+
+log = get_logger("commands")
+
+# Signature of a command handler: handler(bot, message, args)
+Handler = Callable[[Any, IrcMessage, str], Awaitable[None]]
+
+class CommandContext(NamedTuple):
+    """What a CPU-bound handler gets to know about the message, sent to its worker process.
+
+    Attributes:
+        channel: Channel name (without "#" prefix)
+        user: Login name of the sender
+        display_name: Display name of the sender
+        moderator: Whether the sender is a moderator or the broadcaster
+    """
+    channel: str
+    user: str
+    display_name: str
+    moderator: bool
+
+# Signature of a CPU-bound handler, run in a worker process:
+# handler(args, context) -> reply text, or None for no reply. It must be a
+# module-level function so it can be sent to the worker
+CpuHandler = Callable[[str, CommandContext], Optional[str]]
+
+@dataclass(frozen=True)
+class Command:
+    """A chat command that can be dispatched by name.
+
+    Attributes:
+        name: Primary command name (lowercase, without "!")
+        handler: Coroutine function called with (bot, message, args), or
+            for CPU-bound commands a function called with (args, context)
+            in a worker process
+        aliases: Alternative names that dispatch to the same handler
+        plugin: Module that registered the command
+        cooldown: How often viewers may use it (moderators are exempt)
+        cpu_bound: Whether the handler runs in a worker process
+    """
+    name: str
+    handler: Union[Handler, CpuHandler]
+    aliases: tuple[str, ...] = ()
+    plugin: str = ""
+    cooldown: Cooldown = NO_COOLDOWN
+    cpu_bound: bool = False
+
+def is_moderator(message: IrcMessage) -> bool:
+    """Check if the sender of a message is a moderator or the broadcaster.
+
+    Args:
+        message: The chat message to check
+
+    Returns:
+        True if the sender can run moderator commands, False otherwise
+    """
+    return message.tag("mod") == "1" or "broadcaster/" in message.tag("badges")
+
+def command_context(message: IrcMessage) -> CommandContext:
+    """The message fields a CPU-bound handler gets."""
+    return CommandContext(message.channel, message.user, message.tag("display-name") or message.user, is_moderator(message))
+
+class CommandRegistry:
+    """Table of chat commands built from plugin modules.
+
+    Every plugin module exposes a ``setup(registry)`` function that registers
+    its commands. The table is built once at startup and only swapped as a
+    whole on reload, so dispatch is a single dictionary lookup.
+    """
+
+    def __init__(self, plugins: list[str]) -> None:
+        """Initialize the registry with the plugin modules to load.
+
+        Args:
+            plugins: Dotted module names, e.g. "plugins.basic"
+        """
+        self._plugins = plugins
+        self._commands: dict[str, Command] = {}
+
+        # Table being filled while plugins run their setup()
+        self._pending: Optional[dict[str, Command]] = None
+        self._current_plugin = ""
+        self._reload_callbacks: list[Callable[[], None]] = []
+
+    def __len__(self) -> int:
+        """Number of dispatchable names, including aliases."""
+        return len(self._commands)
+
+    def __iter__(self) -> Iterator[Command]:
+        """Every registered command once, aliases not repeated."""
+        return iter({id(command): command for command in self._commands.values()}.values())
+
+    def get(self, name: str) -> Optional[Command]:
+        """Look up a command by name or alias.
+
+        Args:
+            name: Command name without "!" (must already be lowercase)
+
+        Returns:
+            The matching command, or None
+        """
+        return self._commands.get(name)
+
+    def register(
+        self,
+        name: str,
+        handler: Union[Handler, CpuHandler],
+        aliases: tuple[str, ...] = (),
+        cooldown: Cooldown = NO_COOLDOWN,
+        cpu_bound: bool = False,
+    ) -> None:
+        """Register a command. Only valid while plugins are being loaded.
+
+        Args:
+            name: Primary command name (without "!")
+            handler: Coroutine function called with (bot, message, args), or
+                with cpu_bound a module-level function called with (args,
+                context) in a worker process that returns the reply text
+            aliases: Alternative names for the command
+            cooldown: How often viewers may use the command
+            cpu_bound: Run the handler in a worker process, so heavy work
+                never holds up chat
+        """
+        if self._pending is None:
+            raise RuntimeError("Commands can only be registered from a plugin's setup()")
+
+        command = Command(
+            name.lower(), handler, tuple(alias.lower() for alias in aliases), self._current_plugin, cooldown, cpu_bound,
+        )
+        for key in (command.name, *command.aliases):
+            if key in self._pending:
+                raise ValueError(f"Command '!{key}' is already registered by {self._pending[key].plugin}")
+            self._pending[key] = command
+
+    def command(
+        self, name: str, *aliases: str, cooldown: Cooldown = NO_COOLDOWN, cpu_bound: bool = False,
+    ) -> Callable[[Handler], Handler]:
+        """Decorator form of register().
+
+        Args:
+            name: Primary command name (without "!")
+            aliases: Alternative names for the command
+            cooldown: How often viewers may use the command
+            cpu_bound: Run the handler in a worker process (see register())
+        """
+        def decorator(handler: Handler) -> Handler:
+            self.register(name, handler, aliases, cooldown, cpu_bound)
+            return handler
+        return decorator
+
+    def on_reload(self, callback: Callable[[], None]) -> None:
+        """Call a function whenever a reload installed a new command table."""
+        self._reload_callbacks.append(callback)
+
+    def _build(self, reload: bool) -> dict[str, Command]:
+        """Import every plugin and collect its commands into a new table."""
+        self._pending = {}
+        try:
+            for plugin in self._plugins:
+                if reload and plugin in sys.modules:
+                    module = importlib.reload(sys.modules[plugin])
+                else:
+                    module = importlib.import_module(plugin)
+
+                self._current_plugin = plugin
+                module.setup(self)
+            return self._pending
+        finally:
+            self._pending = None
+            self._current_plugin = ""
+
+    def load(self) -> None:
+        """Load all plugins and build the command table."""
+        self._commands = self._build(reload=False)
+        log.info("Loaded %s commands from %s plugins", len(self._commands), len(self._plugins))
+
+    def reload(self) -> bool:
+        """Re-import all plugins and swap in the new command table.
+
+        The current table stays active if any plugin fails to load.
+
+        Returns:
+            True if the new table was installed, False otherwise
+        """
+        try:
+            commands = self._build(reload=True)
+        except Exception as e:
+            log.error("Command reload failed, keeping previous commands: %s", e)
+            return False
+
+        self._commands = commands
+        log.info("Reloaded %s commands from %s plugins", len(commands), len(self._plugins))
+        for callback in self._reload_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                log.exception("Reload callback failed: %s", e)
+        return True
@@ -0,0 +1,143 @@
+# Standard library imports
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+# Local imports
+from log import get_logger
+from metrics import counter, gauge
+
+log = get_logger("cooldowns")
+
+COOLDOWN_BLOCKS = counter("nuitbot_cooldown_blocks_total", "Triggers ignored because of a cooldown, by trigger and scope")
+COOLDOWN_ENTRIES = gauge("nuitbot_cooldown_entries", "Cooldowns currently tracked")
+
+# Seconds a viewer has to wait between any two triggers (commands, "#"
+# commands, mentality), on top of each trigger's own cooldowns
+GLOBAL_USER_COOLDOWN = float(os.getenv("GLOBAL_USER_COOLDOWN", "1"))
+
+# Cooldowns kept in memory; the oldest are forgotten beyond this
+COOLDOWN_MAX_ENTRIES = int(os.getenv("COOLDOWN_MAX_ENTRIES", "100000"))
+
+@dataclass(frozen=True)
+class Cooldown:
+    """How often a trigger may fire.
+
+    Attributes:
+        user: Seconds a viewer has to wait before using it again
+        command: Seconds everyone in the channel has to wait after it was used
+    """
+    user: float = 0.0
+    command: float = 0.0
+
+NO_COOLDOWN = Cooldown()
+
+class CooldownTracker:
+    """Per-viewer, per-command and global cooldowns with O(1) checks.
+
+    Only running cooldowns are stored. Entries are grouped by duration, and
+    within a group they are appended in time order, so each group is also
+    ordered by expiry: sweeping pops expired entries off the front and
+    stops at the first running one instead of scanning the whole table.
+    When the table is full the entry closest to expiring goes first.
+    """
+
+    def __init__(self, max_entries: int = COOLDOWN_MAX_ENTRIES, global_user: float = GLOBAL_USER_COOLDOWN) -> None:
+        """Initialize an empty tracker.
+
+        Args:
+            max_entries: Maximum number of cooldowns kept in memory
+            global_user: Seconds a viewer has to wait between any two triggers
+        """
+        self._max_entries = max_entries
+        self._global_user = global_user
+        # Expiry time (monotonic) and duration by key
+        self._expires: dict[str, tuple[float, float]] = {}
+        # Keys in expiry order, by duration
+        self._groups: dict[float, OrderedDict[str, None]] = {}
+        COOLDOWN_ENTRIES.set_function(lambda: len(self._expires))
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+    def _remaining(self, key: str, now: float) -> float:
+        """Seconds left on a cooldown (0 if it is not running)."""
+        entry = self._expires.get(key)
+        return entry[0] - now if entry is not None and entry[0] > now else 0.0
+
+    def _start(self, key: str, seconds: float, now: float) -> None:
+        """Start (or restart) a cooldown."""
+        if seconds <= 0:
+            return
+
+        entry = self._expires.get(key)
+        if entry is not None:
+            del self._groups[entry[1]][key]
+        self._expires[key] = (now + seconds, seconds)
+        group = self._groups.get(seconds)
+        if group is None:
+            group = self._groups[seconds] = OrderedDict()
+        group[key] = None
+
+        while len(self._expires) > self._max_entries:
+            self._evict()
+
+    def _evict(self) -> None:
+        """Forget the cooldown closest to expiring."""
+        seconds, group = min(
+            ((seconds, group) for seconds, group in self._groups.items() if group),
+            key=lambda item: self._expires[next(iter(item[1]))][0],
+        )
+        key, _ = group.popitem(last=False)
+        del self._expires[key]
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Drop expired cooldowns.
+
+        Returns:
+            Number of cooldowns dropped
+        """
+        now = time.monotonic() if now is None else now
+        dropped = 0
+        for group in self._groups.values():
+            while group:
+                key = next(iter(group))
+                if self._expires[key][0] > now:
+                    break
+                group.popitem(last=False)
+                del self._expires[key]
+                dropped += 1
+        return dropped
+
+    def acquire(self, channel: str, trigger: str, user: str, cooldown: Cooldown, now: Optional[float] = None) -> float:
+        """Check a trigger's cooldowns and, if none is running, start them.
+
+        Args:
+            channel: Channel name
+            trigger: Trigger name, e.g. a command name, "#creeper" or "mentality"
+            user: Login name of the viewer
+            cooldown: The trigger's cooldowns
+            now: Current time (monotonic)
+
+        Returns:
+            0 if the trigger may run, otherwise the seconds until it may
+        """
+        now = time.monotonic() if now is None else now
+        self.sweep(now)
+
+        user_key = f"{channel}\0{trigger}\0{user}"
+        command_key = f"{channel}\0{trigger}"
+        global_key = f"{channel}\0\0{user}"
+
+        for key, scope in ((user_key, "user"), (command_key, "command"), (global_key, "global")):
+            remaining = self._remaining(key, now)
+            if remaining:
+                COOLDOWN_BLOCKS.inc(trigger=trigger, scope=scope)
+                return remaining
+
+        self._start(user_key, cooldown.user, now)
+        self._start(command_key, cooldown.command, now)
+        self._start(global_key, self._global_user, now)
+        return 0.0
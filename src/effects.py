@@ -0,0 +1,168 @@
+# Standard library imports
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+from typing import Awaitable, Callable, Optional
+
+# Local imports
+from log import get_logger
+
+log = get_logger("effects")
+
+class OverlapPolicy(str, Enum):
+    """What to do when an effect is triggered while the same effect is active.
+
+    QUEUE: Run it after the ones already waiting
+    DROP: Ignore the new trigger
+    PREEMPT: Cancel the active and waiting ones and run the new trigger
+    """
+    QUEUE = "queue"
+    DROP = "drop"
+    PREEMPT = "preempt"
+
+@dataclass
+class Effect:
+    """A queued effect sequence.
+
+    Attributes:
+        name: Effect name, used to detect overlapping triggers
+        factory: Callable returning the coroutine to run
+    """
+    name: str
+    factory: Callable[[], Awaitable[None]]
+
+class EffectScheduler:
+    """Runs effect sequences (scene changes, sounds, ...) as background tasks.
+
+    Triggers are put on a bounded queue and picked up by a fixed number of
+    workers, so the chat loop never waits for an effect to finish.
+    """
+
+    def __init__(self, max_queue: int = 16, concurrency: int = 1, policy: OverlapPolicy = OverlapPolicy.QUEUE) -> None:
+        """Initialize the scheduler.
+
+        Args:
+            max_queue: Maximum number of effects waiting to run
+            concurrency: Number of effects that may run at the same time
+            policy: Default policy for overlapping triggers
+        """
+        self._max_queue = max_queue
+        self._concurrency = concurrency
+        self._policy = OverlapPolicy(policy)
+
+        self._queue: deque[Effect] = deque()
+        self._available = asyncio.Semaphore(0)
+        self._active: dict[asyncio.Task, str] = {}
+        self._workers: list[asyncio.Task] = []
+        self._closing = False
+
+        self.dropped = 0
+
+    @property
+    def depth(self) -> int:
+        """Number of effects waiting to run."""
+        return len(self._queue)
+
+    @property
+    def active(self) -> int:
+        """Number of effects currently running."""
+        return len(self._active)
+
+    def start(self) -> None:
+        """Start the worker tasks. Must be called from the running event loop."""
+        if self._workers:
+            return
+
+        self._closing = False
+        self._available = asyncio.Semaphore(0)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self._concurrency)]
+
+    def _is_busy(self, name: str) -> bool:
+        """Check if an effect with this name is running or waiting."""
+        return name in self._active.values() or any(effect.name == name for effect in self._queue)
+
+    def _preempt(self, name: str) -> None:
+        """Cancel running and waiting effects with this name."""
+        for task, active_name in self._active.items():
+            if active_name == name:
+                task.cancel()
+
+        # Waiting effects are removed directly; workers skip the extra permits
+        self._queue = deque(effect for effect in self._queue if effect.name != name)
+
+    def submit(self, name: str, factory: Callable[[], Awaitable[None]], policy: Optional[OverlapPolicy] = None) -> bool:
+        """Schedule an effect without waiting for it.
+
+        Args:
+            name: Effect name, used to detect overlapping triggers
+            factory: Callable returning the coroutine to run
+            policy: Overlap policy for this trigger (defaults to the scheduler's)
+
+        Returns:
+            True if the effect was queued, False if it was dropped
+        """
+        if self._closing:
+            return False
+
+        policy = self._policy if policy is None else OverlapPolicy(policy)
+        if policy is OverlapPolicy.DROP and self._is_busy(name):
+            self.dropped += 1
+            log.warning("Effect %s already active, dropping trigger", name)
+            return False
+        if policy is OverlapPolicy.PREEMPT:
+            self._preempt(name)
+
+        if len(self._queue) >= self._max_queue:
+            self.dropped += 1
+            log.warning("Effect queue full (%s), dropping %s", self._max_queue, name)
+            return False
+
+        self._queue.append(Effect(name, factory))
+        self._available.release()
+        return True
+
+    async def _worker(self) -> None:
+        """Take effects off the queue and run them one at a time."""
+        while True:
+            await self._available.acquire()
+            if not self._queue:
+                if self._closing:
+                    return
+                # Permit left over from a preempted effect
+                continue
+
+            effect = self._queue.popleft()
+            task = asyncio.create_task(effect.factory())
+            self._active[task] = effect.name
+            try:
+                # Wait without propagating cancellation of the effect into the worker
+                await asyncio.wait({task})
+                if task.cancelled():
+                    log.warning("Effect %s preempted", effect.name)
+                elif task.exception():
+                    log.error("Effect %s error: %s", effect.name, task.exception())
+            except asyncio.CancelledError:
+                task.cancel()
+                raise
+            finally:
+                self._active.pop(task, None)
+
+    async def close(self, drain: bool = True) -> None:
+        """Stop the scheduler.
+
+        Args:
+            drain: Let waiting effects run first if True, otherwise cancel everything
+        """
+        self._closing = True
+        if not drain:
+            self._queue.clear()
+            for task in self._active:
+                task.cancel()
+
+        # One extra permit per worker lets each of them see the closing flag
+        for _ in self._workers:
+            self._available.release()
+
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
@@ -0,0 +1,309 @@
+# Standard library imports
+import asyncio
+import importlib
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Optional
+
+# Local imports
+from log import get_logger
+from metrics import counter, histogram
+
+if TYPE_CHECKING:
+    import aiohttp
+
+log = get_logger("helix")
+
+REQUEST_SECONDS = histogram("nuitbot_helix_request_seconds", "Helix API request time, by endpoint")
+CACHE_LOOKUPS = counter("nuitbot_helix_cache_total", "Helix lookups, by result (hit, coalesced, miss)")
+
+# Twitch Helix API; point it at a local stub for tests
+HELIX_URL = os.getenv("HELIX_URL", "https://api.twitch.tv/helix").rstrip("/")
+
+class HelixError(Exception):
+    """Raised when a Helix request fails."""
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(f"Helix request failed ({status}): {message}")
+        self.status = status
+
+class _Abandoned(Exception):
+    """Given to lookups that joined a request whose caller was cancelled, so they make their own."""
+
+class TTLCache:
+    """LRU cache whose entries also expire after a fixed time."""
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300.0) -> None:
+        """Initialize an empty cache.
+
+        Args:
+            max_size: Maximum number of entries; the least recently used is evicted first
+            ttl: Seconds an entry stays valid
+        """
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Any) -> tuple[bool, Any]:
+        """Look up an entry.
+
+        Returns:
+            (True, value) if the key is cached and fresh, (False, None) otherwise
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return False, None
+
+        self._entries.move_to_end(key)
+        return True, value
+
+    def set(self, key: Any, value: Any) -> None:
+        """Store an entry, evicting the least recently used one if the cache is full."""
+        self._entries[key] = (time.monotonic() + self._ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+class HelixClient:
+    """Async Twitch Helix client with a pooled session and cached lookups.
+
+    Identical lookups that are already in flight share one request, and
+    results (including "not found") are cached, so a wave of identical
+    chat commands costs one API call per unique user.
+    """
+
+    def __init__(
+        self,
+        client_id: str,
+        token: Callable[[], str],
+        base_url: str = HELIX_URL,
+        max_connections: int = 10,
+        cache_size: int = 10000,
+        cache_ttl: float = 300.0,
+    ) -> None:
+        """Initialize the client.
+
+        Args:
+            client_id: Twitch application client ID
+            token: Returns the current user access token
+            base_url: Helix base URL
+            max_connections: Maximum number of pooled connections
+            cache_size: Maximum number of cached lookups
+            cache_ttl: Seconds a lookup stays cached
+        """
+        self._client_id = client_id
+        self._token = token
+        self.base_url = base_url
+        self._max_connections = max_connections
+        self._session: Optional["aiohttp.ClientSession"] = None
+
+        self._cache = TTLCache(cache_size, cache_ttl)
+        self._in_flight: dict[Any, asyncio.Future] = {}
+        self.requests = 0
+
+    async def _get_session(self) -> "aiohttp.ClientSession":
+        """Create the pooled session on first use (it must belong to the running loop)."""
+        if self._session is None or self._session.closed:
+            # aiohttp is slow to import, so it is only loaded once a command
+            # needs the API, and off the event loop so chat keeps flowing
+            aiohttp = await asyncio.to_thread(importlib.import_module, "aiohttp")
+            if self._session is not None and not self._session.closed:
+                return self._session
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self._max_connections),
+                timeout=aiohttp.ClientTimeout(total=10),
+            )
+        return self._session
+
+    async def get(self, endpoint: str, params: dict[str, str]) -> dict[str, Any]:
+        """Send a GET request to a Helix endpoint.
+
+        Args:
+            endpoint: Endpoint path, e.g. "users"
+            params: Query parameters
+
+        Returns:
+            The decoded JSON response
+
+        Raises:
+            HelixError: If Helix answered with an error status or could not be reached
+        """
+        return await self._request("GET", endpoint, params)
+
+    async def delete(self, endpoint: str, params: dict[str, str]) -> None:
+        """Send a DELETE request to a Helix endpoint.
+
+        Args:
+            endpoint: Endpoint path, e.g. "moderation/chat"
+            params: Query parameters
+
+        Raises:
+            HelixError: If Helix answered with an error status or could not be reached
+        """
+        await self._request("DELETE", endpoint, params)
+
+    async def _request(self, method: str, endpoint: str, params: dict[str, str]) -> dict[str, Any]:
+        """Send a request, retrying once if rate limited, and decode the JSON response (empty if there is none).
+
+        Raises:
+            HelixError: If Helix answered with an error status or an
+                unreadable body, or could not be reached (status 0)
+        """
+        headers = {"Client-Id": self._client_id, "Authorization": f"Bearer {self._token()}"}
+        start = time.perf_counter()
+        self.requests += 1
+        session = await self._get_session()
+        # Already loaded by _get_session()
+        import aiohttp
+
+        try:
+            for attempt in range(2):
+                async with session.request(method, f"{self.base_url}/{endpoint}", params=params, headers=headers) as response:
+                    if response.status == 429 and attempt == 0:
+                        # Rate limited: wait until the bucket resets, then retry once
+                        reset = float(response.headers.get("Ratelimit-Reset", time.time() + 1))
+                        await asyncio.sleep(min(5.0, max(0.0, reset - time.time())))
+                        continue
+
+                    # Deletes answer 204 without a body
+                    try:
+                        data = await response.json(content_type=None) if response.status != 204 else None
+                    except ValueError as e:
+                        raise HelixError(response.status, f"unreadable response: {e}") from None
+                    REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+                    if response.status >= 300:
+                        raise HelixError(response.status, data.get("message", "") if isinstance(data, dict) else str(data))
+                    return data or {}
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise HelixError(0, str(e) or type(e).__name__) from None
+        raise HelixError(429, "Rate limited")
+
+    async def _lookup(self, key: Any, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Serve a lookup from the cache, an identical request in flight, or a new request."""
+        while True:
+            hit, value = self._cache.get(key)
+            if hit:
+                CACHE_LOOKUPS.inc(result="hit")
+                return value
+
+            future = self._in_flight.get(key)
+            if future is None:
+                break
+            CACHE_LOOKUPS.inc(result="coalesced")
+            try:
+                return await asyncio.shield(future)
+            except _Abandoned:
+                # The request we joined was cancelled along with its caller; we weren't
+                continue
+
+        CACHE_LOOKUPS.inc(result="miss")
+        future = self._in_flight[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await fetch()
+        except asyncio.CancelledError:
+            future.set_exception(_Abandoned())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; don't warn about an unretrieved exception
+            future.exception()
+            raise
+        else:
+            self._cache.set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            del self._in_flight[key]
+
+    async def user_id(self, login: str) -> Optional[str]:
+        """Look up a user's ID by login name.
+
+        Args:
+            login: Login name (case-insensitive, without "@")
+
+        Returns:
+            The user ID, or None if there is no such user
+        """
+        login = login.lower().lstrip("@")
+
+        async def fetch() -> Optional[str]:
+            data = await self.get("users", {"login": login})
+            users = data.get("data", [])
+            return users[0]["id"] if users else None
+
+        return await self._lookup(("user", login), fetch)
+
+    async def followed_at(self, broadcaster_id: str, user_id: str) -> Optional[datetime]:
+        """Look up when a user followed a channel.
+
+        Requires a token with the moderator:read:followers scope from a
+        moderator (or the broadcaster) of the channel.
+
+        Args:
+            broadcaster_id: ID of the channel
+            user_id: ID of the user
+
+        Returns:
+            When the user followed, or None if they don't follow the channel
+        """
+        async def fetch() -> Optional[datetime]:
+            data = await self.get("channels/followers", {"broadcaster_id": broadcaster_id, "user_id": user_id})
+            follows = data.get("data", [])
+            return datetime.fromisoformat(follows[0]["followed_at"].replace("Z", "+00:00")) if follows else None
+
+        return await self._lookup(("follow", broadcaster_id, user_id), fetch)
+
+    async def chatters(self, broadcaster_id: str, moderator_id: str) -> list[str]:
+        """List everyone currently in a channel's chat. Never cached.
+
+        Requires a token with the moderator:read:chatters scope from a
+        moderator (or the broadcaster) of the channel.
+
+        Args:
+            broadcaster_id: ID of the channel
+            moderator_id: ID of the user the token belongs to
+
+        Returns:
+            Login names of the chatters
+        """
+        logins: list[str] = []
+        params = {"broadcaster_id": broadcaster_id, "moderator_id": moderator_id, "first": "1000"}
+        while True:
+            data = await self.get("chat/chatters", params)
+            logins.extend(chatter["user_login"] for chatter in data.get("data", []))
+            cursor = data.get("pagination", {}).get("cursor")
+            if not cursor:
+                return logins
+            params["after"] = cursor
+
+    async def delete_chat_message(self, broadcaster_id: str, moderator_id: str, message_id: str) -> None:
+        """Delete a chat message.
+
+        Requires a token with the moderator:manage:chat_messages scope from
+        a moderator (or the broadcaster) of the channel.
+
+        Args:
+            broadcaster_id: ID of the channel
+            moderator_id: ID of the user the token belongs to
+            message_id: ID of the message (its "id" tag)
+        """
+        await self.delete(
+            "moderation/chat", {"broadcaster_id": broadcaster_id, "moderator_id": moderator_id, "message_id": message_id},
+        )
+
+    async def close(self) -> None:
+        """Close the pooled session."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,799 @@
+# Standard library imports
+import asyncio
+import heapq
+import json
+import mmap
+import os
+import random
+import sys
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Iterable, NamedTuple, Optional
+
+# Local imports
+from log import get_logger
+from metrics import counter, histogram
+
+log = get_logger("history")
+
+HISTORY_MESSAGES = counter("nuitbot_history_messages_total", "Chat messages recorded in the history")
+QUERY_SECONDS = histogram("nuitbot_history_query_seconds", "Time spent answering a history query, by query")
+
+# Directory holding the chat history, one subdirectory of segment files per
+# channel (empty keeps only the in-memory buffer)
+HISTORY_DIR = os.getenv("HISTORY_DIR", os.path.join(os.path.dirname(__file__), "..", "history"))
+
+# Recent messages kept in memory for each channel
+HISTORY_BUFFER_SIZE = int(os.getenv("HISTORY_BUFFER_SIZE", "10000"))
+
+# A segment is sealed and indexed once it reaches this many bytes, and a
+# channel's oldest segments are deleted beyond the segment limit
+HISTORY_SEGMENT_BYTES = int(os.getenv("HISTORY_SEGMENT_BYTES", str(8 * 1024 * 1024)))
+HISTORY_MAX_SEGMENTS = int(os.getenv("HISTORY_MAX_SEGMENTS", "128"))
+
+# Seconds between batched writes of new messages
+HISTORY_FLUSH_SECONDS = float(os.getenv("HISTORY_FLUSH_SECONDS", "1"))
+
+# Sealed segment indexes (and their memory maps) kept open for queries
+HISTORY_INDEX_CACHE = int(os.getenv("HISTORY_INDEX_CACHE", "8"))
+
+# A segment's time index records the offset of every this many messages
+TIME_INDEX_STEP = 256
+
+# Per-channel file listing every viewer's last message and message counts
+USERS_FILE = "users.json"
+
+class ChatRecord(NamedTuple):
+    """A chat message as kept in the history.
+
+    Attributes:
+        time: Unix time the message arrived
+        channel: Channel name (without "#" prefix)
+        user: Login name of the sender
+        display_name: Display name of the sender
+        text: Message text
+    """
+    time: float
+    channel: str
+    user: str
+    display_name: str
+    text: str
+
+def _encode(record: ChatRecord) -> bytes:
+    """One line of a segment file. The channel is implied by the directory."""
+    text = record.text.replace("\n", " ").replace("\r", " ")
+    return f"{record.time:.3f}\t{record.user}\t{record.display_name}\t{text}\n".encode()
+
+def _decode(channel: str, line: bytes) -> ChatRecord:
+    """Parse one line of a segment file."""
+    stamp, user, display_name, text = line.decode("utf-8", "replace").split("\t", 3)
+    return ChatRecord(float(stamp), channel, user, display_name, text)
+
+class _Segment:
+    """One append-only segment file, named after the time (ms) of its first message.
+
+    Until it is sealed, the segment's index lives in memory and grows with
+    every message. Sealing writes the index next to it as "<id>.idx" and
+    drops the in-memory copy; queries then read it back through the cache.
+
+    Attributes:
+        id: Unix time (ms) of the first message, also the file name
+        path: Path of the segment file
+        size: Bytes appended so far, including ones not written yet
+        written: Bytes written to the file
+        count: Number of messages
+        last: Unix time of the last message
+        users: Offsets of each user's messages (None once sealed)
+        times: (time, offset) of every TIME_INDEX_STEP-th message (None once sealed)
+        pending: Lines waiting to be written
+        sealed: Whether the index was written
+    """
+    __slots__ = ("id", "path", "size", "written", "count", "last", "users", "times", "pending", "sealed")
+
+    def __init__(self, directory: str, id: int, size: int = 0, sealed: bool = False) -> None:
+        self.id = id
+        self.path = os.path.join(directory, f"{id}.log")
+        self.size = size
+        self.written = size
+        self.count = 0
+        self.last = id / 1000
+        self.users: Optional[dict[str, list[int]]] = None if sealed else {}
+        self.times: Optional[list[tuple[float, int]]] = None if sealed else []
+        self.pending: list[bytes] = []
+        self.sealed = sealed
+
+    @property
+    def index_path(self) -> str:
+        return self.path[:-len(".log")] + ".idx"
+
+    def add(self, user: str, at: float, line: bytes) -> int:
+        """Append a line and index it. Returns its offset."""
+        offset = self.size
+        self.pending.append(line)
+        self.size += len(line)
+        offsets = self.users.get(user)
+        if offsets is None:
+            self.users[user] = [offset]
+        else:
+            offsets.append(offset)
+        if self.count % TIME_INDEX_STEP == 0:
+            self.times.append((at, offset))
+        self.count += 1
+        self.last = at
+        return offset
+
+    def index(self) -> dict:
+        """The index as written to disk."""
+        return {"count": self.count, "last": self.last, "users": self.users, "times": self.times}
+
+class _User:
+    """Where a viewer's messages are in a channel's history.
+
+    Attributes:
+        last_time: Unix time of their last message
+        segment: Segment holding their last message
+        offset: Offset of their last message in that segment
+        counts: Number of their messages by segment
+    """
+    __slots__ = ("last_time", "segment", "offset", "counts")
+
+    def __init__(self, last_time: float, segment: int, offset: int, counts: dict[int, int]) -> None:
+        self.last_time = last_time
+        self.segment = segment
+        self.offset = offset
+        self.counts = counts
+
+class _ChannelLog:
+    """The segments of one channel and the directory of its viewers."""
+
+    def __init__(self, channel: str, directory: str) -> None:
+        self.channel = channel
+        self.directory = directory
+        # Every segment by id, oldest first; the last one may be active
+        self.segments: OrderedDict[int, _Segment] = OrderedDict()
+        self.active: Optional[_Segment] = None
+        # Segments that were full and wait for their last write and their index
+        self.rotated: list[_Segment] = []
+        self.users: dict[str, _User] = {}
+
+    def load(self) -> None:
+        """Find the segments on disk, index any left unsealed by a crash, and load the directory."""
+        os.makedirs(self.directory, exist_ok=True)
+        ids = sorted(int(name[:-len(".log")]) for name in os.listdir(self.directory) if name.endswith(".log") and name[:-len(".log")].isdigit())
+
+        covered: set[int] = set()
+        path = os.path.join(self.directory, USERS_FILE)
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+                covered = set(data["segments"])
+                for user, (last_time, segment, offset, counts) in data["users"].items():
+                    self.users[sys.intern(user)] = _User(last_time, segment, offset, {int(id): count for id, count in counts.items()})
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                log.warning("Rebuilding the viewer directory of #%s: %s", self.channel, e)
+                covered = set()
+                self.users.clear()
+
+        for id in ids:
+            segment = _Segment(self.directory, id, os.path.getsize(os.path.join(self.directory, f"{id}.log")), sealed=True)
+            if not segment.size:
+                # Created, then the bot stopped before anything was written
+                os.remove(segment.path)
+                continue
+            if not os.path.exists(segment.index_path):
+                self._recover(segment)
+            self.segments[id] = segment
+            if id not in covered:
+                self._merge(segment)
+
+        # Forget segments whose files are gone
+        for user in list(self.users):
+            entry = self.users[user]
+            entry.counts = {id: count for id, count in entry.counts.items() if id in self.segments}
+            if entry.segment not in self.segments:
+                del self.users[user]
+
+    def _recover(self, segment: _Segment) -> None:
+        """Index a segment the bot did not get to seal, dropping a half-written last line."""
+        with open(segment.path, "rb") as f:
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            with open(segment.path, "r+b") as f:
+                f.truncate(end)
+
+        users: dict[str, list[int]] = {}
+        times: list[tuple[float, int]] = []
+        count, last, offset = 0, segment.id / 1000, 0
+        while offset < end:
+            newline = data.index(b"\n", offset)
+            try:
+                record = _decode(self.channel, data[offset:newline])
+            except ValueError:
+                offset = newline + 1
+                continue
+            users.setdefault(record.user, []).append(offset)
+            if count % TIME_INDEX_STEP == 0:
+                times.append((record.time, offset))
+            count += 1
+            last = record.time
+            offset = newline + 1
+
+        _write_json(segment.index_path, {"count": count, "last": last, "users": users, "times": times})
+        segment.size = segment.written = end
+        log.info("Indexed %s messages of #%s left unsealed in %s", count, self.channel, os.path.basename(segment.path))
+
+    def _merge(self, segment: _Segment) -> None:
+        """Add a sealed segment to the viewer directory."""
+        with open(segment.index_path, encoding="utf-8") as f:
+            index = json.load(f)
+        for user, offsets in index["users"].items():
+            user = sys.intern(user)
+            entry = self.users.get(user)
+            if entry is None:
+                entry = self.users[user] = _User(0.0, segment.id, offsets[-1], {})
+            entry.counts[segment.id] = len(offsets)
+            if segment.id >= entry.segment:
+                entry.segment = segment.id
+                entry.offset = offsets[-1]
+                # Only the segment's last message time is known; close enough
+                entry.last_time = max(entry.last_time, index["last"])
+
+    def append(self, record: ChatRecord, segment_bytes: int) -> None:
+        """Queue a message for writing and index it."""
+        segment = self.active
+        if segment is None or segment.size >= segment_bytes:
+            segment = self._rotate(record.time)
+
+        offset = segment.add(record.user, record.time, _encode(record))
+        entry = self.users.get(record.user)
+        if entry is None:
+            self.users[record.user] = _User(record.time, segment.id, offset, {segment.id: 1})
+        else:
+            entry.last_time = record.time
+            entry.segment = segment.id
+            entry.offset = offset
+            entry.counts[segment.id] = entry.counts.get(segment.id, 0) + 1
+
+    def _rotate(self, now: float) -> _Segment:
+        """Start a new segment; the full one is sealed by the next flush."""
+        if self.active is not None:
+            self.rotated.append(self.active)
+        id = int(now * 1000)
+        if self.segments:
+            id = max(id, next(reversed(self.segments)) + 1)
+        self.active = self.segments[id] = _Segment(self.directory, id)
+        return self.active
+
+    def ranges(self, since: float, until: float) -> list[_Segment]:
+        """Segments that may hold messages between two times, newest first."""
+        result = []
+        # A segment ends where the next one starts
+        end = float("inf")
+        for segment in reversed(self.segments.values()):
+            if segment.id / 1000 <= until and end >= since:
+                result.append(segment)
+            end = segment.id / 1000
+            if end < since:
+                break
+        return result
+
+    def snapshot_users(self) -> dict:
+        """The viewer directory as written to disk."""
+        return {
+            "segments": [id for id, segment in self.segments.items() if segment.sealed],
+            "users": {
+                user: [entry.last_time, entry.segment, entry.offset, entry.counts]
+                for user, entry in self.users.items()
+            },
+        }
+
+def _write_json(path: str, data: dict) -> None:
+    """Write a JSON file, replacing it atomically."""
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(f"{path}.tmp", path)
+
+class _Sealed:
+    """A sealed segment's index and memory map, held by the query cache."""
+    __slots__ = ("users", "times", "map")
+
+    def __init__(self, segment: _Segment) -> None:
+        with open(segment.index_path, encoding="utf-8") as f:
+            index = json.load(f)
+        self.users: dict[str, list[int]] = index["users"]
+        self.times: list[tuple[float, int]] = [tuple(entry) for entry in index["times"]]
+        with open(segment.path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def _line(data, offset: int) -> bytes:
+    """The line starting at an offset of a segment's bytes or memory map."""
+    end = data.find(b"\n", offset)
+    return data[offset:end if end >= 0 else len(data)]
+
+class ChatHistory:
+    """Recent chat in memory and the full history on disk.
+
+    Every message goes into its channel's fixed-size ring buffer of
+    compact records and, if a directory is set, into the channel's active segment file.
+    Segments are append-only and written in batches; when one is full it
+    is sealed with an index of each viewer's message offsets and a sparse
+    time index, and a new one is started. A per-channel viewer directory
+    points at everyone's last message and counts their messages per
+    segment, so "last seen" is a single read and quotes and searches only
+    touch the segments that can match. Sealed segments are read through
+    memory maps, and only a few of their indexes are held in memory.
+    """
+
+    def __init__(
+        self,
+        directory: str = HISTORY_DIR,
+        buffer_size: int = HISTORY_BUFFER_SIZE,
+        segment_bytes: int = HISTORY_SEGMENT_BYTES,
+        max_segments: int = HISTORY_MAX_SEGMENTS,
+        flush_interval: float = HISTORY_FLUSH_SECONDS,
+        index_cache: int = HISTORY_INDEX_CACHE,
+    ) -> None:
+        """Initialize an empty history.
+
+        Args:
+            directory: Directory for the segment files (empty keeps only the buffer)
+            buffer_size: Recent messages kept in memory per channel
+            segment_bytes: Size at which a segment is sealed
+            max_segments: Segments kept per channel; older ones are deleted
+            flush_interval: Seconds between batched writes
+            index_cache: Sealed segment indexes kept in memory for queries
+        """
+        self._directory = directory
+        # One buffer per channel, so a busy channel doesn't push out the others
+        self._buffers: dict[str, deque[ChatRecord]] = {}
+        self._buffer_size = buffer_size
+        self._segment_bytes = segment_bytes
+        self._max_segments = max_segments
+        self._flush_interval = flush_interval
+        self._logs: dict[str, _ChannelLog] = {}
+        # Channels whose history could not be loaded; they only use the buffer
+        self._failed: set[str] = set()
+        self._flush_lock = asyncio.Lock()
+
+        # Read from query threads, so guarded by a lock
+        self._cache: OrderedDict[str, _Sealed] = OrderedDict()
+        self._cache_size = index_cache
+        self._cache_lock = threading.Lock()
+
+    def _load(self, channel: str) -> _ChannelLog:
+        """Load a channel's segments (runs on a worker thread at startup)."""
+        channel_log = _ChannelLog(channel, os.path.join(self._directory, channel))
+        channel_log.load()
+        return channel_log
+
+    async def open(self, channels: Iterable[str]) -> None:
+        """Load the history of the channels the bot is about to join."""
+        if not self._directory:
+            return
+        for channel in channels:
+            await self._open_log(channel)
+        segments = sum(len(channel_log.segments) for channel_log in self._logs.values())
+        log.info("Loaded chat history of %s channels (%s segments) from %s", len(self._logs), segments, self._directory)
+
+    async def _open_log(self, channel: str) -> Optional[_ChannelLog]:
+        """A channel's log, loaded on a worker thread if it is not loaded yet."""
+        if not self._directory or channel in self._failed:
+            return None
+        channel_log = self._logs.get(channel)
+        if channel_log is None:
+            try:
+                loaded = await asyncio.to_thread(self._load, channel)
+            except (OSError, ValueError) as e:
+                log.error("Chat history of #%s unavailable (%s). Only recent chat will be kept.", channel, e)
+                self._failed.add(channel)
+                return None
+            # Another lookup may have loaded it meanwhile
+            channel_log = self._logs.setdefault(channel, loaded)
+        return channel_log
+
+    def _log(self, channel: str) -> Optional[_ChannelLog]:
+        """A channel's log, loaded on first use if the channel was not opened."""
+        if not self._directory or channel in self._failed:
+            return None
+        channel_log = self._logs.get(channel)
+        if channel_log is None:
+            try:
+                channel_log = self._logs[channel] = self._load(channel)
+            except (OSError, ValueError) as e:
+                log.error("Chat history of #%s unavailable (%s). Only recent chat will be kept.", channel, e)
+                self._failed.add(channel)
+        return channel_log
+
+    def record(self, channel: str, user: str, display_name: str, text: str, now: Optional[float] = None) -> ChatRecord:
+        """Add a chat message to the history.
+
+        Args:
+            channel: Channel name (without "#" prefix)
+            user: Login name of the sender
+            display_name: Display name of the sender
+            text: Message text
+            now: Unix time the message arrived
+
+        Returns:
+            The stored record
+        """
+        record = ChatRecord(
+            time.time() if now is None else now, sys.intern(channel), sys.intern(user), display_name, text,
+        )
+        buffer = self._buffers.get(record.channel)
+        if buffer is None:
+            buffer = self._buffers[record.channel] = deque(maxlen=self._buffer_size)
+        buffer.append(record)
+        HISTORY_MESSAGES.inc()
+        channel_log = self._log(channel)
+        if channel_log is not None:
+            channel_log.append(record, self._segment_bytes)
+        return record
+
+    def recent(self, channel: Optional[str] = None, limit: int = 50) -> list[ChatRecord]:
+        """The most recent messages held in memory, oldest first.
+
+        Args:
+            channel: Only messages of this channel (None for every channel)
+            limit: Maximum number of messages
+        """
+        buffers = self._buffers.values() if channel is None else [self._buffers.get(channel, ())]
+        # Newest first, interleaved by time across channels
+        newest = heapq.merge(*(reversed(buffer) for buffer in buffers), key=lambda record: record.time, reverse=True)
+        result = list(islice(newest, limit))
+        result.reverse()
+        return result
+
+    def _sealed(self, segment: _Segment) -> _Sealed:
+        """A sealed segment's index and memory map, from the cache (runs on a worker thread)."""
+        with self._cache_lock:
+            sealed = self._cache.get(segment.path)
+            if sealed is not None:
+                self._cache.move_to_end(segment.path)
+                return sealed
+
+        sealed = _Sealed(segment)
+        with self._cache_lock:
+            self._cache[segment.path] = sealed
+            while len(self._cache) > self._cache_size:
+                _, evicted = self._cache.popitem(last=False)
+                evicted.map.close()
+        return sealed
+
+    def _read(self, channel: str, segment: _Segment, offsets: list[int], size: int) -> list[ChatRecord]:
+        """Read messages by offset (runs on a worker thread).
+
+        Args:
+            channel: Channel name
+            segment: Segment holding the messages
+            offsets: Offsets of the messages
+            size: Bytes of the segment that are on disk
+        """
+        if segment.sealed:
+            data = self._sealed(segment).map
+            return [_decode(channel, _line(data, offset)) for offset in offsets]
+
+        # The active segment keeps growing, so map what is written so far
+        if not size:
+            return []
+        with open(segment.path, "rb") as f, mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as data:
+            return [_decode(channel, _line(data, offset)) for offset in offsets if offset < size]
+
+    async def last_seen(self, channel: str, user: str) -> Optional[ChatRecord]:
+        """A viewer's last message in a channel.
+
+        Args:
+            channel: Channel name (without "#" prefix)
+            user: Login name
+
+        Returns:
+            The message, or None if the viewer never chatted there
+        """
+        start = time.perf_counter()
+        try:
+            channel_log = await self._open_log(channel)
+            if channel_log is None:
+                return next((record for record in reversed(self._buffers.get(channel, ())) if record.user == user), None)
+
+            await self.flush()
+            entry = channel_log.users.get(user)
+            segment = channel_log.segments.get(entry.segment) if entry is not None else None
+            if segment is None:
+                return None
+            records = await asyncio.to_thread(self._read, channel, segment, [entry.offset], segment.written)
+            return records[0] if records else None
+        except (OSError, ValueError) as e:
+            log.warning("Last seen lookup in #%s failed: %s", channel, e)
+            return None
+        finally:
+            QUERY_SECONDS.observe(time.perf_counter() - start, query="last_seen")
+
+    async def quote(self, channel: str, user: Optional[str] = None) -> Optional[ChatRecord]:
+        """A random message of a viewer, or a random recent message of the channel.
+
+        Args:
+            channel: Channel name (without "#" prefix)
+            user: Login name (None for any recent message)
+
+        Returns:
+            The message, or None if there is none
+        """
+        start = time.perf_counter()
+        try:
+            channel_log = await self._open_log(channel)
+            if user is None or channel_log is None:
+                candidates = [record for record in self._buffers.get(channel, ()) if user is None or record.user == user]
+                return random.choice(candidates) if candidates else None
+
+            await self.flush()
+            entry = channel_log.users.get(user)
+            if entry is None or not entry.counts:
+                return None
+
+            # Pick a segment weighted by how often the viewer chatted there, then a message in it
+            ids = list(entry.counts)
+            segment = channel_log.segments[random.choices(ids, [entry.counts[id] for id in ids])[0]]
+            size = segment.written
+
+            if segment.sealed:
+                def pick() -> list[ChatRecord]:
+                    offsets = self._sealed(segment).users.get(user)
+                    return self._read(channel, segment, [random.choice(offsets)], size) if offsets else []
+
+                records = await asyncio.to_thread(pick)
+            else:
+                offsets = [offset for offset in segment.users.get(user, ()) if offset < size]
+                records = await asyncio.to_thread(self._read, channel, segment, [random.choice(offsets)], size) if offsets else []
+            return records[0] if records else None
+        except (OSError, ValueError) as e:
+            log.warning("Quote lookup in #%s failed: %s", channel, e)
+            return None
+        finally:
+            QUERY_SECONDS.observe(time.perf_counter() - start, query="quote")
+
+    def _scan(
+        self, channel: str, segment: _Segment, size: int,
+        offsets: Optional[list[int]], times: Optional[list[tuple[float, int]]],
+        text: str, user: str, since: float, until: float,
+    ) -> list[ChatRecord]:
+        """Find matching messages in one segment, oldest first (runs on a worker thread).
+
+        Args:
+            channel: Channel name
+            segment: Segment to search
+            size: Bytes of the segment that are on disk
+            offsets: The viewer's offsets in an unsealed segment (None to use the index)
+            times: Time index of an unsealed segment (None to use the index)
+            text: Lowercase text the message must contain ("" for any)
+            user: Login name the sender must have ("" for anyone)
+            since: Earliest message time
+            until: Latest message time
+        """
+        if segment.sealed:
+            sealed = self._sealed(segment)
+            offsets = sealed.users.get(user, []) if user else None
+            return self._match(channel, sealed.map, len(sealed.map), offsets, sealed.times, text, user, since, until)
+
+        if not size:
+            return []
+        with open(segment.path, "rb") as f, mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as data:
+            return self._match(channel, data, size, offsets, times, text, user, since, until)
+
+    @staticmethod
+    def _match(
+        channel: str, data, size: int, offsets: Optional[list[int]], times: list[tuple[float, int]],
+        text: str, user: str, since: float, until: float,
+    ) -> list[ChatRecord]:
+        """Filter a segment's messages, reading only the viewer's lines or the lines in the time range."""
+        matches = []
+
+        def check(line: bytes) -> Optional[bool]:
+            # True: matches, False: doesn't, None: past the time range
+            record = _decode(channel, line)
+            if record.time > until:
+                return None
+            if record.time >= since and (not user or record.user == user) and (not text or text in record.text.lower()):
+                matches.append(record)
+            return True
+
+        if offsets is not None:
+            for offset in offsets:
+                if offset < size and check(_line(data, offset)) is None:
+                    break
+            return matches
+
+        # Start at the last indexed message before the range
+        position = bisect_right(times, (since, -1)) - 1
+        offset = times[position][1] if position >= 0 else 0
+        while offset < size:
+            end = data.find(b"\n", offset)
+            if end < 0:
+                break
+            if check(data[offset:end]) is None:
+                break
+            offset = end + 1
+        return matches
+
+    async def search(
+        self, channel: str, text: str = "", user: str = "",
+        since: Optional[float] = None, until: Optional[float] = None, limit: int = 50,
+    ) -> list[ChatRecord]:
+        """Search a channel's history, e.g. after a stream.
+
+        Args:
+            channel: Channel name (without "#" prefix)
+            text: Text the message must contain, ignoring case ("" for any)
+            user: Login name the sender must have ("" for anyone)
+            since: Earliest message time (Unix time)
+            until: Latest message time (Unix time)
+            limit: Maximum number of messages (the newest are returned)
+
+        Returns:
+            Matching messages, oldest first
+        """
+        start = time.perf_counter()
+        text = text.lower()
+        since = 0.0 if since is None else since
+        until = float("inf") if until is None else until
+        try:
+            channel_log = await self._open_log(channel)
+            if channel_log is None:
+                records = [
+                    record for record in self._buffers.get(channel, ())
+                    if since <= record.time <= until
+                    and (not user or record.user == user) and (not text or text in record.text.lower())
+                ]
+                return records[-limit:]
+
+            await self.flush()
+            entry = channel_log.users.get(user) if user else None
+            if user and entry is None:
+                return []
+
+            results: list[ChatRecord] = []
+            for segment in channel_log.ranges(since, until):
+                if entry is not None and segment.id not in entry.counts:
+                    continue
+                # Copy what the worker thread needs; the loop keeps appending meanwhile
+                offsets = times = None
+                if not segment.sealed:
+                    offsets = list(segment.users.get(user, ())) if user else None
+                    times = list(segment.times)
+                matches = await asyncio.to_thread(
+                    self._scan, channel, segment, segment.written, offsets, times, text, user, since, until,
+                )
+                results[:0] = matches
+                if len(results) >= limit:
+                    break
+            return results[-limit:]
+        except (OSError, ValueError) as e:
+            log.warning("History search in #%s failed: %s", channel, e)
+            return []
+        finally:
+            QUERY_SECONDS.observe(time.perf_counter() - start, query="search")
+
+    def _write(self, chunks: list[tuple[_Segment, bytes, int, int]], seal: list[tuple[str, dict]]) -> None:
+        """Append pending lines and write the indexes of full segments (runs on a worker thread)."""
+        for segment, data, size, _ in chunks:
+            with open(segment.path, "ab") as f:
+                # A failed write may have left part of its batch behind; the
+                # offsets only hold if the batch is written again from the start
+                start = size - len(data)
+                if f.tell() != start:
+                    f.truncate(start)
+                f.write(data)
+        for path, index in seal:
+            _write_json(path, index)
+
+    def _delete(self, segments: list[_Segment]) -> None:
+        """Delete segment files (runs on a worker thread)."""
+        for segment in segments:
+            with self._cache_lock:
+                sealed = self._cache.pop(segment.path, None)
+            if sealed is not None:
+                sealed.map.close()
+            for path in (segment.path, segment.index_path):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    log.warning("Deleting old chat history failed: %s", e)
+
+    def _expire(self, channel_log: _ChannelLog) -> list[_Segment]:
+        """Drop a channel's oldest segments beyond the limit from its directory."""
+        expired = []
+        while len(channel_log.segments) > self._max_segments:
+            id, segment = next(iter(channel_log.segments.items()))
+            if not segment.sealed:
+                break
+            del channel_log.segments[id]
+            expired.append(segment)
+        if expired:
+            gone = {segment.id for segment in expired}
+            for user in list(channel_log.users):
+                entry = channel_log.users[user]
+                for id in gone:
+                    entry.counts.pop(id, None)
+                if entry.segment in gone:
+                    del channel_log.users[user]
+        return expired
+
+    async def flush(self, seal_active: bool = False) -> int:
+        """Write pending messages and seal the segments that are full.
+
+        Args:
+            seal_active: Also seal the active segments, e.g. on shutdown
+
+        Returns:
+            Number of bytes written
+        """
+        async with self._flush_lock:
+            chunks, seal, sealed, expired, rotated = [], [], [], [], []
+            for channel_log in self._logs.values():
+                if seal_active and channel_log.active is not None:
+                    channel_log.rotated.append(channel_log.active)
+                    channel_log.active = None
+                # Only taken off the log once written, so a failed write is retried by the next flush
+                full = list(channel_log.rotated)
+                rotated.append((channel_log, len(full)))
+
+                for segment in [*full, channel_log.active]:
+                    if segment is not None and segment.pending:
+                        # The size is what will be on disk once this batch is written
+                        chunks.append((segment, b"".join(segment.pending), segment.size, len(segment.pending)))
+                for segment in full:
+                    # Nothing is added to a full segment, so its index can be written as is
+                    seal.append((segment.index_path, segment.index()))
+                    sealed.append(segment)
+
+            if not chunks and not seal:
+                return 0
+
+            try:
+                await asyncio.to_thread(self._write, chunks, seal)
+            except OSError as e:
+                log.error("Writing chat history failed, retrying with the next batch: %s", e)
+                return 0
+
+            # Lines added while the batch was written stay pending
+            for segment, _, size, count in chunks:
+                del segment.pending[:count]
+                segment.written = size
+            for channel_log, count in rotated:
+                del channel_log.rotated[:count]
+            for segment in sealed:
+                segment.sealed = True
+                segment.users = segment.times = None
+            for channel_log in self._logs.values():
+                expired.extend(self._expire(channel_log))
+            if expired:
+                await asyncio.to_thread(self._delete, expired)
+            return sum(len(data) for _, data, _, _ in chunks)
+
+    async def run(self) -> None:
+        """Flush on a timer until cancelled."""
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            await self.flush()
+
+    async def close(self) -> None:
+        """Write everything, seal the active segments and save the viewer directories."""
+        await self.flush(seal_active=True)
+
+        def save() -> None:
+            for channel_log in self._logs.values():
+                _write_json(os.path.join(channel_log.directory, USERS_FILE), directories[channel_log.channel])
+            with self._cache_lock:
+                for sealed in self._cache.values():
+                    sealed.map.close()
+                self._cache.clear()
+
+        directories = {channel: channel_log.snapshot_users() for channel, channel_log in self._logs.items()}
+        try:
+            await asyncio.to_thread(save)
+        except OSError as e:
+            log.error("Saving the chat history directory failed: %s", e)
@@ -0,0 +1,210 @@
+# Standard library imports
+import sys
+from typing import Iterator, Optional
+
+# IRC commands sent by Twitch that the bot understands
+PRIVMSG = "PRIVMSG"
+USERNOTICE = "USERNOTICE"
+CLEARCHAT = "CLEARCHAT"
+ROOMSTATE = "ROOMSTATE"
+USERSTATE = "USERSTATE"
+RECONNECT = "RECONNECT"
+NOTICE = "NOTICE"
+JOIN = "JOIN"
+PART = "PART"
+NAMES = "353"
+PING = "PING"
+# Sent once Twitch accepted the login
+WELCOME = "001"
+GLOBALUSERSTATE = "GLOBALUSERSTATE"
+
+# IRCv3 tag value escape sequences
+_TAG_ESCAPES = {
+    ":": ";",
+    "s": " ",
+    "\\": "\\",
+    "r": "\r",
+    "n": "\n",
+}
+
+def unescape_tag_value(value: str) -> str:
+    """Decode an IRCv3 escaped tag value.
+
+    Args:
+        value: The raw tag value as sent by the server
+
+    Returns:
+        The decoded tag value
+    """
+    if "\\" not in value:
+        return value
+
+    decoded: list[str] = []
+    i = 0
+    length = len(value)
+    while i < length:
+        char = value[i]
+        if char == "\\" and i + 1 < length:
+            i += 1
+            decoded.append(_TAG_ESCAPES.get(value[i], value[i]))
+        elif char != "\\":
+            decoded.append(char)
+        i += 1
+    return "".join(decoded)
+
+class IrcMessage:
+    """A single parsed IRC line.
+
+    Tags are kept as the raw tag string until they are first accessed, so
+    messages that are only routed or dropped never pay for tag decoding.
+
+    Attributes:
+        raw_tags: Undecoded tag string (without the leading "@")
+        prefix: Message source (without the leading ":")
+        command: IRC command or numeric reply
+        params: Middle parameters
+        trailing: Trailing parameter (text after " :"), or None
+    """
+    __slots__ = ("raw_tags", "prefix", "command", "params", "trailing", "_tags")
+
+    def __init__(self, raw_tags: str, prefix: str, command: str, params: list[str], trailing: Optional[str]):
+        self.raw_tags = raw_tags
+        self.prefix = prefix
+        self.command = command
+        self.params = params
+        self.trailing = trailing
+        self._tags: Optional[dict[str, str]] = None
+
+    @property
+    def tags(self) -> dict[str, str]:
+        """Dictionary of decoded IRC tags, built on first access."""
+        tags = self._tags
+        if tags is None:
+            tags = {}
+            raw_tags = self.raw_tags
+            if raw_tags:
+                intern = sys.intern
+                for tag in raw_tags.split(";"):
+                    key, _, value = tag.partition("=")
+                    tags[intern(key)] = value
+
+                # Escapes are rare, so only decode values when the raw string has any
+                if "\\" in raw_tags:
+                    for key, value in tags.items():
+                        if "\\" in value:
+                            tags[key] = unescape_tag_value(value)
+            self._tags = tags
+        return tags
+
+    def tag(self, key: str, default: str = "") -> str:
+        """Look up a single tag without decoding the rest.
+
+        Args:
+            key: Tag name, e.g. "display-name"
+            default: Value returned when the tag is missing
+
+        Returns:
+            The decoded tag value, or the default
+        """
+        if self._tags is not None:
+            return self._tags.get(key, default)
+
+        raw_tags = self.raw_tags
+        needle = key + "="
+        if raw_tags.startswith(needle):
+            start = len(needle)
+        else:
+            start = raw_tags.find(";" + needle)
+            if start < 0:
+                return default
+            start += len(needle) + 1
+
+        end = raw_tags.find(";", start)
+        value = raw_tags[start:] if end < 0 else raw_tags[start:end]
+        return unescape_tag_value(value)
+
+    @property
+    def user(self) -> str:
+        """The nickname of the sender, taken from the prefix."""
+        return self.prefix.split("!", 1)[0]
+
+    @property
+    def channel(self) -> str:
+        """The channel the message targets (without "#" prefix)."""
+        if self.params and self.params[0].startswith("#"):
+            return self.params[0][1:]
+        return ""
+
+    @property
+    def message(self) -> str:
+        """The message text (trailing parameter), or an empty string."""
+        return self.trailing or ""
+
+    def __str__(self) -> str:
+        """String representation of the message."""
+        if self.command == PRIVMSG:
+            display_name = self.tag("display-name") or self.user
+            return f"[#{self.channel}] {display_name}: {self.message}"
+        return f"{self.command} {' '.join(self.params)} {self.message}".strip()
+
+def parse_line(line: str) -> Optional[IrcMessage]:
+    """Parse a single IRC line.
+
+    Args:
+        line: A raw IRC line without the trailing CRLF
+
+    Returns:
+        The parsed message, or None if the line is empty
+    """
+    raw_tags = ""
+    prefix = ""
+
+    if line.startswith("@"):
+        raw_tags, _, line = line[1:].partition(" ")
+    if line.startswith(":"):
+        prefix, _, line = line[1:].partition(" ")
+
+    line, sep, trailing = line.partition(" :")
+    parts = line.split()
+    if not parts:
+        return None
+
+    return IrcMessage(
+        raw_tags,
+        prefix,
+        sys.intern(parts[0]),
+        parts[1:],
+        trailing if sep else None,
+    )
+
+class IrcParser:
+    """Streaming parser that splits websocket frames into IRC messages.
+
+    Twitch packs several CRLF-terminated lines into one frame. A line that is
+    cut off at the end of a frame is buffered until the rest arrives.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = ""
+
+    def feed(self, data: str) -> Iterator[IrcMessage]:
+        """Feed a frame into the parser and yield each complete message.
+
+        Args:
+            data: Raw frame received from the websocket
+
+        Yields:
+            Parsed messages in the order they were received
+        """
+        if self._buffer:
+            data = self._buffer + data
+            self._buffer = ""
+
+        lines = data.split("\r\n")
+        # Anything after the last CRLF is an incomplete line
+        self._buffer = lines.pop()
+
+        for line in lines:
+            message = parse_line(line)
+            if message is not None:
+                yield message
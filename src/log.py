@@ -0,0 +1,215 @@
+# Standard library imports
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from typing import Optional
+
+# Local imports
+from utils import *
+
+# Every subsystem logs under this root, e.g. "nuitbot.irc"
+ROOT_LOGGER = "nuitbot"
+
+# Default level, output format ("console" or "json") and per-subsystem
+# overrides, e.g. LOG_LEVELS=irc.raw=DEBUG,obs=WARNING
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "console")
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+
+# Color used by the console formatter for each level
+LEVEL_COLORS = {
+    logging.DEBUG: blue,
+    logging.INFO: cyan,
+    logging.WARNING: yellow,
+    logging.ERROR: red,
+    logging.CRITICAL: red,
+}
+
+def get_logger(subsystem: str) -> logging.Logger:
+    """Get the logger for a subsystem.
+
+    Args:
+        subsystem: Subsystem name, e.g. "irc", "obs" or "irc.raw"
+
+    Returns:
+        The "nuitbot.<subsystem>" logger
+    """
+    return logging.getLogger(f"{ROOT_LOGGER}.{subsystem}")
+
+class ColorFormatter(logging.Formatter):
+    """Human-readable console format, colored by level."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        subsystem = record.name[len(ROOT_LOGGER) + 1:] or ROOT_LOGGER
+        text = f"{self.formatTime(record, '%H:%M:%S')} {subsystem:<8} {record.getMessage().rstrip()}"
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return LEVEL_COLORS.get(record.levelno, str)(text)
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for journald or log shippers."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": record.created,
+            "level": record.levelname.lower(),
+            "subsystem": record.name[len(ROOT_LOGGER) + 1:] or ROOT_LOGGER,
+            "message": record.getMessage().rstrip(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+class SampleFilter(logging.Filter):
+    """Lets a burst of records through every second, then only one in N.
+
+    Used on high-volume loggers (raw IRC lines) so a raid cannot flood the
+    log output.
+    """
+
+    def __init__(self, burst: int = 50, every: int = 100) -> None:
+        """Initialize the filter.
+
+        Args:
+            burst: Records passed unconditionally per second
+            every: After the burst, pass one record in this many
+        """
+        super().__init__()
+        self._burst = burst
+        self._every = every
+        self._window = 0
+        self._count = 0
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        window = int(record.created)
+        if window != self._window:
+            self._window = window
+            self._count = 0
+
+        self._count += 1
+        if self._count <= self._burst or self._count % self._every == 0:
+            return True
+        self.suppressed += 1
+        return False
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that never blocks: records are dropped if the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting happens on the listener thread, so only resolve the
+        # message here (arguments may change after the record is queued)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+def parse_level(level: str) -> Optional[int]:
+    """Parse a level name such as "DEBUG" or a level number.
+
+    Args:
+        level: Level name (any case) or number
+
+    Returns:
+        The level, or None if it is not one
+    """
+    level = level.strip().upper()
+    if level.isdigit():
+        return int(level)
+    value = logging.getLevelName(level)
+    return value if isinstance(value, int) else None
+
+def parse_levels(spec: str) -> dict[str, int]:
+    """Parse per-subsystem levels.
+
+    Entries that are not "subsystem=LEVEL" with a known level are skipped
+    with a warning on stderr (logging is not set up yet when this runs).
+
+    Args:
+        spec: Comma-separated "subsystem=LEVEL" pairs, e.g. "irc.raw=WARNING,obs=DEBUG"
+
+    Returns:
+        Level by subsystem name
+    """
+    levels: dict[str, int] = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        subsystem, sep, level = item.strip().partition("=")
+        value = parse_level(level) if sep and subsystem.strip() else None
+        if value is None:
+            print(f"Ignoring invalid LOG_LEVELS entry: {item.strip()!r}", file=sys.stderr)
+            continue
+        levels[subsystem.strip()] = value
+    return levels
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def _stop_listener() -> None:
+    """Flush queued records on exit."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def setup_logging(
+    level: str = LOG_LEVEL,
+    fmt: str = LOG_FORMAT,
+    levels: str = LOG_LEVELS,
+    queue_size: int = 10000,
+    sample_burst: int = 50,
+    sample_every: int = 100,
+) -> None:
+    """Configure non-blocking logging for every subsystem.
+
+    Records are put on a bounded queue and written by a background thread,
+    so a slow terminal or journald never stalls the event loop.
+
+    Args:
+        level: Default level, e.g. "INFO"
+        fmt: "console" for colored text or "json" for one JSON object per line
+        levels: Per-subsystem overrides (see parse_levels)
+        queue_size: Maximum number of records waiting to be written
+        sample_burst: Raw IRC lines logged unconditionally per second
+        sample_every: After the burst, log one raw IRC line in this many
+    """
+    global _listener
+    _stop_listener()
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else ColorFormatter())
+
+    log_queue: queue.Queue = queue.Queue(queue_size)
+    handler = DroppingQueueHandler(log_queue)
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.handlers = [handler]
+    root_level = parse_level(level)
+    if root_level is None:
+        print(f"Ignoring invalid LOG_LEVEL {level!r}, using INFO", file=sys.stderr)
+        root_level = logging.INFO
+    root.setLevel(root_level)
+    root.propagate = False
+
+    for subsystem, subsystem_level in parse_levels(levels).items():
+        get_logger(subsystem).setLevel(subsystem_level)
+
+    raw = get_logger("irc.raw")
+    raw.filters = [SampleFilter(sample_burst, sample_every)]
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_stop_listener)
@@ -0,0 +1,291 @@
+# Standard library imports
+import asyncio
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+# Latency buckets in seconds, from half a millisecond to five seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+LabelKey = tuple[tuple[str, str], ...]
+
+def _label_key(labels: dict[str, str]) -> LabelKey:
+    """Turn label keyword arguments into a hashable, ordered key."""
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _format_labels(key: LabelKey, extra: Optional[tuple[str, str]] = None) -> str:
+    """Render labels in Prometheus text format, e.g. {command="tts"}."""
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _format_value(value: float) -> str:
+    """Render a sample value, using "+Inf" for infinity."""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+class Metric:
+    """Base class for a named metric with optional labels."""
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str) -> None:
+        """Initialize the metric.
+
+        Args:
+            name: Metric name, e.g. "nuitbot_irc_parse_seconds"
+            documentation: One-line description shown in the HELP line
+        """
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+
+    def samples(self) -> Iterator[tuple[str, str, float]]:
+        """Yield (name, rendered labels, value) for every sample."""
+        return iter(())
+
+    def render(self) -> str:
+        """Render the metric in Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in self.samples())
+        return "\n".join(lines)
+
+class Counter(Metric):
+    """Value that only goes up, e.g. the number of reconnects."""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str) -> None:
+        super().__init__(name, documentation)
+        self._values: dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Increase the counter.
+
+        Args:
+            amount: How much to add
+            **labels: Label values, e.g. connection="twitch"
+        """
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        """Current value for the given labels."""
+        return self._values.get(_label_key(labels), 0.0)
+
+    def samples(self) -> Iterator[tuple[str, str, float]]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name, _format_labels(key), value
+
+class Gauge(Metric):
+    """Value that goes up and down, e.g. a queue depth.
+
+    Values can be set directly or read from a callback at render time, so
+    queue depths cost nothing until the endpoint is scraped.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str) -> None:
+        super().__init__(name, documentation)
+        self._values: dict[LabelKey, float] = {}
+        self._functions: dict[LabelKey, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        """Set the gauge.
+
+        Args:
+            value: New value
+            **labels: Label values
+        """
+        self._values[_label_key(labels)] = value
+
+    def set_function(self, function: Callable[[], float], **labels: str) -> None:
+        """Read the gauge from a callback whenever it is rendered.
+
+        Args:
+            function: Returns the current value
+            **labels: Label values
+        """
+        with self._lock:
+            self._functions[_label_key(labels)] = function
+
+    def value(self, **labels: str) -> float:
+        """Current value for the given labels."""
+        key = _label_key(labels)
+        function = self._functions.get(key)
+        return function() if function else self._values.get(key, 0.0)
+
+    def samples(self) -> Iterator[tuple[str, str, float]]:
+        with self._lock:
+            values = dict(self._values)
+            functions = list(self._functions.items())
+        for key, function in functions:
+            try:
+                values[key] = function()
+            except Exception:
+                # The object behind the callback may be gone or mid-update
+                continue
+        for key, value in values.items():
+            yield self.name, _format_labels(key), value
+
+class Histogram(Metric):
+    """Distribution of observed values, e.g. latencies, in fixed buckets."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        """Initialize the histogram.
+
+        Args:
+            name: Metric name, should end in "_seconds" for latencies
+            documentation: One-line description shown in the HELP line
+            buckets: Upper bounds of the buckets, in increasing order
+        """
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (last one is +Inf), sum]
+        self._series: dict[LabelKey, tuple[list[int], list[float]]] = {}
+
+    def _get_series(self, key: LabelKey) -> tuple[list[int], list[float]]:
+        """Get or create the bucket counts and sum for a label set."""
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        return series
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record a value.
+
+        Args:
+            value: Observed value, e.g. seconds
+            **labels: Label values, e.g. command="tts"
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        key = _label_key(labels) if labels else ()
+        with self._lock:
+            counts, total = self._get_series(key)
+            counts[index] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the time spent in a with block.
+
+        Args:
+            **labels: Label values
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        """Number of observed values for the given labels."""
+        series = self._series.get(_label_key(labels))
+        return sum(series[0]) if series else 0
+
+    def quantile(self, q: float, **labels: str) -> float:
+        """Estimate a quantile from the buckets.
+
+        Args:
+            q: Quantile between 0 and 1, e.g. 0.99
+            **labels: Label values
+
+        Returns:
+            Upper bound of the bucket holding the quantile (+Inf if above the last bucket)
+        """
+        series = self._series.get(_label_key(labels))
+        if not series:
+            return 0.0
+        counts = series[0]
+        target = q * sum(counts)
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def samples(self) -> Iterator[tuple[str, str, float]]:
+        with self._lock:
+            series = [(key, list(counts), total[0]) for key, (counts, total) in self._series.items()]
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", _format_labels(key, ("le", _format_value(bound))), cumulative
+            yield f"{self.name}_sum", _format_labels(key), total
+            yield f"{self.name}_count", _format_labels(key), cumulative
+
+class Registry:
+    """Collection of metrics rendered together by the metrics endpoint."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """Add a metric, or return the existing one with the same name.
+
+        Returning the existing metric keeps module reloads (e.g. plugins)
+        from registering duplicates.
+
+        Args:
+            metric: Metric to add
+
+        Returns:
+            The registered metric
+        """
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def get(self, name: str) -> Optional[Metric]:
+        """Look up a metric by name."""
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Render every metric in Prometheus text format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+# Process-wide registry, served by the /metrics endpoint
+REGISTRY = Registry()
+
+def counter(name: str, documentation: str) -> Counter:
+    """Create (or get) a counter in the process-wide registry."""
+    return REGISTRY.register(Counter(name, documentation))
+
+def gauge(name: str, documentation: str) -> Gauge:
+    """Create (or get) a gauge in the process-wide registry."""
+    return REGISTRY.register(Gauge(name, documentation))
+
+def histogram(name: str, documentation: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    """Create (or get) a histogram in the process-wide registry."""
+    return REGISTRY.register(Histogram(name, documentation, buckets))
+
+LOOP_LAG = histogram("nuitbot_event_loop_lag_seconds", "How late the event loop woke up a sleeping task")
+LOOP_LAG_LAST = gauge("nuitbot_event_loop_lag_last_seconds", "Event loop lag of the most recent check")
+
+async def monitor_loop_lag(interval: float = 0.5) -> None:
+    """Measure event loop lag until cancelled.
+
+    Sleeps for a fixed interval and records how much later than requested
+    the loop woke the task up. Anything blocking the loop (slow handlers,
+    synchronous I/O) shows up as lag.
+
+    Args:
+        interval: Seconds between checks
+    """
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.perf_counter() - start - interval)
+        LOOP_LAG.observe(lag)
+        LOOP_LAG_LAST.set(lag)
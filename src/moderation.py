@@ -0,0 +1,325 @@
+# Standard library imports
+import asyncio
+import os
+import re
+import time
+import unicodedata
+from collections import deque
+from typing import Iterable, Optional
+
+# Local imports
+from log import get_logger
+from metrics import counter, histogram
+
+log = get_logger("mod")
+
+MODERATION_MATCHES = counter("nuitbot_moderation_matches_total", "Chat messages that matched a banned phrase, by action")
+MODERATION_SECONDS = histogram("nuitbot_moderation_seconds", "Time spent normalizing and scanning one chat message")
+
+# Banned phrases, one per line (see load_phrases); no file disables the filter
+MODERATION_FILE = os.getenv("MODERATION_FILE", os.path.join(os.path.dirname(__file__), "moderation.txt"))
+
+# What happens to a matching message: "log" only keeps it away from commands,
+# triggers and the trending stats; "delete" also deletes it from chat (needs
+# the moderator:manage:chat_messages scope and the bot to be a moderator)
+MODERATION_ACTION = os.getenv("MODERATION_ACTION", "log")
+
+# Seconds between checks of the phrase file for changes
+MODERATION_CHECK_SECONDS = float(os.getenv("MODERATION_CHECK_SECONDS", "5"))
+
+# Characters that look alike or stand in for letters, mapped to the letter
+# they imitate: Cyrillic and Greek lookalikes
+_LOOKALIKES = {
+    "а": "a", "в": "b", "е": "e", "ё": "e", "к": "k", "м": "m", "н": "h", "о": "o", "р": "p", "с": "c", "т": "t",
+    "у": "y", "х": "x", "і": "i", "ј": "j", "ѕ": "s", "ԁ": "d", "ɡ": "g", "ı": "i",
+    "α": "a", "β": "b", "ε": "e", "ι": "i", "κ": "k", "ν": "v", "ο": "o", "ρ": "p", "τ": "t", "υ": "u", "χ": "x",
+}
+
+# Leetspeak digits, which only stand for a letter when one follows ("n00b",
+# "1diot"); otherwise they are numbers ("1 kill"), and trailing ones are split
+# off as a word of their own ("bad1" is "bad 1")
+_DIGITS = str.maketrans({"0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "8": "b", "9": "g"})
+_DIGIT = re.compile(r"\d")
+_DIGIT_LETTERS = re.compile(r"\d+(?=[^\W\d_])")
+_TRAILING_DIGITS = re.compile(r"(?<=[^\W\d_])(?=\d+\b)")
+
+# Leetspeak symbols, which stand for letters when a letter follows ("sh!!t",
+# "$hit"). Trailing ones are punctuation ("bad!!"), except for the ones
+# that are never used as such ("a$$")
+_SYMBOLS = str.maketrans({"@": "a", "$": "s", "!": "i", "|": "i", "+": "t", "€": "e"})
+_SYMBOL_RUNS = re.compile(r"[@$!|+€]+")
+_TRAILING_SYMBOLS = frozenset("@$€")
+
+# Combining marks left over from decomposing accented letters, and invisible
+# characters used to split words (zero-width spaces and joiners, soft hyphen)
+_INVISIBLE = [
+    *range(0x0300, 0x0370), *range(0x1AB0, 0x1B00), *range(0x1DC0, 0x1E00), *range(0x20D0, 0x2100), *range(0xFE20, 0xFE30),
+    0x00AD, 0x034F, 0x180E, *range(0x200B, 0x2010), *range(0x2060, 0x2065), 0xFEFF,
+]
+
+_TRANSLATION = {**{ord(char): letter for char, letter in _LOOKALIKES.items()}, **{code: None for code in _INVISIBLE}}
+
+# Anything that is not a letter or digit separates words
+_SEPARATORS = re.compile(r"[\W_]+")
+# Single characters split by spaces ("b a d") are joined back together
+_SPACED = re.compile(r"(?<=\b\w) (?=\w\b)")
+# Repeated letters, and runs of one character, for matching stretched words ("baaad")
+_REPEATS = re.compile(r"(\w)\1+")
+_RUNS = re.compile(r"(.)\1*")
+# A letter repeated this often in a row is stretched on purpose, and matches
+# the letter however often it is in the phrase; shorter runs are spelling
+# ("good" is not "god")
+_STRETCHED = 3
+
+def _symbol_letters(match: re.Match) -> str:
+    """Replace a run of leetspeak symbols with the letters they stand for, if they do."""
+    text, start, end = match.string, match.start(), match.end()
+    symbols = match.group()
+    if end < len(text) and (text[end].isalnum() or text[end] == "_"):
+        return symbols.translate(_SYMBOLS)
+    if start and (text[start - 1].isalnum() or text[start - 1] == "_") and _TRAILING_SYMBOLS.issuperset(symbols):
+        return symbols.translate(_SYMBOLS)
+    return symbols
+
+def normalize(text: str) -> str:
+    """Reduce a text to the form phrases are matched in.
+
+    Unicode compatibility forms (fullwidth, styled and circled letters) and
+    accents are folded away, case is ignored, lookalike and leetspeak
+    characters become the letters they imitate, invisible characters are
+    dropped, and everything but letters and digits becomes a single space.
+    Letters spelled out one by one are joined. Repeated letters are kept;
+    the automaton decides how they match. The result starts and ends with
+    a space, so every word in it is surrounded by spaces.
+
+    Args:
+        text: Chat message or phrase
+
+    Returns:
+        The normalized text
+    """
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+    text = _SYMBOL_RUNS.sub(_symbol_letters, text)
+    text = _SEPARATORS.sub(" ", text.casefold().translate(_TRANSLATION))
+    text = _SPACED.sub("", text)
+    if _DIGIT.search(text):
+        text = _DIGIT_LETTERS.sub(lambda match: match.group().translate(_DIGITS), text)
+        text = _TRAILING_DIGITS.sub(" ", text)
+    return f" {text.strip()} "
+
+def _runs(text: str) -> list[int]:
+    """Lengths of the runs of one character in a text, one per character of the collapsed text."""
+    return [len(match.group()) for match in _RUNS.finditer(text)]
+
+class Automaton:
+    """Aho-Corasick automaton over a set of normalized phrases.
+
+    Scanning follows one transition per character (plus failure links,
+    amortized constant), so a message is checked against every phrase in a
+    single pass whose cost does not depend on the number of phrases.
+    Immutable once built, so it can be swapped in as a whole.
+
+    Phrases and messages are scanned with repeated letters collapsed, and a
+    candidate match is then checked letter by letter: each letter has to
+    appear in a row as often as in the phrase, or be stretched to at least
+    _STRETCHED. So "baaad" matches "bad", but "good" does not match "god"
+    and "as" does not match "ass".
+    """
+
+    def __init__(self, phrases: Iterable[str]) -> None:
+        """Build the automaton.
+
+        Args:
+            phrases: Banned phrases as written in the phrase file. They match
+                whole words, unless they start or end with "*" (e.g. "idiot*"
+                also matches "idiots")
+        """
+        self.phrases: list[str] = []
+        # Per phrase: collapsed length, and the run length of each of its characters
+        self._lengths: list[int] = []
+        self._runs: list[list[int]] = []
+        self._goto: list[dict[str, int]] = [{}]
+        outputs: list[list[int]] = [[]]
+
+        for phrase in phrases:
+            pattern = normalize(phrase.strip("*"))
+            if not pattern.strip():
+                continue
+            if phrase.startswith("*"):
+                pattern = pattern[1:]
+            if phrase.endswith("*"):
+                pattern = pattern[:-1]
+            collapsed = _REPEATS.sub(r"\1", pattern)
+
+            state = 0
+            for char in collapsed:
+                following = self._goto[state].get(char)
+                if following is None:
+                    following = self._goto[state][char] = len(self._goto)
+                    self._goto.append({})
+                    outputs.append([])
+                state = following
+            outputs[state].append(len(self.phrases))
+            self.phrases.append(phrase)
+            self._lengths.append(len(collapsed))
+            self._runs.append(_runs(pattern))
+
+        # Failure links, breadth first: the longest proper suffix of each
+        # state that is also a prefix of some phrase. Outputs are merged
+        # along them, so a match is known as soon as its state is reached
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, following in self._goto[state].items():
+                queue.append(following)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[following] = target if target != following else 0
+                outputs[following].extend(outputs[self._fail[following]])
+        self._outputs: list[tuple[int, ...]] = [tuple(output) for output in outputs]
+
+    def __len__(self) -> int:
+        """Number of phrases."""
+        return len(self.phrases)
+
+    def scan(self, text: str) -> list[str]:
+        """Find the phrases in a normalized text.
+
+        Args:
+            text: Text from normalize()
+
+        Returns:
+            The matching phrases, as written in the phrase file, each once
+        """
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+        candidates: list[tuple[int, int]] = []
+        state = 0
+        # Repeated characters are skipped, so position counts characters of the collapsed text
+        previous = ""
+        position = -1
+        for char in text:
+            if char == previous:
+                continue
+            previous = char
+            position += 1
+            following = goto[state].get(char)
+            while following is None and state:
+                state = fail[state]
+                following = goto[state].get(char)
+            state = following or 0
+            if outputs[state]:
+                candidates.extend((index, position) for index in outputs[state])
+        if not candidates:
+            return []
+
+        # Each letter has to be repeated as in the phrase, or stretched
+        found: dict[int, None] = {}
+        text_runs = _runs(text)
+        for index, end in candidates:
+            if index in found:
+                continue
+            start = end - self._lengths[index] + 1
+            for offset, run in enumerate(self._runs[index]):
+                actual = text_runs[start + offset]
+                if actual != run and actual < max(run, _STRETCHED):
+                    break
+            else:
+                found[index] = None
+        return [self.phrases[index] for index in found]
+
+def load_phrases(path: str) -> list[str]:
+    """Read a phrase file: one phrase per line, "#" starts a comment line.
+
+    Args:
+        path: Path to the file
+
+    Returns:
+        The phrases (empty if the file does not exist)
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+class ModerationFilter:
+    """Checks chat messages against the banned phrases of a phrase file.
+
+    The file is watched for changes; a new automaton is built in a thread
+    and swapped in with a single assignment, so chat is never held up and
+    every message is checked against either the old or the new list.
+    """
+
+    def __init__(self, path: str = MODERATION_FILE, check_interval: float = MODERATION_CHECK_SECONDS) -> None:
+        """Initialize the filter with no phrases; load() or run() reads the file.
+
+        Args:
+            path: Phrase file
+            check_interval: Seconds between checks of the file for changes
+        """
+        self._path = path
+        self._check_interval = check_interval
+        self._automaton = Automaton(())
+        self._version: Optional[tuple[float, int]] = None
+
+    def __len__(self) -> int:
+        """Number of banned phrases."""
+        return len(self._automaton)
+
+    def check(self, text: str) -> list[str]:
+        """Find the banned phrases in a chat message.
+
+        Args:
+            text: Message text
+
+        Returns:
+            The matching phrases (empty if the message is fine)
+        """
+        start = time.perf_counter()
+        found = self._automaton.scan(normalize(text))
+        MODERATION_SECONDS.observe(time.perf_counter() - start)
+        return found
+
+    def _file_version(self) -> Optional[tuple[float, int]]:
+        """Modification time and size of the phrase file, or None if there is none."""
+        try:
+            stat = os.stat(self._path)
+        except OSError:
+            return None
+        return stat.st_mtime, stat.st_size
+
+    def _build(self) -> tuple[Automaton, Optional[tuple[float, int]]]:
+        """Read the phrase file and build its automaton."""
+        version = self._file_version()
+        return Automaton(load_phrases(self._path)), version
+
+    async def load(self) -> bool:
+        """Build the automaton from the phrase file in a thread and swap it in.
+
+        Returns:
+            True if the new phrases are in use, False if the old ones were kept
+        """
+        start = time.perf_counter()
+        try:
+            automaton, version = await asyncio.to_thread(self._build)
+        except (OSError, UnicodeDecodeError) as e:
+            log.error("Loading banned phrases from %s failed, keeping the previous list: %s", self._path, e)
+            return False
+
+        self._automaton = automaton
+        self._version = version
+        if len(automaton) or version is not None:
+            log.info("Loaded %s banned phrases in %.0f ms", len(automaton), (time.perf_counter() - start) * 1000)
+        return True
+
+    async def run(self) -> None:
+        """Reload the phrases whenever the file changes, until cancelled."""
+        while True:
+            await asyncio.sleep(self._check_interval)
+            if self._file_version() != self._version:
+                await self.load()
@@ -1,26 +1,58 @@
 # Standard library imports
 import asyncio
-import base64
-import hashlib
-import json
 import os
 import random
-import uuid
-from dataclasses import dataclass
-from typing import Any, Optional
-from urllib.parse import urlencode
+import signal
+import time
+from functools import partial
+from typing import Callable, Optional, Union
 
 # Third-party imports
-import requests
 import websockets
 from websockets import State
-import webbrowser
 
 # Local imports
-from utils import *
+from analytics import ChatAnalytics
+from audio import AudioEngine, NullSink, create_sink, load_sounds
+from channels import ChannelManager, Shard, load_channel_configs
+from commands import Command, CommandRegistry, command_context, is_moderator
+from cooldowns import Cooldown, CooldownTracker
+from effects import EffectScheduler
+from helix import HelixClient, HelixError
+from history import ChatHistory
+from irc import (
+    CLEARCHAT, GLOBALUSERSTATE, JOIN, NAMES, NOTICE, PART, PING, PRIVMSG, RECONNECT, ROOMSTATE, USERNOTICE, USERSTATE, WELCOME,
+    IrcMessage, IrcParser,
+)
+from log import get_logger
+from metrics import counter, gauge, histogram, monitor_loop_lag
+from moderation import MODERATION_ACTION, MODERATION_MATCHES, ModerationFilter
+from obs import ObsClient
+from offload import OffloadError, OffloadPool
+from overlay import OverlayState
+from recorder import FrameRecorder
+from relay import GameRelay, parse_game_command
+from songs import SongQueue, journal_path
+from supervisor import Supervisor, SupervisorGroup
+from tokens import TWITCH_CLIENT_ID, TokenError, TokenManager, authorize_url, exchange_code
+from watchtime import WatchtimeTracker
+
+log = get_logger("bot")
+chat_log = get_logger("chat")
+raw_log = get_logger("irc.raw")
+
+PARSE_SECONDS = histogram("nuitbot_irc_parse_seconds", "Time spent parsing one WebSocket frame of IRC lines")
+MESSAGES = counter("nuitbot_irc_messages_total", "IRC messages received, by command")
+DISPATCH_SECONDS = histogram("nuitbot_command_seconds", "Time spent running a chat command handler, by command")
+COMMAND_ERRORS = counter("nuitbot_command_errors_total", "Chat command handlers that raised, by command")
+QUEUE_DEPTH = gauge("nuitbot_queue_depth", "Items waiting in a queue, by queue")
+ACTIVE = gauge("nuitbot_active", "Work currently in progress, by kind")
 
 # WebSocket URIs and configuration
-TWITCH_WS_URI = "wss://irc-ws.chat.twitch.tv:443"
+TWITCH_WS_URI = os.getenv("TWITCH_WS_URI", "wss://irc-ws.chat.twitch.tv:443")
+
+# Append every frame received from Twitch to this file (for tools/fake_twitch.py)
+TWITCH_RECORD_FILE = os.getenv("TWITCH_RECORD_FILE", "")
 
 # OBS WebSocket configuration from environment variables
 OBS_HOST = os.getenv("OBS_HOST", "localhost")
@@ -29,6 +61,48 @@ OBS_PASSWORD = os.getenv("OBS_PASSWORD", "")
 
 OBS_URL = f"ws://{OBS_HOST}:{OBS_PORT}"
 
+# Command plugins to load, as comma-separated module names
+COMMAND_PLUGINS = os.getenv("NUITBOT_PLUGINS", "plugins.basic,plugins.follow,plugins.watchtime,plugins.songs,plugins.history").split(",")
+
+# Seconds between chatter list snapshots for watch time (0 disables them)
+WATCHTIME_SNAPSHOT_SECONDS = float(os.getenv("WATCHTIME_SNAPSHOT_SECONDS", "300"))
+
+# NOTICE texts Twitch sends when the access token is invalid or expired
+AUTH_FAILURES = ("Login authentication failed", "Improperly formatted auth")
+
+# Chance that the bot refuses to run a command
+NO_CHANCE = 0.01
+
+# Cooldowns (seconds per viewer) for "#" game commands and the mentality
+# trigger; chat commands set theirs when they are registered
+GAME_COOLDOWN = Cooldown(user=float(os.getenv("GAME_USER_COOLDOWN", "10")))
+MENTALITY_COOLDOWN = Cooldown(user=float(os.getenv("MENTALITY_USER_COOLDOWN", "60")))
+
+# Effect scheduling: queue size, effects running at once, and what to do
+# when an effect is triggered again while active (queue, drop or preempt)
+EFFECT_QUEUE_SIZE = int(os.getenv("EFFECT_QUEUE_SIZE", "16"))
+EFFECT_CONCURRENCY = int(os.getenv("EFFECT_CONCURRENCY", "1"))
+EFFECT_POLICY = os.getenv("EFFECT_POLICY", "queue")
+
+# Audio output: "alsa", "alsa:<device>", "file:<path>" or "null"
+AUDIO_SINK = os.getenv("AUDIO_SINK", "alsa")
+AUDIO_GAIN = float(os.getenv("AUDIO_GAIN", "1.0"))
+
+# Number of IRC connections the channels are spread over
+TWITCH_SHARDS = int(os.getenv("TWITCH_SHARDS", "1"))
+
+# Per-channel settings (see channels.load_channel_configs)
+CHANNELS_FILE = os.getenv("CHANNELS_FILE", os.path.join(os.path.dirname(__file__), "channels.json"))
+
+# Seconds during which an identical chat reply is only sent once
+OUTBOUND_COALESCE_SECONDS = float(os.getenv("OUTBOUND_COALESCE_SECONDS", "10"))
+
+# Seconds shutdown waits for a running handler and for queued replies
+SHUTDOWN_GRACE_SECONDS = float(os.getenv("SHUTDOWN_GRACE_SECONDS", "5"))
+
+# Local game server that receives "#" commands
+LOCAL_WS_URL = "ws://localhost:8765"
+
 # Set to True if you want to connect the websocket client
 ENABLE_LOCAL_WS = False
 ENABLE_OBS_WS = True
@@ -59,101 +133,6 @@ def src(*paths: str) -> str:
     """Get the full path to a resource file in a subdirectory."""
     return os.path.join(os.path.dirname(__file__), *paths)
 
-def generate_auth_response(password: str, challenge: str, salt: str) -> str:
-    """Generate authentication response based on OBS WebSocket protocol.
-    
-    Args:
-        password: The OBS WebSocket password
-        challenge: The challenge string from OBS WebSocket server
-        salt: The salt string from OBS WebSocket server
-        
-    Returns:
-        The authentication string to send back to OBS
-    """
-    # Step 1: Concatenate password and salt
-    combined: str = password + salt
-    
-    # Step 2: Generate SHA256 hash and base64 encode (base64 secret)
-    sha256_hash = hashlib.sha256(combined.encode()).digest()
-    base64_secret = base64.b64encode(sha256_hash).decode()
-    
-    # Step 3: Concatenate base64_secret with challenge
-    combined_secret_challenge = base64_secret + challenge
-    
-    # Step 4: Generate SHA256 hash of the result and base64 encode
-    sha256_hash_final = hashlib.sha256(combined_secret_challenge.encode()).digest()
-    authentication_string = base64.b64encode(sha256_hash_final).decode()
-    
-    return authentication_string
-
-@dataclass
-class PrivateMessage:
-    """Represents a private message from Twitch IRC.
-    
-    Attributes:
-        tags: Dictionary of IRC tags
-        channel: The channel the message was sent to
-        user: The user who sent the message
-        message: The message content
-    """
-    tags: dict[str, str]
-    channel: str
-    user: str
-    message: str
-
-    def __init__(self, message: str):
-        """Parse a raw IRC message into its components.
-        
-        Args:
-            message: Raw IRC message string
-        """
-        message_without_at = message[1:] if message.startswith("@") else message
-
-        # Separate on first instance of a space. First part is tags_str, and second part is command_str
-        tags_str, command_str = message_without_at.split(" ", 1)
-
-        # Parse tags (format: key=value;key=value;...)
-        tags_list: list[str] = tags_str.split(";")
-        tags_dict: dict[str, str] = dict()
-        for tag in tags_list:
-            if "=" in tag:
-                key, value = tag.split("=", 1)
-                tags_dict[key] = value
-
-        # Parse command parts
-        # Format: :<user>!<user>@<user>.tmi.twitch.tv PRIVMSG #<channel> :<message>
-        user_part, channel_message_part = command_str.split(" PRIVMSG ", 1)
-        user = user_part[1:].split("!")[0]  # Remove leading ":" and extract username before "!"
-
-        channel_part, message_part = channel_message_part.split(" :", 1)
-        channel = channel_part[1:]  # Remove "#" prefix from channel
-
-        self.tags = tags_dict
-        self.channel = channel
-        self.user = user
-        self.message = message_part.strip()
-        
-    def __str__(self) -> str:
-        """String representation of the message."""
-        display_name = self.tags.get("display-name", self.user)
-        return f"[#{self.channel}] {display_name}: {self.message}"
-
-async def write(filename, content):
-    """Write content to a file asynchronously.
-    
-    Args:
-        filename: Path to the file
-        content: Content to write
-        
-    Returns:
-        Result of the write operation
-    """
-    def _write(filename, content):
-        with open(filename, "w") as f:
-            return f.write(content)
-    
-    return await asyncio.to_thread(_write, filename, content)
-
 class NuitBot:
     """Twitch chat bot with OBS integration.
     
@@ -161,20 +140,122 @@ class NuitBot:
     and trigger actions.
     """
 
-    def __init__(self, nick: str, channel: str) -> None:
-        """Initialize the bot with a nickname and channel.
+    def __init__(self, nick: str, channels: Union[str, list[str]], integrations: bool = True, rate_share: float = 1.0) -> None:
+        """Initialize the bot with a nickname and channels.
         
         Args:
             nick: Bot's nickname on Twitch
-            channel: Channel to join (without # prefix)
+            channels: Channel or channels to join (without # prefix)
+            integrations: Connect to OBS, the game server and the audio device
+            rate_share: Fraction of the account's rate limits this bot may use
         """
         self._nick = nick
-        self._channel = channel.lower()
+        if isinstance(channels, str):
+            channels = [channels]
 
         self._access_token = ""
         self._refresh_token = ""
+        self.tokens: Optional[TokenManager] = None
+        self._auth_failed = False
+
+        # While paused, chat is still read but no command or trigger runs
+        self.paused = False
+
+        # Set once to stop every connection; run() wires it to SIGINT/SIGTERM
+        self._stop = asyncio.Event()
+        # Set once Twitch confirmed the first channel join (JOIN echo or ROOMSTATE)
+        self.ready = asyncio.Event()
+        self._auth_lock = asyncio.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Every connection runs under its own supervisor
+        self.supervisors = SupervisorGroup(self._stop)
+        self._integrations = integrations
+
+        # Channels are spread over one or more IRC connections, each with
+        # its own rate-limited send queue
+        self.channels = ChannelManager(
+            channels,
+            TWITCH_SHARDS,
+            load_channel_configs(CHANNELS_FILE),
+            OUTBOUND_COALESCE_SECONDS,
+            rate_share,
+        )
+        self._local_ws: Optional[websockets.ClientConnection] = None
+        self.relay = GameRelay()
+        self._relay_task: Optional[asyncio.Task] = None
+        self.obs = ObsClient(OBS_URL, OBS_PASSWORD)
+
+        # Text shown on stream, pushed to OBS browser sources
+        self.overlay = OverlayState()
+
+        # Effects run in the background so they never hold up chat
+        self.effects = EffectScheduler(EFFECT_QUEUE_SIZE, EFFECT_CONCURRENCY, EFFECT_POLICY)
+
+        # Sounds are decoded once and mixed in-process. Without integrations
+        # another process owns the audio device (or there is none), so the
+        # output is never opened
+        self.audio = AudioEngine(load_sounds(src("sound")), create_sink(AUDIO_SINK if integrations else "null"), AUDIO_GAIN)
+
+        # Twitch API lookups for commands, pooled and cached
+        self.helix = HelixClient(TWITCH_CLIENT_ID, self.get_access_token)
+
+        # Viewer presence and watch time, kept in memory and written in batches
+        self.watchtime = WatchtimeTracker(ignore=(nick,))
+        self._room_ids: dict[str, str] = {}
+
+        # Recent chat in memory, the full history in indexed segment files
+        self.history = ChatHistory()
+
+        # Trending emotes and words over a sliding window, in fixed memory
+        self.analytics = ChatAnalytics()
+
+        # Song request queues by channel, restored from their journals on first use
+        self._song_queues: dict[str, SongQueue] = {}
+
+        # Checked before any trigger runs, to protect OBS, audio and the game server
+        self.cooldowns = CooldownTracker()
+
+        # Commands are built once and only swapped as a whole on reload
+        self.commands = CommandRegistry([plugin.strip() for plugin in COMMAND_PLUGINS if plugin.strip()])
+        self.commands.load()
+
+        # CPU-bound handlers run in worker processes, each in its own task, so
+        # they never hold up chat; restarted on reload to pick up new code
+        self.offload = OffloadPool()
+        self.commands.on_reload(self._warm_offload)
+
+        # Banned phrases, checked before anything acts on a message
+        self.moderation = ModerationFilter()
+
+        # Work started for single messages (commands, deletions), cancelled
+        # on shutdown
+        self._tasks: set[asyncio.Task] = set()
+
+        # Raw traffic capture for offline replay
+        self._recorder: Optional[FrameRecorder] = FrameRecorder(TWITCH_RECORD_FILE) if TWITCH_RECORD_FILE else None
+
+        self._register_metrics()
+
+    def _register_metrics(self) -> None:
+        """Expose queue depths and in-progress work as gauges read on scrape."""
+        for shard in self.channels.shards:
+            QUEUE_DEPTH.set_function(lambda shard=shard: shard.outbound.depth, queue=f"outbound_{shard.index}")
+        QUEUE_DEPTH.set_function(lambda: self.effects.depth, queue="effects")
+        ACTIVE.set_function(lambda: self.effects.active, kind="effects")
+        ACTIVE.set_function(lambda: self.obs.in_flight, kind="obs_requests")
+        ACTIVE.set_function(lambda: self.audio.active, kind="voices")
+
+    def song_queue(self, channel: str) -> SongQueue:
+        """Get a channel's song request queue, loading it from its journal on first use.
 
-        self._running = True
+        Args:
+            channel: Channel name (without "#" prefix)
+        """
+        queue = self._song_queues.get(channel)
+        if queue is None:
+            queue = self._song_queues[channel] = SongQueue(journal_path(channel))
+            queue.load()
+        return queue
 
     def get_access_token(self) -> str:
         """Get the current access token."""
@@ -184,6 +265,26 @@ class NuitBot:
         """Get the current refresh token."""
         return self._refresh_token
 
+    def set_tokens(self, access_token: str, refresh_token: str) -> None:
+        """Set the OAuth tokens, e.g. when they were obtained by another process.
+
+        Args:
+            access_token: OAuth access token
+            refresh_token: OAuth refresh token
+        """
+        self._access_token = access_token
+        self._refresh_token = refresh_token
+
+    def use_tokens(self, manager: TokenManager) -> None:
+        """Persist and refresh tokens through a token manager.
+
+        Args:
+            manager: Token manager; its current tokens are used right away
+        """
+        self.tokens = manager
+        if manager.tokens is not None:
+            self.set_tokens(manager.tokens.access_token, manager.tokens.refresh_token)
+
     def authorize(self, client_id: str, redirect_uri: str, scopes: list[str]) -> None:
         """Open browser for Twitch OAuth authorization.
         
@@ -192,27 +293,12 @@ class NuitBot:
             redirect_uri: OAuth redirect URI
             scopes: List of permission scopes to request
         """
-        # Make scopes space-separated
-        scope_str: str = " ".join(scopes)
-
-        # Get the user to authorize your app
-        authorize_url = "https://id.twitch.tv/oauth2/authorize"
-        params_dict = {
-            "client_id": client_id,
-            "redirect_uri": redirect_uri,
-            "response_type": "code",
-            "scope": scope_str
-        }
-
-        # Encode query params
-        params = urlencode(params_dict)
+        # Only needed the first time, when there are no cached tokens
+        import webbrowser
 
-        # Put it all together
-        url = f"{authorize_url}?{params}"
+        webbrowser.open(authorize_url(client_id, redirect_uri, scopes))
 
-        webbrowser.open(url)
-
-    def token(self, client_id: str, client_secret: str, code: str, redirect_uri: str) -> None:
+    async def token(self, client_id: str, client_secret: str, code: str, redirect_uri: str) -> None:
         """Exchange authorization code for access and refresh tokens.
         
         Args:
@@ -220,353 +306,681 @@ class NuitBot:
             client_secret: Twitch application client secret
             code: Authorization code from redirect
             redirect_uri: OAuth redirect URI
+
+        Raises:
+            TokenError: If Twitch rejected the code or could not be reached
         """
-        token_url = "https://id.twitch.tv/oauth2/token"
-        payload = {
-            "client_id": client_id,
-            "client_secret": client_secret,
-            "code": code,
-            "grant_type": "authorization_code",
-            "redirect_uri": redirect_uri
-        }
+        # The request and the token file are blocking, so keep them off the event loop
+        tokens = await asyncio.to_thread(exchange_code, client_id, client_secret, code, redirect_uri)
+        if self.tokens is not None:
+            await asyncio.to_thread(self.tokens.set, tokens)
+        self.set_tokens(tokens.access_token, tokens.refresh_token)
 
-        response = requests.post(token_url, data=payload)
-        response_json: dict[str, str] = response.json()
+    def reload_config(self) -> bool:
+        """Re-import the command plugins and re-read the per-channel settings.
 
-        self._access_token = response_json.get("access_token")
-        self._refresh_token = response_json.get("refresh_token")
+        Returns:
+            True if both were reloaded, False if either kept its previous version
+        """
+        commands = self.commands.reload()
+        try:
+            self.channels.set_configs(load_channel_configs(CHANNELS_FILE))
+        except (OSError, ValueError) as e:
+            log.error("Channel settings reload failed, keeping previous settings: %s", e)
+            return False
+        log.info("Reloaded channel settings from %s", CHANNELS_FILE)
+        return commands
+
+    def trigger_effect(self, name: str, text: str = "", display_name: str = "") -> bool:
+        """Queue an effect without a chat message, e.g. from the control API.
+
+        Args:
+            name: "mentality", "transition", or the name of a sound to play
+            text: Message the mentality effect shows
+            display_name: Name the mentality effect shows
+
+        Returns:
+            True if the effect was queued, False if the scheduler refused it
+
+        Raises:
+            KeyError: If there is no such effect
+        """
+        if name == "mentality":
+            factory = lambda: self._mentality(text, display_name)
+        elif name == "transition":
+            factory = self._scene_transition
+        elif name in self.audio.sounds:
+            factory = lambda: self.audio.play(name).wait()
+        else:
+            raise KeyError(name)
+        return self.effects.submit(name, factory)
+
+    async def reply(self, message: IrcMessage, text: str) -> None:
+        """Send a chat message to the channel a message came from.
+
+        Args:
+            message: The message being replied to
+            text: Text to send
+        """
+        if self.channels.queue_for(message.channel).privmsg(message.channel, text):
+            log.info("Bot response: %s", text)
 
     async def _join(self, ws: websockets.ClientConnection) -> None:
-        """Join a Twitch channel and authenticate with the server.
+        """Authenticate with the Twitch IRC server.
         
         Args:
             ws: WebSocket connection to Twitch IRC
         """
-        # Request additional capabilities
-        await ws.send("CAP REQ :twitch.tv/commands twitch.tv/tags")
+        # Request additional capabilities and authenticate in a single frame.
+        # Channels are joined through the send queue to respect the JOIN limit
+        await ws.send("\r\n".join([
+            "CAP REQ :twitch.tv/commands twitch.tv/tags twitch.tv/membership",
+            f"PASS oauth:{self._access_token}",
+            f"NICK {self._nick}",
+        ]))
+
+    async def _scene_transition(self) -> None:
+        """Trigger the OBS scene transition hotkey if OBS is connected."""
+        # Only trigger OBS if connection is available
+        if self.obs.connected:
+            log.info("Scene transition")
+            await self.obs.trigger_hotkey("OBS_KEY_SCROLLLOCK", {"alt": True})
+        else:
+            log.warning("OBS not connected, skipping scene transition")
+
+    async def _mentality(self, text: str, display_name: str) -> None:
+        """Run the mentality effect: show the message, switch scenes and play the sound.
+
+        Args:
+            text: The chat message that triggered the effect
+            display_name: Display name of the viewer who sent it
+        """
+        log.info("Mentality triggered")
 
-        # Authenticate
-        await ws.send(f"PASS oauth:{self._access_token}")
-        await ws.send(f"NICK {self._nick}")
-        await ws.send(f"JOIN #{self._channel}")
+        # Show the message and username (both in one update, so they never mismatch)
+        await self.overlay.update(mentality=text, mentality_name=display_name)
 
-        print(green(f"Connected to Twitch channel: #{self._channel}"))
+        # Wait for the scene transition
+        await asyncio.sleep(3)
+
+        voice = None
+        try:
+            # The hotkey goes out before the transition is awaited, so a
+            # preemption while it is in flight still has to switch back
+            await self._scene_transition()
+
+            # Play the sound effect and wait for it to finish
+            log.info("Playing sound")
+            voice = self.audio.play("mentality")
+            await voice.wait()
+        finally:
+            # Always stop the sound and switch back, even if the effect was preempted
+            if voice is not None:
+                voice.stop()
+            await self._scene_transition()
+
+        log.info("Mentality complete")
+
+    def _allowed(self, message: IrcMessage, trigger: str, cooldown: Cooldown) -> bool:
+        """Check a trigger's cooldowns and start them. Moderators are exempt.
 
-    async def _websocket_connect(self, uri: str, callback=None, max_retries=3) -> Optional[websockets.ClientConnection]:
-        """Connect to a WebSocket server with error handling and retry logic.
-        
         Args:
-            uri: WebSocket server URI
-            callback: Optional callback function to execute after connection
-            max_retries: Maximum number of connection attempts
-            
+            message: The chat message that fired the trigger
+            trigger: Trigger name, e.g. a command name, "#creeper" or "mentality"
+            cooldown: The trigger's cooldowns
+
         Returns:
-            WebSocket connection or None if all connection attempts failed
+            True if the trigger may run, False if it is cooling down
         """
-        retries = 0
-        while retries <= max_retries:
-            try:
-                socket = await websockets.connect(uri, ping_interval=20, ping_timeout=10)
-                print(green(f"Connected to {uri}"))
-                if callback:
-                    await callback(socket)
-                return socket
-            except Exception as e:
-                retries += 1
-                if retries <= max_retries:
-                    wait_time = 2 ** retries  # Exponential backoff
-                    print(yellow(f"Connection to {uri} failed (attempt {retries}/{max_retries}): {e}"))
-                    print(yellow(f"Retrying in {wait_time} seconds..."))
-                    await asyncio.sleep(wait_time)
-                else:
-                    print(red(f"Connection to {uri} failed after {max_retries} attempts: {e}"))
-                    if callback and callback.__code__.co_argcount > 1:
-                        await callback(None, e)
-                    return None
-
-    async def _reconnect_websocket(self, socket, uri, callback=None, max_retries=3):
-        """Attempt to reconnect a WebSocket that has disconnected.
-        
+        if is_moderator(message):
+            return True
+
+        remaining = self.cooldowns.acquire(message.channel, trigger, message.user, cooldown)
+        if remaining:
+            log.debug("%s from %s ignored, cooling down for %.1fs", trigger, message.user, remaining)
+            return False
+        return True
+
+    async def _handle_privmsg(self, private_message: IrcMessage) -> None:
+        """Handle a chat message.
+
+        Args:
+            private_message: The PRIVMSG to handle
+        """
+        chat_log.info("%s", private_message)
+        self.watchtime.seen(private_message.channel, private_message.user)
+
+        # Moderators are trusted; everyone else's banned phrases go no further,
+        # not even into the chat history
+        if len(self.moderation) and not is_moderator(private_message):
+            banned = self.moderation.check(private_message.message)
+            if banned:
+                self._moderate(private_message, banned)
+                return
+
+        self.history.record(
+            private_message.channel, private_message.user, private_message.tag("display-name"), private_message.message,
+        )
+        self.analytics.record(private_message.channel, private_message.message, private_message.tag("emotes"))
+        config = self.channels.config(private_message.channel)
+        if self.paused:
+            return
+
+        # Handle bot commands (starting with !)
+        if private_message.message.startswith("!"):
+            name, _, args = private_message.message[1:].partition(" ")
+
+            # 1% chance to respond with "no" to any command
+            if random.random() < NO_CHANCE:
+                await self.reply(private_message, "MrDestructoid no.")
+                return
+
+            command = self.commands.get(name.lower())
+            if command and config.allows(command.name) and self._allowed(private_message, command.name, command.cooldown):
+                log.info("Command: !%s", command.name)
+                # Chat moves on while the handler waits on an API or a worker process computes the reply
+                run = self._run_offloaded if command.cpu_bound else self._run_command
+                self._spawn(run(private_message, command, args.strip()))
+
+        # elif private_message.message.startswith("!clown"):
+            # Trigger Clown makeup
+            # Start playing the clown theme
+
+            # Turn both after 5 seconds
+
+        # Handle local WebSocket commands (starting with #)
+        elif private_message.message.startswith("#"):
+            game_command = parse_game_command(private_message.message, "")
+            if (
+                config.game
+                and self._relay_task is not None
+                and game_command is not None
+                and self._allowed(private_message, f"#{game_command.name}", GAME_COOLDOWN)
+            ):
+                # Validated and merged with the rest of the burst; sending happens in the background
+                self.relay.submit(private_message.message, private_message.tag("display-name") or private_message.user)
+
+        # Handle mentality trigger messages (ending with "mentality.")
+        elif private_message.message.endswith("mentality."):
+            if (
+                config.effects
+                and self._allowed(private_message, "mentality", MENTALITY_COOLDOWN)
+                and self.effects.submit(
+                    "mentality",
+                    lambda message=private_message: self._mentality(message.message, message.tag("display-name")),
+                )
+            ):
+                log.info("Mentality queued (queue depth: %s)", self.effects.depth)
+
+    async def _run_command(self, message: IrcMessage, command: Command, args: str) -> None:
+        """Run a command's handler on the event loop.
+
+        Args:
+            message: The chat message that triggered the command
+            command: The command
+            args: Text after the command name
+        """
+        start = time.perf_counter()
+        try:
+            await command.handler(self, message, args)
+        except Exception as e:
+            COMMAND_ERRORS.inc(command=command.name)
+            log.exception("Command !%s error: %s", command.name, e)
+        DISPATCH_SECONDS.observe(time.perf_counter() - start, command=command.name)
+
+    async def _run_offloaded(self, message: IrcMessage, command: Command, args: str) -> None:
+        """Run a CPU-bound command in a worker process and send its reply.
+
         Args:
-            socket: The disconnected socket to replace
-            uri: WebSocket server URI
-            callback: Optional callback function to execute after reconnection
-            max_retries: Maximum number of reconnection attempts
-            
+            message: The chat message that triggered the command
+            command: The command
+            args: Text after the command name
+        """
+        start = time.perf_counter()
+        try:
+            reply = await self.offload.run(command.name, command.handler, args, command_context(message))
+            if reply:
+                await self.reply(message, reply)
+        except OffloadError as e:
+            log.warning("Command !%s not run: %s", command.name, e)
+        except Exception as e:
+            COMMAND_ERRORS.inc(command=command.name)
+            log.exception("Command !%s error: %s", command.name, e)
+        DISPATCH_SECONDS.observe(time.perf_counter() - start, command=command.name)
+
+    def _warm_offload(self) -> None:
+        """Start fresh worker processes for the CPU-bound commands, if there are any."""
+        modules = {command.handler.__module__ for command in self.commands if command.cpu_bound}
+        if modules:
+            self._spawn(self.offload.warm(modules))
+
+    def _spawn(self, coroutine) -> None:
+        """Run a coroutine in its own task, kept until it is done or the bot stops."""
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _moderate(self, message: IrcMessage, phrases: list[str]) -> None:
+        """Act on a chat message that contains banned phrases.
+
+        Args:
+            message: The message
+            phrases: The banned phrases it contains
+        """
+        MODERATION_MATCHES.inc(action=MODERATION_ACTION)
+        log.warning("Banned phrase from %s in #%s: %s", message.user, message.channel, ", ".join(phrases))
+        if MODERATION_ACTION == "delete":
+            self._spawn(self._delete_message(message))
+
+    async def _delete_message(self, message: IrcMessage) -> None:
+        """Delete a chat message, as the bot's moderator account."""
+        try:
+            moderator_id = await self.helix.user_id(self._nick)
+            if moderator_id is None:
+                raise HelixError(404, f"no Twitch user named {self._nick}")
+            await self.helix.delete_chat_message(message.tag("room-id"), moderator_id, message.tag("id"))
+        except Exception as e:
+            log.warning("Deleting a message in #%s failed: %s", message.channel, e)
+
+    async def _handle_message(self, shard: Shard, irc_message: IrcMessage) -> bool:
+        """Handle a single IRC message.
+
+        Args:
+            shard: The shard the message arrived on
+            irc_message: The parsed message
+
         Returns:
-            New WebSocket connection or None if reconnection failed
+            False if the connection should be re-established, True otherwise
         """
-        if socket and not is_closed(socket):
-            try:
-                await socket.close()
-            except:
-                pass
-                
-        print(yellow(f"Attempting to reconnect to {uri}..."))
-        return await self._websocket_connect(uri, callback, max_retries)
+        # Handle PING messages
+        if irc_message.command == PING:
+            shard.outbound.raw(f"PONG :{irc_message.message}")
+            log.debug("Sent PONG response")
+
+        # Track moderator status, which decides our chat rate limit
+        elif irc_message.command == USERSTATE:
+            self.channels.limits.set_moderator(irc_message.channel, is_moderator(irc_message))
+
+        # Twitch is about to restart the server, so reconnect right away
+        elif irc_message.command == RECONNECT:
+            log.warning("Shard %s: Twitch requested a reconnect", shard.index)
+            return False
+
+        # Twitch rejected our token: refresh it before reconnecting
+        elif irc_message.command == NOTICE and irc_message.message in AUTH_FAILURES:
+            log.error("Shard %s: %s", shard.index, irc_message.message)
+            self._auth_failed = True
+            return False
+
+        # Handle subs, raids and other channel events
+        elif irc_message.command == USERNOTICE:
+            log.info("Notice: %s", irc_message.tag("system-msg") or irc_message.tag("msg-id"))
+
+        # Handle timeouts, bans and chat clears
+        elif irc_message.command == CLEARCHAT:
+            if irc_message.message:
+                log.info("Chat cleared for %s", irc_message.message)
+            else:
+                log.info("Chat cleared in #%s", irc_message.channel)
+
+        # Handle room setting changes (slow mode, emote-only, ...)
+        elif irc_message.command == ROOMSTATE:
+            log.info("Room state: %s", irc_message.raw_tags)
+            room_id = irc_message.tag("room-id")
+            if room_id:
+                self._room_ids[irc_message.channel] = room_id
+            if irc_message.channel in shard.channels:
+                self.ready.set()
+
+        # Track viewer presence for watch time
+        elif irc_message.command == JOIN:
+            self.watchtime.join(irc_message.channel, irc_message.user)
+            # Our own JOIN echoed back: the channel is joined
+            if irc_message.user == self._nick.lower() and irc_message.channel in shard.channels:
+                self.ready.set()
+        elif irc_message.command == PART:
+            self.watchtime.part(irc_message.channel, irc_message.user)
+        elif irc_message.command == NAMES:
+            # "353 <nick> = #channel :viewer1 viewer2 ..." lists who was there when we joined
+            channel = irc_message.params[-1].lstrip("#")
+            for login in irc_message.message.split():
+                self.watchtime.join(channel, login)
+
+        # Handle PRIVMSG messages (chat messages)
+        elif irc_message.command == PRIVMSG:
+            await self._handle_privmsg(irc_message)
+
+        return True
+
+    async def _until_stopped(self, awaitable) -> bool:
+        """Wait for an awaitable or for the bot to stop, whichever comes first.
 
-    async def _obs_connect(self, websocket: websockets.ClientConnection) -> None:
-        """Handle OBS WebSocket authentication flow.
-        
         Args:
-            websocket: WebSocket connection to OBS
+            awaitable: Coroutine or task to wait for (cancelled if the bot stops first)
+
+        Returns:
+            True if the bot is stopping, False if the awaitable finished first
         """
-        # Receive the initial OpCode 0 message
-        hello_message = await websocket.recv()
-        hello_data = json.loads(hello_message)
-        print(green("OBS: Hello message received"))
-
-        if hello_data["op"] == 0:
-            challenge = hello_data["d"]["authentication"]["challenge"]
-            salt = hello_data["d"]["authentication"]["salt"]
-            rpc_version = hello_data["d"]["rpcVersion"]
-            
-            # Generate authentication string
-            auth_string = generate_auth_response(OBS_PASSWORD, challenge, salt)
-            
-            # Create OpCode 1 message
-            auth_payload = {
-                "op": 1,
-                "d": {
-                    "rpcVersion": rpc_version,
-                    "authentication": auth_string
-                }
-            }
-            
-            # Send authentication response
-            print(green("OBS: Sending authentication"))
-            await websocket.send(json.dumps(auth_payload))
-            
-            # Receive authentication result
-            auth_result = await websocket.recv()
-            auth_result_data = json.loads(auth_result)
-            print(green("OBS: Authentication complete"))
-
-    async def _obs_trigger_hotkey(self, websocket: websockets.ClientConnection, request_data: dict[str, Any]) -> None:
-        """Trigger an OBS hotkey via WebSocket.
-        
+        task = asyncio.ensure_future(awaitable)
+        stopper = asyncio.create_task(self._stop.wait())
+        try:
+            await asyncio.wait({task, stopper}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stopper.cancel()
+            if not task.done():
+                task.cancel()
+        return self._stop.is_set()
+
+    async def _read_shard(
+        self, shard: Shard, ws: websockets.ClientConnection, busy: asyncio.Lock, on_login: Callable[[], None],
+    ) -> None:
+        """Read and handle frames from one connection until it closes.
+
         Args:
-            websocket: WebSocket connection to OBS
-            request_data: Data containing the key sequence to trigger
+            shard: The shard the connection belongs to
+            ws: WebSocket connection to Twitch IRC
+            busy: Held while a frame is being handled, so shutdown can let it finish
+            on_login: Called once Twitch accepted the login
         """
-        request_id = str(uuid.uuid4())
-        hotkey_request = {
-            "op": 6,
-            "d": {
-                "requestType": "TriggerHotkeyByKeySequence",
-                "requestId": request_id,
-                "requestData": request_data
-            }
-        }
-
-        # Send request to trigger hotkey
-        print(cyan("OBS: Triggering hotkey"))
-        await websocket.send(json.dumps(hotkey_request))
-        
-        # Receive response
-        await websocket.recv()
-        print(cyan("OBS: Hotkey triggered"))
+        parser = IrcParser()
+        logged_in = False
+        try:
+            async for frame in ws:
+                async with busy:
+                    raw_log.debug("IRC: %s", frame)
+                    if self._recorder:
+                        self._recorder.write(frame, shard.index)
+
+                    # A single frame may carry several IRC lines
+                    start = time.perf_counter()
+                    irc_messages = list(parser.feed(frame))
+                    PARSE_SECONDS.observe(time.perf_counter() - start)
+
+                    reconnect_requested = False
+                    for irc_message in irc_messages:
+                        MESSAGES.inc(command=irc_message.command)
+                        if not logged_in and irc_message.command in (WELCOME, GLOBALUSERSTATE):
+                            logged_in = True
+                            on_login()
+                        if not await self._handle_message(shard, irc_message):
+                            reconnect_requested = True
+
+                    if reconnect_requested:
+                        return
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        log.error("Shard %s: Twitch connection closed", shard.index)
+
+    async def _shard_session(self, shard: Shard, up: Callable[[], None]) -> None:
+        """Run one connection of a shard until it closes or the bot stops.
+
+        Args:
+            shard: The shard to run
+            up: Called once Twitch accepted the login
+        """
+        sender: Optional[asyncio.Task] = None
+        reader: Optional[asyncio.Task] = None
+        try:
+            if self._auth_failed:
+                await self._recover_auth()
+
+            # Connect to Twitch IRC
+            async with websockets.connect(TWITCH_WS_URI, ping_interval=20, ping_timeout=10) as ws:
+                await self._join(ws)
+
+                def logged_in() -> None:
+                    # Twitch accepted the token, so the shard can send and take
+                    # its channels, and only now counts as up (a rejected login
+                    # keeps backing off instead of resetting the backoff)
+                    nonlocal sender
+                    shard.ws = ws
+                    sender = asyncio.create_task(shard.outbound.run(ws))
+                    self.channels.shard_up(shard)
+                    log.info("Shard %s: Connected to Twitch (%s channels)", shard.index, len(shard.channels))
+                    up()
+
+                busy = asyncio.Lock()
+                reader = asyncio.create_task(self._read_shard(shard, ws, busy, logged_in))
+                if not await self._until_stopped(asyncio.shield(reader)):
+                    # Connection closed or Twitch asked us to reconnect
+                    reader.result()
+                    if sender is None and self._auth_failed:
+                        raise ConnectionError("Twitch rejected the login")
+                    return
+
+                # Shutting down: let the frame being handled finish, then stop reading
+                try:
+                    await asyncio.wait_for(busy.acquire(), SHUTDOWN_GRACE_SECONDS)
+                except asyncio.TimeoutError:
+                    log.warning("Shard %s: Handler still running after %ss, cancelling it", shard.index, SHUTDOWN_GRACE_SECONDS)
+                reader.cancel()
+                await asyncio.gather(reader, return_exceptions=True)
+                if sender is None:
+                    return
+
+                # Give running commands a chance to queue their replies
+                if self._tasks:
+                    await asyncio.wait(set(self._tasks), timeout=SHUTDOWN_GRACE_SECONDS)
+
+                # Flush queued replies, then say goodbye
+                if not await shard.outbound.drain(SHUTDOWN_GRACE_SECONDS):
+                    log.warning("Shard %s: Dropping %s unsent lines", shard.index, shard.outbound.depth)
+                sender.cancel()
+                try:
+                    if shard.channels:
+                        await ws.send("\r\n".join(f"PART #{channel}" for channel in sorted(shard.channels)))
+                        log.info("Left Twitch channels: %s", ", ".join("#" + channel for channel in sorted(shard.channels)))
+                except websockets.exceptions.ConnectionClosed:
+                    pass
+
+        finally:
+            if reader is not None:
+                reader.cancel()
+            if sender is not None:
+                sender.cancel()
+            shard.ws = None
+            shard.outbound.discard_protocol()
+            if not self._stop.is_set():
+                # However the session ended, let the other shards take over
+                # this shard's channels while it is down
+                self.channels.shard_down(shard)
+
+    async def _recover_auth(self) -> None:
+        """Get a working access token after Twitch rejected ours.
+
+        Raises:
+            TokenError: If there is no way to get a new token
+        """
+        if self.tokens is None:
+            raise TokenError("Twitch rejected the access token and no token store is configured")
+
+        # Shards share the token, so only the first one to notice refreshes it
+        async with self._auth_lock:
+            if self._auth_failed:
+                tokens = await self.tokens.refresh_async(self._access_token)
+                self.set_tokens(tokens.access_token, tokens.refresh_token)
+                self._auth_failed = False
+
+    async def _keep_tokens_fresh(self) -> None:
+        """Refresh the access token shortly before it expires."""
+        while not self._stop.is_set():
+            delay = self.tokens.seconds_until_refresh()
+            # Expiry unknown: check again in an hour
+            if await self._until_stopped(asyncio.sleep(3600 if delay is None else delay)):
+                return
+            if delay is None:
+                continue
+
+            try:
+                tokens = await self.tokens.refresh_async()
+                self.set_tokens(tokens.access_token, tokens.refresh_token)
+            except Exception as e:
+                log.error("Token refresh failed, retrying in a minute: %s", e)
+                if await self._until_stopped(asyncio.sleep(60)):
+                    return
+
+    async def _snapshot_chatters(self) -> None:
+        """Periodically replace watch time presence with Twitch's chatter lists.
+
+        JOIN/PART from Twitch are delayed and stop entirely in big channels,
+        so the chatter list is what keeps lurker sessions accurate.
+        """
+        while not await self._until_stopped(asyncio.sleep(WATCHTIME_SNAPSHOT_SECONDS)):
+            if not self._access_token:
+                continue
+
+            try:
+                moderator_id = await self.helix.user_id(self._nick)
+                for channel, room_id in list(self._room_ids.items()):
+                    logins = await self.helix.chatters(room_id, moderator_id)
+                    self.watchtime.snapshot(channel, logins)
+                    log.debug("Chatter snapshot of #%s: %d viewers", channel, len(logins))
+            except Exception as e:
+                log.warning("Chatter snapshot failed: %s", e)
+
+    async def _serve_overlay(self) -> None:
+        """Run the overlay server; the bot keeps running without it if the port is taken."""
+        try:
+            await self.overlay.serve()
+        except OSError as e:
+            log.error("Overlay server unavailable (%s). Browser sources will not update.", e)
+
+    async def _obs_session(self, up: Callable[[], None]) -> None:
+        """Connect to OBS and wait until the connection is lost or the bot stops."""
+        await self.obs.connect()
+        log.info("Connected to %s", OBS_URL)
+        up()
+        await self._until_stopped(self.obs.wait_closed())
+
+    async def _local_session(self, up: Callable[[], None]) -> None:
+        """Connect to the local game server and wait until the connection is lost or the bot stops."""
+        self._local_ws = await websockets.connect(LOCAL_WS_URL, ping_interval=20, ping_timeout=10)
+        log.info("Connected to %s", LOCAL_WS_URL)
+        up()
+        await self._until_stopped(self._local_ws.wait_closed())
+
+    def _local_changed(self, supervisor: Supervisor) -> None:
+        """Point the game relay at the game server while it is connected."""
+        if supervisor.connected:
+            self.relay.attach(self._local_ws)
+        else:
+            self.relay.detach()
 
     async def _run(self) -> None:
-        """Main bot operation loop with reconnection logic."""
-        
-        obs_ws = None
-        local_ws = None
-        reconnect_attempts = 0
-        max_reconnect_attempts = 5
+        """Main bot operation: connect integrations and run every shard."""
+        self.effects.start()
+        background = [asyncio.create_task(monitor_loop_lag())]
+        if self.tokens is not None and self._integrations:
+            # With several workers, only the first refreshes proactively; the
+            # others pick the new token up from the store if theirs is rejected
+            background.append(asyncio.create_task(self._keep_tokens_fresh()))
 
-        while self._running and reconnect_attempts <= max_reconnect_attempts:
+        try:
+            await self.watchtime.open(self.channels.channels)
+            background.append(asyncio.create_task(self.watchtime.run()))
+        except Exception as e:
+            log.error("Watch time database unavailable (%s). Watch time will not be saved.", e)
+        await self.history.open(self.channels.channels)
+        background.append(asyncio.create_task(self.history.run()))
+        background.append(asyncio.create_task(self.analytics.run()))
+        await self.moderation.load()
+        background.append(asyncio.create_task(self.moderation.run()))
+        self._warm_offload()
+        if TWITCH_CLIENT_ID and WATCHTIME_SNAPSHOT_SECONDS > 0:
+            background.append(asyncio.create_task(self._snapshot_chatters()))
+
+        if not self._integrations:
+            self.audio.start()
+        else:
             try:
-                # If you aren't using one, just comment the if statement out to prevent blocking
-
-                # Connect to OBS WebSocket server
-                if ENABLE_OBS_WS:
-                    if obs_ws is None or is_closed(obs_ws):
-                        obs_ws = await self._websocket_connect(OBS_URL, self._obs_connect)
-                        if not obs_ws:
-                            print(red("Failed to connect to OBS. Continuing without OBS integration."))
-                
-                # Connect to local WebSocket server (if available)
-                if ENABLE_LOCAL_WS:
-                    if local_ws is None or is_closed(local_ws):
-                        local_ws = await self._websocket_connect("ws://localhost:8765")
-                        if not local_ws:
-                            print(yellow("Local WebSocket server not available. Some features will be disabled."))
-            
-                # Connect to Twitch IRC
-                async with websockets.connect(TWITCH_WS_URI, ping_interval=20, ping_timeout=10) as ws:
-                    await self._join(ws)
-                    reconnect_attempts = 0  # Reset reconnect attempts on successful connection
-                    
-                    # Main message handling loop
-                    while self._running:
-                        try:
-                            # Monitor OBS and local websocket connections
-                            if obs_ws and is_closed(obs_ws):
-                                print(yellow("OBS WebSocket connection lost. Attempting to reconnect..."))
-                                obs_ws = await self._reconnect_websocket(obs_ws, OBS_URL, self._obs_connect)
-                                
-                            if local_ws and is_closed(local_ws):
-                                print(yellow("Local WebSocket connection lost. Attempting to reconnect..."))
-                                local_ws = await self._reconnect_websocket(local_ws, "ws://localhost:8765")
-                                
-                            # Use a timeout to allow checking the running flag
-                            command = await asyncio.wait_for(ws.recv(), timeout=1.0)
-                            print(blue(f"IRC: {command.strip()}"))
-
-                            # Handle PING messages
-                            if command.startswith("PING"):
-                                await ws.send("PONG")
-                                print(cyan("Sent PONG response"))
-
-                            # Handle PRIVMSG messages (chat messages)
-                            elif "PRIVMSG" in command:
-                                private_message = PrivateMessage(command)
-                                print(private_message.message)
-
-                                # Handle bot commands (starting with !)
-                                if private_message.message.startswith("!"):
-                                    command = private_message.message.split()[0].lower()
-                                    
-                                    # 1% chance to respond with "no" to any command
-                                    guess = random.randint(1, 100)
-                                    if guess == 1:
-                                        response = f"PRIVMSG #{private_message.channel} :MrDestructoid no."
-                                        await ws.send(response)
-                                        print(cyan(f"Bot response: no."))
-                                        continue
-                                    
-                                    # Process specific commands
-                                    command_responses = {
-                                        "!tts": "MrDestructoid Use my Text to Speech: https://rhed.rhamzthev.com/donate",
-                                        "!minecraft": "MrDestructoid Join our Minecraft Server: minecraft.rhamzthev.com",
-                                        "!discord": "MrDestructoid Join our Discord: https://discord.gg/jFKFhWBMbb"
-                                    }
-                                    
-                                    if command in command_responses:
-                                        response = f"PRIVMSG #{private_message.channel} :{command_responses[command]}"
-                                        await ws.send(response)
-                                        print(cyan(f"Command: {command}"))
-
-                                    # TODO: Implement these commands
-                                    elif command in ["!watchtime", "!followtime", "!sr"]:
-                                        continue
-                                
-                                # elif private_message.message.startswith("!clown"):
-                                    # Trigger Clown makeup
-                                    # Start playing the clown theme
-
-                                    # Turn both after 5 seconds
-
-                                # Handle local WebSocket commands (starting with #)
-                                elif private_message.message.startswith("#"):
-                                    if local_ws and is_open(local_ws):
-                                        try:
-                                            display_name = private_message.tags.get("display-name")
-                                            command = private_message.message + f" --name {display_name}"
-                                            await local_ws.send(command)
-                                            print(cyan(f"Local WS: {command}"))
-                                        except Exception as e:
-                                            print(red(f"Local WS error: {e}"))
-                                            # Try to reconnect
-                                            local_ws = await self._reconnect_websocket(local_ws, "ws://localhost:8765")
-
-                                # Handle mentality trigger messages (ending with "mentality.")
-                                elif private_message.message.endswith("mentality."):
-                                    try:
-                                        print(magenta("Mentality triggered"))
-                                        
-                                        # Save the message and username
-                                        await write(src("text", "mentality.txt"), private_message.message)
-                                        await write(src("text", "mentality_name.txt"), private_message.tags.get("display-name"))
-                                        
-                                        # Wait for the scene transition
-                                        await asyncio.sleep(3)
-
-                                        # Only trigger OBS if connection is available
-                                        if obs_ws and is_open(obs_ws):
-                                            # Trigger scene transition in OBS
-                                            print(magenta("Scene transition"))
-                                            await self._obs_trigger_hotkey(obs_ws, {
-                                                "keyId": "OBS_KEY_SCROLLLOCK",
-                                                "keyModifiers": {
-                                                    "alt": True
-                                                }
-                                            })
-                                        else:
-                                            print(yellow("OBS not connected, skipping scene transition"))
-                                        
-                                        # Play the sound effect
-                                        print(magenta("Playing sound"))
-                                        proc = await asyncio.create_subprocess_exec(
-                                            "aplay", 
-                                            src("sound", "mentality.wav")
-                                        )
-                                        await proc.wait()  # Wait for sound to finish playing
-                                        
-                                        # Only trigger OBS if connection is available
-                                        if obs_ws and is_open(obs_ws):
-                                            # Trigger scene transition back
-                                            print(magenta("Scene transition"))
-                                            await self._obs_trigger_hotkey(obs_ws, {
-                                                "keyId": "OBS_KEY_SCROLLLOCK",
-                                                "keyModifiers": {
-                                                    "alt": True
-                                                }
-                                            })
-                                        else:
-                                            print(yellow("OBS not connected, skipping scene transition"))
-                                        
-                                        print(green("Mentality complete"))
-                                    except Exception as e:
-                                        print(red(f"Mentality error: {e}"))
-                        
-                        except asyncio.TimeoutError:
-                            # This is expected, just continue the loop to check if we should exit
-                            continue
-                        except websockets.exceptions.ConnectionClosed:
-                            print(red("Twitch connection closed"))
-                            break
-
-                    # Send a proper goodbye message if we're still connected
-                    try:
-                        await ws.send(f"PART #{self._channel}")
-                        print(yellow(f"Left Twitch channel: #{self._channel}"))
-                    except:
-                        pass
-                        
+                self.audio.start()
             except Exception as e:
-                reconnect_attempts += 1
-                wait_time = min(30, 2 ** reconnect_attempts)  # Exponential backoff with max of 30 seconds
-                
-                if reconnect_attempts <= max_reconnect_attempts:
-                    print(red(f"Bot error: {e}"))
-                    print(yellow(f"Attempting to reconnect in {wait_time} seconds... (Attempt {reconnect_attempts}/{max_reconnect_attempts})"))
-                    await asyncio.sleep(wait_time)
-                else:
-                    print(red(f"Bot failed to run after {max_reconnect_attempts} attempts. Shutting down."))
-                    break
-                    
+                log.error("Audio output unavailable (%s). Continuing without sound.", e)
+                self.audio = AudioEngine(self.audio.sounds, NullSink(), AUDIO_GAIN)
+                self.audio.start()
+
+            background.append(asyncio.create_task(self._serve_overlay()))
+
+            # Integrations connect in the background and reconnect on their own,
+            # so a missing OBS or game server never delays chat
+            if ENABLE_OBS_WS:
+                background.append(asyncio.create_task(self.supervisors.add("OBS", self._obs_session).run()))
+            if ENABLE_LOCAL_WS:
+                local = self.supervisors.add("Local", self._local_session)
+                local.on_change(self._local_changed)
+                background.append(asyncio.create_task(local.run()))
+                self._relay_task = asyncio.create_task(self.relay.run())
+                background.append(self._relay_task)
+
+        # Each shard reconnects on its own; this returns once the bot stops
+        await asyncio.gather(*(
+            self.supervisors.add(f"Twitch shard {shard.index}", partial(self._shard_session, shard)).run()
+            for shard in self.channels.shards
+        ))
+
         # Cleanup
+        self._stop.set()
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.channels.close()
+        await self.offload.close()
+        await self.watchtime.close()
+        await self.history.close()
+
+        # Let queued effects finish while OBS is still connected
+        await self.effects.close()
+        self.audio.stop()
+        if self._recorder:
+            self._recorder.close()
+        for queue in self._song_queues.values():
+            queue.close()
+
         try:
-            # Close all open WebSocket connections
-            if obs_ws and not is_closed(obs_ws):
-                await obs_ws.close()
-            if local_ws and not is_closed(local_ws):
-                await local_ws.close()
-        except:
+            # Close all open connections
+            await self.helix.close()
+            await self.obs.close()
+            if self._local_ws and not is_closed(self._local_ws):
+                await self._local_ws.close()
+        except Exception:
             pass
-            
-        print(yellow("Bot shutdown complete"))
+
+        log.info("Bot shutdown complete")
 
     def _signal_handler(self) -> None:
-        """Handle shutdown signals gracefully."""
-        self._running = False
-        print(red("Shutdown signal received - bot will exit shortly"))
+        """Handle shutdown signals gracefully. Safe to call from any thread."""
+        log.warning("Shutdown signal received - bot will exit shortly")
+        loop = self._loop
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        if loop is not None and running is not loop and not loop.is_closed():
+            loop.call_soon_threadsafe(self._stop.set)
+        else:
+            self._stop.set()
 
     async def run(self) -> None:
         """Run the bot and set up signal handlers."""
-        # Signal handlers removed as they may cause errors
-        print(yellow("Use Ctrl+C to stop the process"))
-        
-        await self._run()
\ No newline at end of file
+        self._loop = asyncio.get_running_loop()
+
+        # Signal handlers can only be installed from the main thread, and not on Windows
+        installed = []
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self._loop.add_signal_handler(signum, self._signal_handler)
+                installed.append(signum)
+            except (NotImplementedError, RuntimeError, ValueError):
+                pass
+        if installed:
+            log.info("Use Ctrl+C to stop the process")
+
+        try:
+            await self._run()
+        finally:
+            for signum in installed:
+                self._loop.remove_signal_handler(signum)
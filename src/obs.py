@@ -0,0 +1,331 @@
+# Standard library imports
+import asyncio
+import base64
+import hashlib
+import json
+import time
+import uuid
+from typing import Any, Callable, Optional
+
+# Third-party imports
+import websockets
+from websockets import State
+
+# Local imports
+from log import get_logger
+from metrics import counter, histogram
+
+log = get_logger("obs")
+
+REQUEST_SECONDS = histogram("nuitbot_obs_request_seconds", "Round trip of OBS requests, by request type")
+REQUEST_ERRORS = counter("nuitbot_obs_request_errors_total", "OBS requests that timed out or lost their connection")
+
+# OBS WebSocket v5 opcodes
+OP_HELLO = 0
+OP_IDENTIFY = 1
+OP_IDENTIFIED = 2
+OP_EVENT = 5
+OP_REQUEST = 6
+OP_REQUEST_RESPONSE = 7
+OP_REQUEST_BATCH = 8
+OP_REQUEST_BATCH_RESPONSE = 9
+
+# RequestBatch execution types
+EXECUTION_SERIAL_REALTIME = 0
+EXECUTION_SERIAL_FRAME = 1
+EXECUTION_PARALLEL = 2
+
+def generate_auth_response(password: str, challenge: str, salt: str) -> str:
+    """Generate authentication response based on OBS WebSocket protocol.
+
+    Args:
+        password: The OBS WebSocket password
+        challenge: The challenge string from OBS WebSocket server
+        salt: The salt string from OBS WebSocket server
+
+    Returns:
+        The authentication string to send back to OBS
+    """
+    # Step 1: Concatenate password and salt
+    combined: str = password + salt
+
+    # Step 2: Generate SHA256 hash and base64 encode (base64 secret)
+    sha256_hash = hashlib.sha256(combined.encode()).digest()
+    base64_secret = base64.b64encode(sha256_hash).decode()
+
+    # Step 3: Concatenate base64_secret with challenge
+    combined_secret_challenge = base64_secret + challenge
+
+    # Step 4: Generate SHA256 hash of the result and base64 encode
+    sha256_hash_final = hashlib.sha256(combined_secret_challenge.encode()).digest()
+    authentication_string = base64.b64encode(sha256_hash_final).decode()
+
+    return authentication_string
+
+class ObsError(Exception):
+    """Raised when OBS rejects a request or the connection is lost."""
+
+class ObsClient:
+    """OBS WebSocket v5 client with request pipelining.
+
+    A background reader task routes every response to the request that is
+    waiting for it by requestId, so several requests can be in flight at once
+    and events pushed by OBS never get mistaken for a response.
+    """
+
+    def __init__(self, url: str, password: str = "", request_timeout: float = 5.0) -> None:
+        """Initialize the client.
+
+        Args:
+            url: OBS WebSocket URL, e.g. "ws://localhost:4455"
+            password: OBS WebSocket password
+            request_timeout: Seconds to wait for a response before giving up
+        """
+        self.url = url
+        self._password = password
+        self._request_timeout = request_timeout
+
+        self.websocket: Optional[websockets.ClientConnection] = None
+        self._reader: Optional[asyncio.Task] = None
+        self._pending: dict[str, asyncio.Future] = {}
+        self._event_callbacks: list[Callable[[str, dict[str, Any]], None]] = []
+
+    @property
+    def connected(self) -> bool:
+        """True if the client is identified and the reader is running."""
+        return (
+            self.websocket is not None
+            and self.websocket.state is State.OPEN
+            and self._reader is not None
+            and not self._reader.done()
+        )
+
+    @property
+    def in_flight(self) -> int:
+        """Number of requests waiting for a response."""
+        return len(self._pending)
+
+    def on_event(self, callback: Callable[[str, dict[str, Any]], None]) -> None:
+        """Register a callback for events pushed by OBS.
+
+        Args:
+            callback: Called with (eventType, eventData) for every event
+        """
+        self._event_callbacks.append(callback)
+
+    async def connect(self) -> None:
+        """Open a new connection to OBS and identify."""
+        websocket = await websockets.connect(self.url, ping_interval=20, ping_timeout=10)
+        await self.attach(websocket)
+
+    async def attach(self, websocket: websockets.ClientConnection) -> None:
+        """Run the OBS handshake on an open socket and start the reader.
+
+        The socket is closed if the handshake fails.
+
+        Args:
+            websocket: WebSocket connection to OBS
+
+        Raises:
+            ObsError: If OBS does not answer in time or rejects the handshake
+        """
+        try:
+            await self._identify(websocket)
+        except BaseException:
+            await websocket.close()
+            raise
+
+        self.websocket = websocket
+        self._reader = asyncio.create_task(self._read(websocket))
+
+    async def _recv(self, websocket: websockets.ClientConnection) -> dict[str, Any]:
+        """Receive one handshake message, waiting at most the request timeout."""
+        try:
+            return json.loads(await asyncio.wait_for(websocket.recv(), self._request_timeout))
+        except asyncio.TimeoutError:
+            raise ObsError(f"OBS did not answer the handshake within {self._request_timeout}s") from None
+        except websockets.exceptions.ConnectionClosed as e:
+            raise ObsError(f"OBS closed the connection during the handshake: {e}") from None
+
+    async def _identify(self, websocket: websockets.ClientConnection) -> None:
+        """Answer OBS's Hello with an Identify and wait until it is accepted."""
+        # Receive the initial OpCode 0 message
+        hello_data = await self._recv(websocket)
+        log.info("OBS: Hello message received")
+
+        if hello_data["op"] != OP_HELLO:
+            raise ObsError(f"Unexpected first message from OBS: {hello_data}")
+
+        identify: dict[str, Any] = {"rpcVersion": hello_data["d"]["rpcVersion"]}
+        authentication = hello_data["d"].get("authentication")
+        if authentication:
+            challenge = authentication["challenge"]
+            salt = authentication["salt"]
+
+            # Generate authentication string
+            identify["authentication"] = generate_auth_response(self._password, challenge, salt)
+
+        # Send authentication response
+        log.info("OBS: Sending authentication")
+        await websocket.send(json.dumps({"op": OP_IDENTIFY, "d": identify}))
+
+        # Receive authentication result
+        identified = await self._recv(websocket)
+        if identified["op"] != OP_IDENTIFIED:
+            raise ObsError(f"OBS authentication failed: {identified}")
+        log.info("OBS: Authentication complete")
+
+    async def _read(self, websocket: websockets.ClientConnection) -> None:
+        """Route responses to waiting requests and events to callbacks."""
+        try:
+            async for raw in websocket:
+                data = json.loads(raw)
+                op = data.get("op")
+                payload = data.get("d", {})
+
+                if op in (OP_REQUEST_RESPONSE, OP_REQUEST_BATCH_RESPONSE):
+                    future = self._pending.pop(payload.get("requestId"), None)
+                    if future and not future.done():
+                        future.set_result(payload)
+                elif op == OP_EVENT:
+                    for callback in self._event_callbacks:
+                        try:
+                            callback(payload.get("eventType", ""), payload.get("eventData", {}))
+                        except Exception as e:
+                            log.error("OBS event callback error: %s", e)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            log.warning("OBS: Connection closed")
+            self._fail_pending(ObsError("OBS connection closed"))
+            # Also when reading failed for another reason, so the socket is not left open
+            await websocket.close()
+
+    def _fail_pending(self, error: Exception) -> None:
+        """Fail every request that is still waiting for a response."""
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    async def _send(self, op: int, payload: dict[str, Any]) -> dict[str, Any]:
+        """Send a request and wait for the response with the same requestId."""
+        if not self.connected:
+            raise ObsError("OBS not connected")
+
+        request_id = str(uuid.uuid4())
+        payload["requestId"] = request_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        request_type = payload.get("requestType", "RequestBatch")
+
+        start = time.perf_counter()
+        try:
+            await self.websocket.send(json.dumps({"op": op, "d": payload}))
+            response = await asyncio.wait_for(future, self._request_timeout)
+            REQUEST_SECONDS.observe(time.perf_counter() - start, request=request_type)
+            return response
+        except asyncio.TimeoutError:
+            REQUEST_ERRORS.inc(request=request_type)
+            raise ObsError(f"OBS request timed out after {self._request_timeout}s")
+        except websockets.exceptions.ConnectionClosed as e:
+            REQUEST_ERRORS.inc(request=request_type)
+            raise ObsError(f"OBS connection closed: {e}") from None
+        except ObsError:
+            REQUEST_ERRORS.inc(request=request_type)
+            raise
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def request(self, request_type: str, request_data: Optional[dict[str, Any]] = None) -> dict[str, Any]:
+        """Send a single request to OBS.
+
+        Args:
+            request_type: OBS request type, e.g. "TriggerHotkeyByKeySequence"
+            request_data: Request parameters
+
+        Returns:
+            The responseData of the response (empty if OBS sent none)
+
+        Raises:
+            ObsError: If OBS rejected the request or the connection is lost
+        """
+        payload: dict[str, Any] = {"requestType": request_type}
+        if request_data is not None:
+            payload["requestData"] = request_data
+
+        response = await self._send(OP_REQUEST, payload)
+        status = response.get("requestStatus", {})
+        if not status.get("result"):
+            raise ObsError(f"{request_type} failed ({status.get('code')}): {status.get('comment', '')}")
+        return response.get("responseData", {})
+
+    async def batch(
+        self,
+        requests: list[tuple[str, Optional[dict[str, Any]]]],
+        halt_on_failure: bool = False,
+        execution_type: int = EXECUTION_SERIAL_REALTIME,
+    ) -> list[dict[str, Any]]:
+        """Send several requests as one RequestBatch.
+
+        Use the "Sleep" request type with {"sleepMillis": ...} to wait
+        between steps inside the batch.
+
+        Args:
+            requests: (requestType, requestData) pairs, run in order
+            halt_on_failure: Stop the batch at the first failed request
+            execution_type: One of the EXECUTION_* constants
+
+        Returns:
+            The individual request results, in order
+        """
+        batch_requests = []
+        for request_type, request_data in requests:
+            request: dict[str, Any] = {"requestType": request_type}
+            if request_data is not None:
+                request["requestData"] = request_data
+            batch_requests.append(request)
+
+        response = await self._send(OP_REQUEST_BATCH, {
+            "haltOnFailure": halt_on_failure,
+            "executionType": execution_type,
+            "requests": batch_requests,
+        })
+        return response.get("results", [])
+
+    async def trigger_hotkey(self, key_id: str, modifiers: Optional[dict[str, bool]] = None) -> None:
+        """Trigger an OBS hotkey by key sequence.
+
+        Args:
+            key_id: OBS key identifier, e.g. "OBS_KEY_SCROLLLOCK"
+            modifiers: Modifier keys to hold, e.g. {"alt": True}
+        """
+        request_data: dict[str, Any] = {"keyId": key_id}
+        if modifiers:
+            request_data["keyModifiers"] = modifiers
+
+        log.info("OBS: Triggering hotkey")
+        await self.request("TriggerHotkeyByKeySequence", request_data)
+        log.info("OBS: Hotkey triggered")
+
+    async def wait_closed(self) -> None:
+        """Wait until the connection to OBS is lost or closed."""
+        if self._reader is not None:
+            # asyncio.wait does not cancel the reader if this wait is cancelled
+            await asyncio.wait({self._reader})
+
+    async def close(self) -> None:
+        """Close the connection and fail any outstanding requests."""
+        if self.websocket is not None and self.websocket.state is not State.CLOSED:
+            try:
+                await self.websocket.close()
+            except Exception:
+                pass
+
+        if self._reader is not None:
+            try:
+                await self._reader
+            except Exception:
+                pass
+            self._reader = None
+        self._fail_pending(ObsError("OBS client closed"))
@@ -0,0 +1,238 @@
+# Standard library imports
+import asyncio
+import importlib
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Iterable, Optional
+
+# Local imports
+from log import get_logger
+from metrics import counter, gauge, histogram
+
+log = get_logger("offload")
+
+OFFLOAD_SECONDS = histogram("nuitbot_offload_seconds", "Time from handing work to the process pool until its result is back, by handler")
+OFFLOAD_WORK_SECONDS = histogram("nuitbot_offload_work_seconds", "Time a worker process spent running the work, by handler")
+OFFLOAD_REJECTED = counter("nuitbot_offload_rejected_total", "Work the process pool refused or gave up on, by reason")
+OFFLOAD_PENDING = gauge("nuitbot_offload_pending", "Work handed to the process pool and not finished yet")
+
+# Worker processes for CPU-bound handlers (0 runs them in a thread instead,
+# e.g. where processes cannot be started)
+OFFLOAD_WORKERS = int(os.getenv("OFFLOAD_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) - 1)))))
+
+# Seconds a handler may run before its worker is replaced (time spent waiting
+# for a free worker does not count)
+OFFLOAD_TIMEOUT_SECONDS = float(os.getenv("OFFLOAD_TIMEOUT_SECONDS", "5"))
+
+# Work that may wait for or run in the pool at once, in total and per
+# handler (0 = one less than the workers), so a single slow handler leaves
+# the other handlers a worker
+OFFLOAD_MAX_PENDING = int(os.getenv("OFFLOAD_MAX_PENDING", "64"))
+OFFLOAD_PER_HANDLER = int(os.getenv("OFFLOAD_PER_HANDLER", "0"))
+
+class OffloadError(Exception):
+    """Raised when offloaded work could not be run or took too long."""
+
+def _preload(modules: tuple[str, ...]) -> None:
+    """Import the handlers' modules when a worker starts, so the first call does not pay for it."""
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        except Exception as e:
+            log.warning("Preloading %s in a worker failed: %s", module, e)
+
+def _call(function: Callable[..., Any], args: tuple) -> tuple[Any, float]:
+    """Run the work in a worker process, returning its result and how long it ran."""
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+class OffloadPool:
+    """Process pool that runs CPU-bound handlers away from the event loop.
+
+    Work is a plain function and a few arguments, both of which have to
+    pickle: pass message fields, not the message or the bot. Large data a
+    handler needs (rule sets, models) belongs at module level in its
+    plugin, where each worker builds it once when it imports the module.
+
+    Every call gets its own future, so results never mix, and a job number
+    that appears in the logs. The pool bounds how much work may be pending
+    in total and per handler. Work is only handed to the executor when a
+    worker is free, so it waits on the event loop rather than in the
+    executor, and its timeout covers only the time it runs. Work that runs
+    past its timeout gets its worker replaced, which also fails whatever
+    else was running in the pool at that moment.
+    """
+
+    def __init__(
+        self,
+        workers: int = OFFLOAD_WORKERS,
+        timeout: float = OFFLOAD_TIMEOUT_SECONDS,
+        max_pending: int = OFFLOAD_MAX_PENDING,
+        per_handler: int = OFFLOAD_PER_HANDLER,
+    ) -> None:
+        """Initialize the pool. Worker processes start on first use or warm().
+
+        Args:
+            workers: Worker processes (0 runs work in a thread instead)
+            timeout: Seconds a call may run before its worker is replaced
+            max_pending: Calls that may be pending at once
+            per_handler: Calls of one handler that may be pending at once
+                (0 = one less than the workers)
+        """
+        self.workers = workers
+        self._timeout = timeout
+        self._max_pending = max_pending
+        self._per_handler = per_handler or max(1, workers - 1)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._modules: tuple[str, ...] = ()
+        self._jobs = itertools.count(1)
+        self._pending: dict[str, int] = {}
+        # One slot per worker, so work handed to the executor starts right away
+        self._slots = asyncio.Semaphore(workers if workers > 0 else max_pending)
+        self._closed = False
+        OFFLOAD_PENDING.set_function(lambda: sum(self._pending.values()))
+
+    @property
+    def pending(self) -> int:
+        """Calls waiting for or running in the pool."""
+        return sum(self._pending.values())
+
+    def _pool(self) -> ProcessPoolExecutor:
+        """The executor, started if needed."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_preload,
+                initargs=(self._modules,),
+            )
+        return self._executor
+
+    def _restart(self, kill: bool = True) -> None:
+        """Replace the worker processes; the next call starts new ones.
+
+        Args:
+            kill: Stop the old workers right away, failing what they run
+                (otherwise they finish their current work first)
+        """
+        executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        # The executor cannot stop running work itself
+        processes = list((getattr(executor, "_processes", None) or {}).values()) if kill else []
+        executor.shutdown(wait=False, cancel_futures=kill)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    async def warm(self, modules: Iterable[str] = ()) -> None:
+        """Start fresh workers ahead of the first call.
+
+        Workers already running are replaced once they finish their current
+        work, so plugins reloaded since they started take effect.
+
+        Args:
+            modules: Modules to import in every worker, e.g. the plugins
+                that register CPU-bound commands
+        """
+        self._modules = tuple(sorted(set(modules)))
+        self._restart(kill=False)
+        if self.workers <= 0 or self._closed:
+            return
+
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            pool = self._pool()
+            await asyncio.gather(*(loop.run_in_executor(pool, _preload, ()) for _ in range(self.workers)))
+        except (BrokenProcessPool, OSError) as e:
+            log.error("Starting the worker processes failed: %s", e)
+            self._restart()
+            return
+        log.info("Started %s worker processes in %.0f ms", self.workers, (time.perf_counter() - start) * 1000)
+
+    async def run(self, name: str, function: Callable[..., Any], *args: Any) -> Any:
+        """Run a function in a worker process and wait for its result.
+
+        Waiting only suspends the caller, so run this in its own task when
+        other work should not wait for it.
+
+        Args:
+            name: Handler name, for the per-handler limit, logs and metrics
+            function: Module-level function to call
+            args: Arguments to call it with
+
+        Returns:
+            What the function returned
+
+        Raises:
+            OffloadError: If the pool is busy or closed, the call timed out,
+                or the worker died
+            Exception: Whatever the function raised
+        """
+        if self._closed:
+            OFFLOAD_REJECTED.inc(reason="closed")
+            raise OffloadError("the worker pool is shut down")
+        if self.pending >= self._max_pending:
+            OFFLOAD_REJECTED.inc(reason="full")
+            raise OffloadError(f"{self.pending} calls already pending")
+        if self._pending.get(name, 0) >= self._per_handler:
+            OFFLOAD_REJECTED.inc(reason="handler_busy")
+            raise OffloadError(f"{name} already has {self._pending[name]} calls pending")
+
+        job = next(self._jobs)
+        loop = asyncio.get_running_loop()
+        self._pending[name] = self._pending.get(name, 0) + 1
+        start = time.perf_counter()
+        try:
+            async with self._slots:
+                result, seconds = await self._submit(loop, name, job, function, args)
+        finally:
+            self._pending[name] -= 1
+            if not self._pending[name]:
+                del self._pending[name]
+
+        OFFLOAD_WORK_SECONDS.observe(seconds, handler=name)
+        OFFLOAD_SECONDS.observe(time.perf_counter() - start, handler=name)
+        return result
+
+    async def _submit(
+        self, loop: asyncio.AbstractEventLoop, name: str, job: int, function: Callable[..., Any], args: tuple,
+    ) -> tuple[Any, float]:
+        """Hand work to a free worker and wait for it, restarting the workers if it runs too long."""
+        if self._closed:
+            OFFLOAD_REJECTED.inc(reason="closed")
+            raise OffloadError("the worker pool is shut down")
+        pool = self._pool() if self.workers > 0 else None
+        future = loop.run_in_executor(pool, _call, function, args)
+        try:
+            return await asyncio.wait_for(future, self._timeout)
+        except asyncio.TimeoutError:
+            OFFLOAD_REJECTED.inc(reason="timeout")
+            log.warning("%s (job %s) took longer than %.1fs, restarting the workers", name, job, self._timeout)
+            if pool is not None and pool is self._executor:
+                self._restart()
+            raise OffloadError(f"{name} timed out") from None
+        except BrokenProcessPool:
+            OFFLOAD_REJECTED.inc(reason="worker_died")
+            if pool is self._executor:
+                self._restart()
+            log.warning("%s (job %s) lost its worker process", name, job)
+            raise OffloadError(f"{name} lost its worker process") from None
+
+    async def close(self) -> None:
+        """Stop the workers, cancelling work that has not started and killing work that does not finish in time."""
+        self._closed = True
+        if self._executor is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.to_thread(self._executor.shutdown, True, cancel_futures=True), self._timeout)
+            self._executor = None
+        except asyncio.TimeoutError:
+            log.warning("Worker processes did not finish in time, stopping them")
+            self._restart()
@@ -0,0 +1,286 @@
+# Standard library imports
+import asyncio
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# Third-party imports
+import websockets
+
+# Local imports
+from log import get_logger
+
+log = get_logger("outbound")
+
+# Twitch chat limits: messages per 30 seconds, depending on whether the bot
+# is a moderator (or the broadcaster) in the channel it sends to
+RATE_PERIOD = 30.0
+USER_RATE_LIMIT = 20
+MODERATOR_RATE_LIMIT = 100
+
+# Lower numbers are sent first. PRIORITY_SYSTEM lines (PONG, JOIN, PART)
+# are protocol traffic and do not count against the chat limits
+PRIORITY_SYSTEM = 0
+PRIORITY_HIGH = 1
+PRIORITY_NORMAL = 2
+PRIORITY_LOW = 3
+
+class TokenBucket:
+    """Token bucket that refills continuously up to its capacity."""
+
+    def __init__(self, capacity: int, period: float) -> None:
+        """Initialize a full bucket.
+
+        Args:
+            capacity: Maximum number of tokens
+            period: Seconds it takes to refill an empty bucket
+        """
+        self.capacity = capacity
+        self.rate = capacity / period
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        """Add the tokens earned since the last update."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_take(self, tokens: int = 1) -> bool:
+        """Take tokens if they are available.
+
+        Args:
+            tokens: Number of tokens to take
+
+        Returns:
+            True if the tokens were taken, False otherwise
+        """
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    def delay(self, tokens: int = 1) -> float:
+        """Seconds until the given number of tokens is available."""
+        self._refill()
+        return max(0.0, (tokens - self._tokens) / self.rate)
+
+    async def acquire(self, tokens: int = 1) -> None:
+        """Wait until tokens are available and take them.
+
+        Args:
+            tokens: Number of tokens to take
+        """
+        while not self.try_take(tokens):
+            await asyncio.sleep(self.delay(tokens))
+
+class RateLimits:
+    """Chat rate limits shared by every connection of one Twitch account.
+
+    Twitch counts messages per account, so all send queues draw from the
+    same pair of buckets. The bucket is picked by the bot's status in the
+    channel the message goes to.
+    """
+
+    def __init__(self, share: float = 1.0) -> None:
+        """Initialize full buckets.
+
+        Args:
+            share: Fraction of the account's limits this process may use
+                (less than 1 when channels are split across worker processes)
+        """
+        self.user = TokenBucket(max(1, int(USER_RATE_LIMIT * share)), RATE_PERIOD)
+        self.moderator = TokenBucket(max(1, int(MODERATOR_RATE_LIMIT * share)), RATE_PERIOD)
+        self._moderator_channels: set[str] = set()
+
+    def set_moderator(self, channel: str, moderator: bool) -> None:
+        """Record whether the bot is a moderator in a channel.
+
+        Args:
+            channel: Channel name (without "#" prefix)
+            moderator: True if the bot is a moderator or the broadcaster
+        """
+        if moderator:
+            self._moderator_channels.add(channel)
+        else:
+            self._moderator_channels.discard(channel)
+
+    def bucket(self, channel: Optional[str]) -> TokenBucket:
+        """Pick the token bucket for the bot's status in a channel."""
+        return self.moderator if channel in self._moderator_channels else self.user
+
+class SendQueue:
+    """Outbound IRC pipeline with priorities, rate limiting and batching.
+
+    Lines are queued by priority, checked against the token bucket for the
+    bot's status in the target channel, and every line that is allowed to go
+    out is written in a single frame.
+    """
+
+    def __init__(
+        self,
+        coalesce_window: float = 10.0,
+        limits: Optional[RateLimits] = None,
+        max_batch: int = 10,
+        max_queue: int = 200,
+    ) -> None:
+        """Initialize the queue.
+
+        Args:
+            coalesce_window: Seconds during which an identical chat line is only sent once
+            limits: Rate limits shared with other queues of the same account
+            max_batch: Maximum number of lines written per frame
+            max_queue: Maximum number of queued lines
+        """
+        self._coalesce_window = coalesce_window
+        self._max_batch = max_batch
+        self._max_queue = max_queue
+        self.limits = limits or RateLimits()
+
+        self._heap: list[tuple[int, int, str, Optional[str]]] = []
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._empty = asyncio.Event()
+        self._empty.set()
+
+        # Recently queued chat lines, oldest first, for coalescing
+        self._recent: OrderedDict[str, float] = OrderedDict()
+
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    @property
+    def depth(self) -> int:
+        """Number of lines waiting to be sent."""
+        return len(self._heap)
+
+    def _is_duplicate(self, line: str, now: float) -> bool:
+        """Check whether a line was queued within the coalescing window."""
+        # Entries are in insertion order, so expired ones are all at the front
+        while self._recent:
+            queued_at = next(iter(self._recent.values()))
+            if now - queued_at < self._coalesce_window:
+                break
+            self._recent.popitem(last=False)
+
+        return line in self._recent
+
+    def _push(self, priority: int, line: str, channel: Optional[str]) -> bool:
+        """Add a line to the queue unless it is full."""
+        if len(self._heap) >= self._max_queue:
+            self.dropped += 1
+            log.warning("Send queue full (%s), dropping: %s", self._max_queue, line)
+            return False
+
+        heapq.heappush(self._heap, (priority, next(self._sequence), line, channel))
+        self._empty.clear()
+        self._wakeup.set()
+        return True
+
+    def privmsg(self, channel: str, text: str, priority: int = PRIORITY_NORMAL) -> bool:
+        """Queue a chat message.
+
+        Args:
+            channel: Channel name (without "#" prefix)
+            text: Message text
+            priority: One of the PRIORITY_* constants
+
+        Returns:
+            True if the message was queued, False if it was coalesced or dropped
+        """
+        line = f"PRIVMSG #{channel} :{text}"
+        now = time.monotonic()
+        if self._is_duplicate(line, now):
+            self.coalesced += 1
+            return False
+        if not self._push(priority, line, channel):
+            # Not remembered, so a retry is not mistaken for a duplicate
+            return False
+        self._recent[line] = now
+        return True
+
+    def raw(self, line: str) -> bool:
+        """Queue a protocol line that is not subject to chat rate limits.
+
+        Args:
+            line: Complete IRC line, e.g. "PONG :tmi.twitch.tv"
+
+        Returns:
+            True if the line was queued, False if it was dropped
+        """
+        return self._push(PRIORITY_SYSTEM, line, None)
+
+    def _take_batch(self) -> tuple[list[str], float]:
+        """Pop every line that may be sent now.
+
+        Returns:
+            The lines to send and, if the next line is rate limited, the
+            seconds until it may go out (0 otherwise)
+        """
+        batch: list[str] = []
+        while self._heap and len(batch) < self._max_batch:
+            priority, _, line, channel = self._heap[0]
+            if priority != PRIORITY_SYSTEM:
+                bucket = self.limits.bucket(channel)
+                if not bucket.try_take():
+                    return batch, bucket.delay()
+            heapq.heappop(self._heap)
+            batch.append(line)
+        return batch, 0.0
+
+    def discard_protocol(self) -> None:
+        """Drop queued protocol lines after a disconnect.
+
+        They only make sense on the connection they were queued for. Chat
+        messages are kept and sent once a new connection is up.
+        """
+        self._heap = [entry for entry in self._heap if entry[0] != PRIORITY_SYSTEM]
+        heapq.heapify(self._heap)
+        if not self._heap:
+            self._empty.set()
+
+    async def drain(self, timeout: float) -> bool:
+        """Wait until every queued line was sent.
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            True if the queue is empty, False if the timeout expired first
+        """
+        try:
+            await asyncio.wait_for(self._empty.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def run(self, ws: websockets.ClientConnection) -> None:
+        """Send queued lines on a connection until cancelled.
+
+        Args:
+            ws: WebSocket connection to Twitch IRC
+        """
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            batch, delay = self._take_batch()
+            if batch:
+                await ws.send("\r\n".join(batch))
+                self.sent += len(batch)
+                if not self._heap:
+                    self._empty.set()
+
+            if delay:
+                # Sleep until a token is available, or a new line arrives
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
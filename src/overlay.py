@@ -0,0 +1,110 @@
+# Standard library imports
+import asyncio
+import json
+import os
+from typing import Optional
+
+# Third-party imports
+import websockets
+
+# Local imports
+from log import get_logger
+from metrics import counter, gauge
+
+log = get_logger("overlay")
+
+OVERLAY_UPDATES = counter("nuitbot_overlay_updates_total", "Overlay state updates")
+OVERLAY_CLIENTS = gauge("nuitbot_overlay_clients", "Overlay browser sources connected")
+
+# WebSocket server that pushes overlay state to OBS browser sources
+OVERLAY_HOST = os.getenv("OVERLAY_HOST", "localhost")
+OVERLAY_PORT = int(os.getenv("OVERLAY_PORT", "8766"))
+
+# Also write every value to "<key>.txt" in this directory, for OBS text
+# sources that read files (empty disables it)
+OVERLAY_FILE_DIR = os.getenv("OVERLAY_FILE_DIR", "")
+
+class OverlayState:
+    """Overlay values held in memory and pushed to browser sources on change.
+
+    Every update replaces the values it names and bumps a version; each
+    connected client is woken and sent the whole state, so values updated
+    together always arrive together. A client that falls behind skips
+    straight to the latest version instead of queueing stale ones.
+    """
+
+    def __init__(self, file_dir: str = OVERLAY_FILE_DIR) -> None:
+        """Initialize an empty state.
+
+        Args:
+            file_dir: Directory for the optional "<key>.txt" files (empty disables them)
+        """
+        self._values: dict[str, str] = {}
+        self.version = 0
+        self._file_dir = file_dir
+        self._waiters: set[asyncio.Event] = set()
+        OVERLAY_CLIENTS.set_function(lambda: len(self._waiters))
+
+    def get(self) -> dict[str, str]:
+        """A copy of the current values. Safe to call from any thread."""
+        return dict(self._values)
+
+    def message(self) -> str:
+        """The current state as the JSON message sent to clients."""
+        return json.dumps({"version": self.version, "values": self._values})
+
+    async def update(self, **values: str) -> None:
+        """Set one or more values at once and push them to every client.
+
+        Args:
+            values: Values by key, e.g. mentality="...", mentality_name="..."
+        """
+        self._values = {**self._values, **values}
+        self.version += 1
+        OVERLAY_UPDATES.inc()
+        for waiter in self._waiters:
+            waiter.set()
+
+        if self._file_dir:
+            try:
+                await asyncio.to_thread(self._write_files, values)
+            except OSError as e:
+                log.warning("Writing overlay files failed: %s", e)
+
+    def _write_files(self, values: dict[str, str]) -> None:
+        """Write each value to its file, replacing it atomically so OBS never reads half a file."""
+        os.makedirs(self._file_dir, exist_ok=True)
+        for key, value in values.items():
+            path = os.path.join(self._file_dir, f"{key}.txt")
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                f.write(value)
+            os.replace(f"{path}.tmp", path)
+
+    async def _handler(self, ws: websockets.ServerConnection) -> None:
+        """Send the state on connect and again after every update until the client leaves."""
+        changed = asyncio.Event()
+        self._waiters.add(changed)
+        closed = asyncio.create_task(ws.wait_closed())
+        try:
+            sent: Optional[int] = None
+            while not closed.done():
+                if sent != self.version:
+                    sent = self.version
+                    await ws.send(self.message())
+                    continue
+
+                waiter = asyncio.create_task(changed.wait())
+                await asyncio.wait({waiter, closed}, return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                changed.clear()
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self._waiters.discard(changed)
+            closed.cancel()
+
+    async def serve(self, host: str = OVERLAY_HOST, port: int = OVERLAY_PORT) -> None:
+        """Run the WebSocket server until cancelled."""
+        async with websockets.serve(self._handler, host, port):
+            log.info("Overlay server listening on ws://%s:%s", host, port)
+            await asyncio.Future()
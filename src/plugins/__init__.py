@@ -0,0 +1,5 @@
+"""Command plugins.
+
+Each module in this package exposes ``setup(registry)`` and registers its
+commands on the given CommandRegistry.
+"""
@@ -0,0 +1,33 @@
+# Local imports
+from commands import CommandRegistry, is_moderator
+from cooldowns import Cooldown
+
+# Commands that reply with a fixed message
+RESPONSES = {
+    "tts": "MrDestructoid Use my Text to Speech: https://rhed.rhamzthev.com/donate",
+    "minecraft": "MrDestructoid Join our Minecraft Server: minecraft.rhamzthev.com",
+    "discord": "MrDestructoid Join our Discord: https://discord.gg/jFKFhWBMbb",
+}
+
+def _reply_with(response: str):
+    """Create a handler that always replies with the same message."""
+    async def handler(bot, message, args):
+        await bot.reply(message, response)
+    return handler
+
+async def reload_commands(bot, message, args):
+    """Reload every command plugin (moderators only)."""
+    if not is_moderator(message):
+        return
+
+    if bot.commands.reload():
+        await bot.reply(message, f"MrDestructoid Reloaded {len(bot.commands)} commands.")
+    else:
+        await bot.reply(message, "MrDestructoid Reload failed, check the logs.")
+
+def setup(registry: CommandRegistry) -> None:
+    """Register the basic commands."""
+    for name, response in RESPONSES.items():
+        registry.register(name, _reply_with(response), cooldown=Cooldown(command=10))
+
+    registry.register("reload", reload_commands)
@@ -0,0 +1,48 @@
+# Standard library imports
+from datetime import datetime, timezone
+
+# Local imports
+from commands import CommandRegistry
+from cooldowns import Cooldown
+from helix import HelixError
+from log import get_logger
+from utils import format_duration
+
+log = get_logger("commands")
+
+async def followtime(bot, message, args):
+    """Reply with how long the sender (or "!followtime @user") has followed the channel."""
+    broadcaster_id = message.tag("room-id")
+    display_name = message.tag("display-name") or message.user
+    target = args.split(" ", 1)[0].lstrip("@") if args else ""
+
+    try:
+        if target:
+            user_id = await bot.helix.user_id(target)
+            if user_id is None:
+                await bot.reply(message, f"MrDestructoid @{display_name} I don't know {target}.")
+                return
+            name = target
+        else:
+            user_id = message.tag("user-id")
+            name = display_name
+
+        if user_id == broadcaster_id:
+            await bot.reply(message, f"MrDestructoid @{display_name} that's the streamer!")
+            return
+
+        followed_at = await bot.helix.followed_at(broadcaster_id, user_id)
+    except HelixError as e:
+        log.error("!followtime lookup failed: %s", e)
+        await bot.reply(message, f"MrDestructoid @{display_name} I can't check follows right now.")
+        return
+
+    if followed_at is None:
+        await bot.reply(message, f"MrDestructoid @{display_name} {name} is not following #{message.channel}.")
+    else:
+        duration = format_duration((datetime.now(timezone.utc) - followed_at).total_seconds())
+        await bot.reply(message, f"MrDestructoid @{display_name} {name} has been following #{message.channel} for {duration}.")
+
+def setup(registry: CommandRegistry) -> None:
+    """Register the follow commands."""
+    registry.register("followtime", followtime, ("followage",), Cooldown(user=30))
@@ -0,0 +1,52 @@
+# Standard library imports
+import time
+
+# Local imports
+from commands import CommandRegistry, is_moderator
+from utils import format_duration
+
+# Longest quoted message, so replies stay within Twitch's 500 character limit
+MAX_QUOTE_LENGTH = 300
+
+def _quoted(text: str) -> str:
+    """A chat message shortened for a reply."""
+    return text if len(text) <= MAX_QUOTE_LENGTH else text[:MAX_QUOTE_LENGTH - 1] + "…"
+
+async def lastseen(bot, message, args):
+    """Reply with when a viewer last chatted and what they said: "!lastseen @user" (moderators only)."""
+    if not is_moderator(message):
+        return
+
+    display_name = message.tag("display-name") or message.user
+    target = args.split(" ", 1)[0].lstrip("@") if args else ""
+    if not target:
+        await bot.reply(message, f"MrDestructoid @{display_name} Usage: !lastseen @user")
+        return
+
+    record = await bot.history.last_seen(message.channel, target.lower())
+    if record is None:
+        await bot.reply(message, f"MrDestructoid @{display_name} I haven't seen {target} chat in #{message.channel}.")
+        return
+
+    ago = format_duration(time.time() - record.time)
+    await bot.reply(message, f"MrDestructoid {record.display_name or target} was last seen {ago} ago: {_quoted(record.text)}")
+
+async def quote(bot, message, args):
+    """Reply with a random message of a viewer ("!quote @user") or of recent chat (moderators only)."""
+    if not is_moderator(message):
+        return
+
+    display_name = message.tag("display-name") or message.user
+    target = args.split(" ", 1)[0].lstrip("@") if args else ""
+    record = await bot.history.quote(message.channel, target.lower() if target else None)
+    if record is None:
+        await bot.reply(message, f"MrDestructoid @{display_name} I have nothing to quote{f' from {target}' if target else ''}.")
+        return
+
+    day = time.strftime("%Y-%m-%d", time.localtime(record.time))
+    await bot.reply(message, f"MrDestructoid \"{_quoted(record.text)}\" - {record.display_name or record.user}, {day}")
+
+def setup(registry: CommandRegistry) -> None:
+    """Register the chat history commands."""
+    registry.register("lastseen", lastseen, ("seen",))
+    registry.register("quote", quote)
@@ -0,0 +1,62 @@
+# Local imports
+from commands import CommandRegistry, is_moderator
+from cooldowns import Cooldown
+from songs import SongRequestError
+
+async def song_request(bot, message, args):
+    """Queue a song: "!sr <YouTube/Spotify link or song name>"."""
+    display_name = message.tag("display-name") or message.user
+    queue = bot.song_queue(message.channel)
+    try:
+        song = queue.add(args, message.user, exempt=is_moderator(message))
+    except SongRequestError as e:
+        await bot.reply(message, f"MrDestructoid @{display_name} {e}")
+        return
+
+    await bot.reply(message, f"MrDestructoid @{display_name} Added #{song.id} at position {len(queue)}.")
+
+async def show_queue(bot, message, args):
+    """Reply with the current song and the next few."""
+    songs = bot.song_queue(message.channel).upcoming(4)
+    if not songs:
+        await bot.reply(message, "MrDestructoid The song queue is empty. Request one with !sr")
+        return
+
+    current, upcoming = songs[0], songs[1:]
+    text = f"MrDestructoid Now: {current.query} (@{current.user})"
+    if upcoming:
+        text += " | Next: " + ", ".join(f"#{song.id} {song.query}" for song in upcoming)
+    await bot.reply(message, text)
+
+async def skip_song(bot, message, args):
+    """Skip the current song (moderators only)."""
+    if not is_moderator(message):
+        return
+
+    song = bot.song_queue(message.channel).skip()
+    if song is None:
+        await bot.reply(message, "MrDestructoid The song queue is empty.")
+    else:
+        await bot.reply(message, f"MrDestructoid Skipped #{song.id} {song.query}")
+
+async def remove_song(bot, message, args):
+    """Remove a song by number: moderators can remove any, viewers their own."""
+    display_name = message.tag("display-name") or message.user
+    queue = bot.song_queue(message.channel)
+    request_id = args.split(" ", 1)[0].lstrip("#")
+    song = queue.get(int(request_id)) if request_id.isdigit() else None
+
+    if song is None:
+        await bot.reply(message, f"MrDestructoid @{display_name} Usage: !srremove <number from the queue>")
+    elif song.user != message.user and not is_moderator(message):
+        await bot.reply(message, f"MrDestructoid @{display_name} You can only remove your own songs.")
+    else:
+        queue.remove(song.id)
+        await bot.reply(message, f"MrDestructoid @{display_name} Removed #{song.id} {song.query}")
+
+def setup(registry: CommandRegistry) -> None:
+    """Register the song request commands."""
+    registry.register("sr", song_request, ("songrequest",), Cooldown(user=5))
+    registry.register("queue", show_queue, ("songs", "song"), Cooldown(command=10))
+    registry.register("skip", skip_song)
+    registry.register("srremove", remove_song, ("wrongsong",))
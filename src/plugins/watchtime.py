@@ -0,0 +1,22 @@
+# Local imports
+from commands import CommandRegistry
+from cooldowns import Cooldown
+from utils import format_duration
+
+async def watchtime(bot, message, args):
+    """Reply with how long the sender (or "!watchtime @user") has watched the channel."""
+    display_name = message.tag("display-name") or message.user
+    target = args.split(" ", 1)[0].lstrip("@") if args else ""
+    login = target.lower() if target else message.user
+    name = target or display_name
+
+    # Answered from memory, including the session that is still running
+    seconds = bot.watchtime.seconds(message.channel, login)
+    if seconds < 1:
+        await bot.reply(message, f"MrDestructoid @{display_name} I haven't seen {name} watching #{message.channel} yet.")
+    else:
+        await bot.reply(message, f"MrDestructoid @{display_name} {name} has watched #{message.channel} for {format_duration(seconds)}.")
+
+def setup(registry: CommandRegistry) -> None:
+    """Register the watch time commands."""
+    registry.register("watchtime", watchtime, cooldown=Cooldown(user=30))
@@ -0,0 +1,58 @@
+# Standard library imports
+import json
+import time
+from typing import Iterator
+
+class FrameRecorder:
+    """Appends raw IRC frames to a JSON lines file for later replay.
+
+    Each line is {"t": seconds since recording started, "shard": n, "frame": "..."}.
+    Writes are buffered, so recording costs one small string write per frame.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Open the recording file for appending.
+
+        Args:
+            path: Path to the recording file
+        """
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._start = time.monotonic()
+        self.frames = 0
+
+    def write(self, frame: str, shard: int = 0) -> None:
+        """Record a frame received from Twitch.
+
+        Args:
+            frame: Raw WebSocket frame (one or more IRC lines)
+            shard: Index of the shard that received it
+        """
+        entry = {"t": round(time.monotonic() - self._start, 6), "shard": shard, "frame": frame}
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.frames += 1
+
+    def close(self) -> None:
+        """Flush and close the file."""
+        if not self._file.closed:
+            self._file.close()
+
+def read_recording(path: str) -> Iterator[tuple[float, str]]:
+    """Read a recording made by FrameRecorder.
+
+    A file may hold several sessions appended one after another. Timestamps
+    restart with each session, so callers should treat a timestamp that goes
+    backwards as "no delay".
+
+    Args:
+        path: Path to the recording file
+
+    Yields:
+        (seconds since the session started, frame) for every recorded frame
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                entry = json.loads(line)
+                yield entry["t"], entry["frame"]
@@ -0,0 +1,238 @@
+# Standard library imports
+import asyncio
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+# Third-party imports
+import websockets
+
+# Local imports
+from log import get_logger
+from metrics import counter, gauge
+
+log = get_logger("relay")
+
+RELAY_COMMANDS = counter("nuitbot_relay_commands_total", "Game commands, by result")
+RELAY_DEPTH = gauge("nuitbot_relay_queue_depth", "Coalesced game commands waiting to be sent")
+
+# Seconds a burst of game commands is collected before it is merged and sent
+RELAY_COALESCE_SECONDS = float(os.getenv("RELAY_COALESCE_SECONDS", "0.5"))
+
+# Merged commands waiting for the game server (oldest are dropped beyond
+# this), and seconds after which a command is too stale to send
+RELAY_QUEUE_SIZE = int(os.getenv("RELAY_QUEUE_SIZE", "32"))
+RELAY_MAX_AGE_SECONDS = float(os.getenv("RELAY_MAX_AGE_SECONDS", "30"))
+
+# Seconds to wait for the game server to answer each command (0 means it
+# does not answer and a completed send counts as delivered)
+RELAY_ACK_SECONDS = float(os.getenv("RELAY_ACK_SECONDS", "0"))
+
+# Game commands and the most a single (merged) command may spawn; commands
+# without a count are sent once per burst however often they were typed
+GAME_COMMANDS = {
+    "creeper": 100,
+    "jack": None,
+    "godsend": None,
+    "chaos": None,
+    "kill": None,
+}
+
+@dataclass
+class GameCommand:
+    """A game command, possibly merged from several chat messages.
+
+    Attributes:
+        name: Command name (without "#")
+        count: Amount to spawn, for commands that take one
+        requested_by: Display name of the first viewer who asked for it
+        requests: Number of chat messages merged into this command
+        created_at: Time (monotonic) of the first request
+    """
+    name: str
+    count: Optional[int]
+    requested_by: str
+    requests: int = 1
+    created_at: float = field(default_factory=time.monotonic)
+
+    def line(self) -> str:
+        """The text sent to the game server."""
+        count = f" {self.count}" if self.count is not None else ""
+        return f"#{self.name}{count} --name {self.requested_by}"
+
+def parse_game_command(text: str, display_name: str) -> Optional[GameCommand]:
+    """Validate a "#" chat message.
+
+    Args:
+        text: Chat message, e.g. "#creeper 5"
+        display_name: Display name of the sender
+
+    Returns:
+        The command, or None if it is not a valid game command
+    """
+    parts = text[1:].split()
+    if not parts:
+        return None
+
+    name = parts[0].lower()
+    if name not in GAME_COMMANDS:
+        return None
+
+    # Names end up on the game server's command line, so keep them to one word
+    requested_by = "".join(display_name.split()) or "viewer"
+    limit = GAME_COMMANDS[name]
+    if limit is None:
+        return GameCommand(name, None, requested_by)
+
+    count = 1
+    if len(parts) > 1:
+        if not parts[1].isdigit() or int(parts[1]) < 1:
+            return None
+        count = min(int(parts[1]), limit)
+    return GameCommand(name, count, requested_by)
+
+class GameRelay:
+    """Forwards "#" commands to the game server without ever blocking chat.
+
+    submit() validates a command and merges it into the pending burst
+    (counts add up to the command's cap, repeats of other commands fold
+    into one). After the coalescing window the burst moves to a bounded
+    outbound queue that is sent whenever the game server is connected;
+    if a send fails the command goes back to the front of the queue and is
+    sent after the reconnect, unless it has gone stale by then.
+    """
+
+    def __init__(
+        self,
+        window: float = RELAY_COALESCE_SECONDS,
+        queue_size: int = RELAY_QUEUE_SIZE,
+        max_age: float = RELAY_MAX_AGE_SECONDS,
+        ack_timeout: float = RELAY_ACK_SECONDS,
+    ) -> None:
+        """Initialize the relay.
+
+        Args:
+            window: Seconds a burst is collected before it is sent
+            queue_size: Maximum number of merged commands waiting to be sent
+            max_age: Seconds after which a waiting command is dropped
+            ack_timeout: Seconds to wait for the game server's answer (0 disables acks)
+        """
+        self._window = window
+        self._max_age = max_age
+        self._ack_timeout = ack_timeout
+
+        self._pending: dict[str, GameCommand] = {}
+        self._pending_ready = asyncio.Event()
+        self._outbound: deque[GameCommand] = deque(maxlen=queue_size)
+
+        self._ws: Optional[websockets.ClientConnection] = None
+        self._connected = asyncio.Event()
+        RELAY_DEPTH.set_function(lambda: len(self._outbound) + len(self._pending))
+
+    @property
+    def depth(self) -> int:
+        """Number of commands waiting to be sent."""
+        return len(self._outbound) + len(self._pending)
+
+    def attach(self, ws: websockets.ClientConnection) -> None:
+        """Send over a new connection to the game server."""
+        self._ws = ws
+        self._connected.set()
+
+    def detach(self) -> None:
+        """Stop sending until the game server is connected again."""
+        self._ws = None
+        self._connected.clear()
+
+    def submit(self, text: str, display_name: str) -> bool:
+        """Validate a "#" chat message and merge it into the pending burst.
+
+        Args:
+            text: Chat message, e.g. "#creeper 5"
+            display_name: Display name of the sender
+
+        Returns:
+            True if the command was accepted, False if it is not a valid game command
+        """
+        command = parse_game_command(text, display_name)
+        if command is None:
+            RELAY_COMMANDS.inc(result="invalid")
+            return False
+
+        pending = self._pending.get(command.name)
+        if pending is None:
+            self._pending[command.name] = command
+            self._pending_ready.set()
+            RELAY_COMMANDS.inc(result="queued")
+            return True
+
+        pending.requests += 1
+        if pending.count is not None:
+            pending.count = min(pending.count + command.count, GAME_COMMANDS[command.name])
+        RELAY_COMMANDS.inc(result="coalesced")
+        return True
+
+    def _flush_pending(self) -> None:
+        """Move the pending burst to the outbound queue."""
+        for command in self._pending.values():
+            if len(self._outbound) == self._outbound.maxlen:
+                RELAY_COMMANDS.inc(result="dropped")
+                log.warning("Relay queue full, dropping #%s", self._outbound[0].name)
+            self._outbound.append(command)
+            if command.requests > 1:
+                log.info("Merged %s requests into %s", command.requests, command.line())
+        self._pending.clear()
+        self._pending_ready.clear()
+
+    async def _send(self, command: GameCommand) -> bool:
+        """Send one command. Returns False if the connection failed and it should be retried."""
+        ws = self._ws
+        try:
+            await ws.send(command.line())
+            if self._ack_timeout:
+                try:
+                    reply = await asyncio.wait_for(ws.recv(), self._ack_timeout)
+                    RELAY_COMMANDS.inc(result="acked")
+                    log.debug("Game server answered %s: %s", command.line(), reply)
+                except asyncio.TimeoutError:
+                    # It may still have run, so don't send it twice
+                    RELAY_COMMANDS.inc(result="unacked")
+                    log.warning("No answer from the game server to %s", command.line())
+        except websockets.exceptions.ConnectionClosed as e:
+            log.warning("Game server connection lost while sending %s: %s", command.line(), e)
+            if self._ws is ws:
+                self._ws = None
+                self._connected.clear()
+            return False
+
+        RELAY_COMMANDS.inc(result="sent")
+        log.info("Local WS: %s", command.line())
+        return True
+
+    async def _drain(self) -> None:
+        """Send the outbound queue in order, waiting for a connection when there is none."""
+        while self._outbound:
+            command = self._outbound[0]
+            if time.monotonic() - command.created_at > self._max_age:
+                self._outbound.popleft()
+                RELAY_COMMANDS.inc(result="stale")
+                log.warning("Dropping stale %s", command.line())
+                continue
+
+            if self._ws is None:
+                await self._connected.wait()
+                continue
+
+            if await self._send(command):
+                self._outbound.popleft()
+
+    async def run(self) -> None:
+        """Collect bursts and send them until cancelled."""
+        while True:
+            await self._pending_ready.wait()
+            # Let the rest of the burst arrive so it is sent as one command
+            await asyncio.sleep(self._window)
+            self._flush_pending()
+            await self._drain()
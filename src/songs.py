@@ -0,0 +1,308 @@
+# Standard library imports
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Iterator, Optional
+from urllib.parse import parse_qs, urlparse
+
+# Local imports
+from log import get_logger
+from metrics import counter
+
+log = get_logger("songs")
+
+SONG_REQUESTS = counter("nuitbot_song_requests_total", "Song requests, by result")
+
+# Directory holding one song queue journal per channel
+SONG_QUEUE_DIR = os.getenv("SONG_QUEUE_DIR", os.path.join(os.path.dirname(__file__), "..", "songs"))
+
+# Songs a viewer may have queued at once (moderators are exempt), and the queue size
+SONG_USER_LIMIT = int(os.getenv("SONG_USER_LIMIT", "3"))
+SONG_QUEUE_SIZE = int(os.getenv("SONG_QUEUE_SIZE", "100"))
+
+# YouTube video IDs and Spotify track IDs
+_YOUTUBE_ID = re.compile(r"^[A-Za-z0-9_-]{11}$")
+_SPOTIFY_ID = re.compile(r"^[A-Za-z0-9]{22}$")
+
+class SongRequestError(Exception):
+    """Raised when a song request is refused. The message is meant for chat."""
+
+    def __init__(self, reason: str, message: str) -> None:
+        super().__init__(message)
+        self.reason = reason
+
+def normalize_track(query: str) -> str:
+    """Turn a link or search text into a track key, so the same song always matches.
+
+    YouTube and Spotify links (in any of their URL forms) become
+    "youtube:<id>" or "spotify:<id>"; anything else is treated as a
+    search and becomes "search:<lowercased text>".
+
+    Args:
+        query: Text after "!sr"
+
+    Returns:
+        The track key
+
+    Raises:
+        SongRequestError: If the query is empty or a link without a track ID
+    """
+    query = query.strip()
+    if not query:
+        raise SongRequestError("invalid", "Usage: !sr <YouTube/Spotify link or song name>")
+
+    if query.startswith("spotify:track:"):
+        track_id = query.rsplit(":", 1)[1]
+        if _SPOTIFY_ID.match(track_id):
+            return f"spotify:{track_id}"
+
+    if "://" in query or query.startswith(("www.", "youtu.be/", "youtube.com/", "open.spotify.com/")):
+        url = urlparse(query if "://" in query else f"https://{query}")
+        host = url.netloc.lower().removeprefix("www.").removeprefix("m.").removeprefix("music.")
+        parts = [part for part in url.path.split("/") if part]
+
+        track_id = ""
+        if host == "youtu.be" and parts:
+            track_id = parts[0]
+        elif host == "youtube.com":
+            if parts[:1] == ["watch"]:
+                track_id = parse_qs(url.query).get("v", [""])[0]
+            elif len(parts) >= 2 and parts[0] in ("shorts", "embed", "live", "v"):
+                track_id = parts[1]
+        elif host == "open.spotify.com":
+            # Localized links look like /intl-de/track/<id>
+            if "track" in parts[:-1]:
+                track_id = parts[parts.index("track") + 1]
+            if _SPOTIFY_ID.match(track_id):
+                return f"spotify:{track_id}"
+            raise SongRequestError("invalid", "That Spotify link is not a track.")
+
+        if _YOUTUBE_ID.match(track_id):
+            return f"youtube:{track_id}"
+        if host in ("youtu.be", "youtube.com"):
+            raise SongRequestError("invalid", "That YouTube link is not a video.")
+        raise SongRequestError("invalid", "Only YouTube and Spotify links are supported.")
+
+    return "search:" + " ".join(query.lower().split())
+
+@dataclass
+class SongRequest:
+    """A queued song.
+
+    Attributes:
+        id: Request number, unique per channel
+        track: Normalized track key (see normalize_track)
+        query: What the viewer typed
+        user: Login name of the viewer
+        requested_at: Unix time of the request
+    """
+    id: int
+    track: str
+    query: str
+    user: str
+    requested_at: float
+
+class SongQueue:
+    """Ordered song queue of one channel, journaled to an append-only file.
+
+    Requests are kept in insertion order in an OrderedDict keyed by ID, with
+    a dict from track key to ID for duplicate checks and per-user counts
+    for quotas, so adding, skipping and removing are all O(1). Every change
+    is appended to the journal; loading replays it and compacts it when it
+    has grown much longer than the queue.
+    """
+
+    def __init__(self, path: str, user_limit: int = SONG_USER_LIMIT, max_size: int = SONG_QUEUE_SIZE) -> None:
+        """Initialize an empty queue. Call load() to restore the journal.
+
+        Args:
+            path: Path of the journal file
+            user_limit: Songs a viewer may have queued at once
+            max_size: Maximum number of queued songs
+        """
+        self.path = path
+        self._user_limit = user_limit
+        self._max_size = max_size
+
+        self._queue: OrderedDict[int, SongRequest] = OrderedDict()
+        self._by_track: dict[str, int] = {}
+        self._per_user: dict[str, int] = {}
+        self._next_id = 1
+
+        self._journal = None
+        self._journal_lines = 0
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def _insert(self, song: SongRequest) -> None:
+        """Add a song to the queue and its indexes."""
+        self._queue[song.id] = song
+        self._by_track[song.track] = song.id
+        self._per_user[song.user] = self._per_user.get(song.user, 0) + 1
+        self._next_id = max(self._next_id, song.id + 1)
+
+    def _delete(self, request_id: int) -> Optional[SongRequest]:
+        """Remove a song from the queue and its indexes."""
+        song = self._queue.pop(request_id, None)
+        if song is None:
+            return None
+
+        del self._by_track[song.track]
+        count = self._per_user[song.user] - 1
+        if count:
+            self._per_user[song.user] = count
+        else:
+            del self._per_user[song.user]
+        return song
+
+    def _append(self, entry: dict) -> None:
+        """Append an entry to the journal, compacting it when it has grown too long."""
+        if self._journal is None:
+            return
+
+        self._journal.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._journal.flush()
+        self._journal_lines += 1
+        if self._journal_lines > 2 * len(self._queue) + 100:
+            self._compact()
+
+    def _compact(self) -> None:
+        """Rewrite the journal as one "add" entry per queued song, replacing it atomically."""
+        if self._journal is not None:
+            self._journal.close()
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for song in self._queue.values():
+                f.write(json.dumps({"op": "add", **asdict(song)}, separators=(",", ":")) + "\n")
+        os.replace(tmp_path, self.path)
+
+        self._journal = open(self.path, "a", encoding="utf-8")
+        self._journal_lines = len(self._queue)
+
+    def _replay(self) -> int:
+        """Apply the journal to the queue. Returns the number of journal lines."""
+        lines = 0
+        if not os.path.exists(self.path):
+            return lines
+
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                lines += 1
+                try:
+                    entry = json.loads(line)
+                    if entry.pop("op") == "add":
+                        self._insert(SongRequest(**entry))
+                    else:
+                        self._delete(entry["id"])
+                except (ValueError, KeyError, TypeError):
+                    # A crash can leave a half-written last line
+                    log.warning("Skipping bad line %s in %s", lines, self.path)
+        return lines
+
+    def load(self) -> None:
+        """Replay the journal (if any) and open it for appending."""
+        lines = self._replay()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._journal = open(self.path, "a", encoding="utf-8")
+        self._journal_lines = lines
+        if lines > 2 * len(self._queue) + 100:
+            self._compact()
+
+    def close(self) -> None:
+        """Close the journal."""
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def add(self, query: str, user: str, exempt: bool = False) -> SongRequest:
+        """Queue a song.
+
+        Args:
+            query: Link or search text
+            user: Login name of the viewer
+            exempt: Skip the per-user limit (for moderators)
+
+        Returns:
+            The queued request
+
+        Raises:
+            SongRequestError: If the song is invalid, already queued, or a limit is reached
+        """
+        try:
+            track = normalize_track(query)
+            if track in self._by_track:
+                raise SongRequestError("duplicate", "That song is already in the queue.")
+            if len(self._queue) >= self._max_size:
+                raise SongRequestError("full", "The song queue is full.")
+            if not exempt and self._per_user.get(user, 0) >= self._user_limit:
+                raise SongRequestError("quota", f"You already have {self._user_limit} songs in the queue.")
+        except SongRequestError as e:
+            SONG_REQUESTS.inc(result=e.reason)
+            raise
+
+        song = SongRequest(self._next_id, track, query.strip(), user, time.time())
+        self._insert(song)
+        self._append({"op": "add", **asdict(song)})
+        SONG_REQUESTS.inc(result="queued")
+        return song
+
+    def remove(self, request_id: int) -> Optional[SongRequest]:
+        """Remove a song by request ID.
+
+        Returns:
+            The removed request, or None if it was not queued
+        """
+        song = self._delete(request_id)
+        if song is not None:
+            self._append({"op": "remove", "id": request_id})
+        return song
+
+    def skip(self) -> Optional[SongRequest]:
+        """Remove the song at the front of the queue.
+
+        Returns:
+            The skipped request, or None if the queue is empty
+        """
+        current = self.current
+        return self.remove(current.id) if current else None
+
+    def get(self, request_id: int) -> Optional[SongRequest]:
+        """Look up a queued song by request ID."""
+        return self._queue.get(request_id)
+
+    @property
+    def current(self) -> Optional[SongRequest]:
+        """The song at the front of the queue, or None."""
+        return next(iter(self._queue.values()), None)
+
+    def upcoming(self, limit: int = 5) -> list[SongRequest]:
+        """The first songs in the queue, in order."""
+        songs = []
+        for song in self._queue.values():
+            if len(songs) >= limit:
+                break
+            songs.append(song)
+        return songs
+
+    def snapshot(self) -> list[dict]:
+        """The whole queue as JSON-ready dicts (for the overlay)."""
+        return [asdict(song) for song in list(self._queue.values())]
+
+    def __iter__(self) -> Iterator[SongRequest]:
+        return iter(list(self._queue.values()))
+
+def journal_path(channel: str, directory: str = SONG_QUEUE_DIR) -> str:
+    """Path of a channel's song queue journal."""
+    return os.path.join(directory, f"{channel.lower()}.jsonl")
+
+def read_queue(channel: str, directory: str = SONG_QUEUE_DIR) -> list[dict]:
+    """Replay a channel's journal read-only, e.g. from a process that does not own the queue."""
+    queue = SongQueue(journal_path(channel, directory))
+    queue._replay()
+    return queue.snapshot()
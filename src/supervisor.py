@@ -0,0 +1,227 @@
+# Standard library imports
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+# Local imports
+from log import get_logger
+from metrics import counter, gauge
+
+log = get_logger("health")
+
+RECONNECTS = counter("nuitbot_reconnects_total", "Reconnect attempts, by connection")
+CONNECTION_UP = gauge("nuitbot_connection_up", "Whether a connection is up (1) or down (0), by connection")
+CIRCUIT_OPEN = gauge("nuitbot_circuit_open", "Whether a connection's circuit breaker is open (1), by connection")
+
+# Circuit breaker states: closed retries with backoff, open pauses retries,
+# half-open allows a single trial connection
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# A session is called with a callback it must call once the connection is
+# usable (e.g. logged in, not just opened), and returns (or raises) when the
+# connection ends. Backoff and the circuit breaker only reset on that call
+Session = Callable[[Callable[[], None]], Awaitable[None]]
+
+@dataclass
+class ConnectionStatus:
+    """Snapshot of a supervised connection, for the status view.
+
+    Attributes:
+        name: Connection name
+        connected: Whether the connection is up
+        circuit: Circuit breaker state (closed, open or half_open)
+        failures: Failed attempts since the connection was last up
+        last_error: Why the last attempt failed (empty if it did not)
+        changed_at: Unix time the connection last went up or down
+        retry_at: Unix time of the next attempt, if one is scheduled
+    """
+    name: str
+    connected: bool
+    circuit: str
+    failures: int
+    last_error: str
+    changed_at: float
+    retry_at: Optional[float]
+
+class Supervisor:
+    """Keeps one connection alive in its own task.
+
+    Failed attempts are retried with jittered exponential backoff. After
+    too many failures in a row the circuit opens and retries pause for a
+    while; then a single trial attempt either closes the circuit again or
+    reopens it. Health callbacks are told whenever the connection goes up
+    or down, so a dead integration only switches off its own feature.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        session: Session,
+        stop: asyncio.Event,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        failure_threshold: int = 5,
+        open_seconds: float = 60.0,
+    ) -> None:
+        """Initialize the supervisor.
+
+        Args:
+            name: Connection name, used in logs, metrics and the status view
+            session: Coroutine function that connects, calls its callback once
+                the connection is usable and returns when the connection ends
+            stop: Event that ends supervision once set
+            base_delay: Backoff after the first failure, in seconds
+            max_delay: Longest backoff, in seconds
+            failure_threshold: Failures in a row that open the circuit
+            open_seconds: How long an open circuit pauses retries
+        """
+        self.name = name
+        self._session = session
+        self._stop = stop
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._failure_threshold = failure_threshold
+        self._open_seconds = open_seconds
+
+        self.connected = False
+        self.circuit = CLOSED
+        self.failures = 0
+        self.last_error = ""
+        self.changed_at = time.time()
+        self.retry_at: Optional[float] = None
+        self._callbacks: list[Callable[["Supervisor"], None]] = []
+
+        label = name.lower().replace(" ", "_")
+        self._label = label
+        CONNECTION_UP.set_function(lambda: float(self.connected), connection=label)
+        CIRCUIT_OPEN.set_function(lambda: float(self.circuit == OPEN), connection=label)
+
+    def on_change(self, callback: Callable[["Supervisor"], None]) -> None:
+        """Call a function whenever the connection goes up or down."""
+        self._callbacks.append(callback)
+
+    @property
+    def status(self) -> ConnectionStatus:
+        """The current state, for the status view."""
+        return ConnectionStatus(
+            self.name, self.connected, self.circuit, self.failures, self.last_error, self.changed_at, self.retry_at,
+        )
+
+    def _set_connected(self, connected: bool) -> None:
+        """Record a state change and tell the health callbacks."""
+        if connected == self.connected:
+            return
+
+        self.connected = connected
+        self.changed_at = time.time()
+        for callback in self._callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                log.exception("%s health callback failed: %s", self.name, e)
+
+    def _up(self) -> None:
+        """Passed to the session, which calls it once the connection is usable."""
+        self.failures = 0
+        self.last_error = ""
+        if self.circuit != CLOSED:
+            log.info("%s recovered, closing circuit", self.name)
+        self.circuit = CLOSED
+        self._set_connected(True)
+
+    def _backoff(self) -> float:
+        """Delay before the next attempt: exponential, with half of it random."""
+        delay = min(self._max_delay, self._base_delay * 2 ** (self.failures - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def _sleep(self, seconds: float) -> bool:
+        """Sleep unless stopped first. Returns True if supervision should end."""
+        self.retry_at = time.time() + seconds
+        try:
+            await asyncio.wait_for(self._stop.wait(), seconds)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.retry_at = None
+
+    async def run(self) -> None:
+        """Run sessions until the stop event is set."""
+        attempts = 0
+        while not self._stop.is_set():
+            if attempts:
+                RECONNECTS.inc(connection=self._label)
+            attempts += 1
+
+            was_up = False
+            try:
+                await self._session(self._up)
+                was_up = self.connected
+                if not was_up:
+                    raise ConnectionError("session ended before it connected")
+            except asyncio.CancelledError:
+                self._set_connected(False)
+                raise
+            except Exception as e:
+                was_up = was_up or self.connected
+                self.last_error = str(e) or type(e).__name__
+            self._set_connected(False)
+
+            if self._stop.is_set():
+                break
+
+            if was_up:
+                # It worked until now: reconnect soon, spread out so shards don't reconnect in lockstep
+                log.warning("%s connection lost%s. Reconnecting...", self.name, f" ({self.last_error})" if self.last_error else "")
+                if await self._sleep(random.uniform(0, self._base_delay)):
+                    break
+                continue
+
+            self.failures += 1
+            if self.circuit == HALF_OPEN or self.failures >= self._failure_threshold:
+                self.circuit = OPEN
+                log.error("%s failed %s times in a row (%s). Pausing retries for %.0fs", self.name, self.failures, self.last_error, self._open_seconds)
+                if await self._sleep(self._open_seconds):
+                    break
+                self.circuit = HALF_OPEN
+                continue
+
+            delay = self._backoff()
+            log.warning("%s unavailable (%s). Retrying in %.1fs (attempt %s)", self.name, self.last_error, delay, self.failures)
+            if await self._sleep(delay):
+                break
+
+class SupervisorGroup:
+    """The supervisors of one bot, and the shared status view over them."""
+
+    def __init__(self, stop: asyncio.Event) -> None:
+        """Initialize an empty group.
+
+        Args:
+            stop: Event that ends supervision once set
+        """
+        self._stop = stop
+        self._supervisors: dict[str, Supervisor] = {}
+
+    def add(self, name: str, session: Session, **options) -> Supervisor:
+        """Create a supervisor for a connection.
+
+        Args:
+            name: Connection name
+            session: See Supervisor
+            options: Backoff and circuit breaker settings (see Supervisor)
+        """
+        supervisor = self._supervisors[name] = Supervisor(name, session, self._stop, **options)
+        return supervisor
+
+    def get(self, name: str) -> Optional[Supervisor]:
+        """Look up a supervisor by connection name."""
+        return self._supervisors.get(name)
+
+    def status(self) -> list[ConnectionStatus]:
+        """The state of every connection. Safe to call from any thread."""
+        return [supervisor.status for supervisor in list(self._supervisors.values())]
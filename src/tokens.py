@@ -0,0 +1,280 @@
+# Standard library imports
+import asyncio
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+from urllib.parse import urlencode
+
+# Third-party imports
+from cryptography.fernet import Fernet, InvalidToken
+
+# Local imports
+from log import get_logger
+from metrics import counter
+
+log = get_logger("tokens")
+
+TOKEN_REFRESHES = counter("nuitbot_token_refreshes_total", "OAuth token refreshes, by result")
+
+# Twitch OAuth server; point it at a local stub for tests
+TWITCH_ID_URL = os.getenv("TWITCH_ID_URL", "https://id.twitch.tv").rstrip("/")
+
+# Twitch application credentials, and where Twitch sends the browser back
+# to after the user authorized the bot
+TWITCH_CLIENT_ID = os.getenv("TWITCH_CLIENT_ID", "")
+TWITCH_CLIENT_SECRET = os.getenv("TWITCH_CLIENT_SECRET", "")
+TWITCH_REDIRECT_URI = os.getenv("TWITCH_REDIRECT_URI", "")
+
+# Permissions the bot asks for when the user authorizes it
+SCOPES = ["chat:read", "chat:edit", "moderator:read:followers", "moderator:read:chatters", "moderator:manage:chat_messages"]
+
+# Encrypted token file. The key comes from TOKEN_KEY (a Fernet key) or, if
+# that is not set, from a key file created next to the token file
+TOKEN_FILE = os.getenv("TOKEN_FILE", os.path.join(os.path.dirname(__file__), "..", ".tokens"))
+TOKEN_KEY = os.getenv("TOKEN_KEY", "")
+
+# Refresh the access token this many seconds before it expires
+TOKEN_REFRESH_MARGIN = float(os.getenv("TOKEN_REFRESH_MARGIN", "600"))
+
+class TokenError(Exception):
+    """Raised when Twitch rejects a token request."""
+
+@dataclass
+class Tokens:
+    """OAuth tokens for the bot account.
+
+    Attributes:
+        access_token: Token used to log in to chat and call the API
+        refresh_token: Token used to get a new access token
+        expires_at: Unix time the access token expires (0 if unknown)
+        scopes: Scopes granted to the token
+    """
+    access_token: str
+    refresh_token: str
+    expires_at: float = 0.0
+    scopes: list[str] = field(default_factory=list)
+
+    def expires_within(self, seconds: float) -> bool:
+        """Check if the access token expires within the given number of seconds."""
+        return bool(self.expires_at) and time.time() + seconds >= self.expires_at
+
+def authorize_url(client_id: str, redirect_uri: str, scopes: list[str]) -> str:
+    """Build the URL where the user authorizes the bot.
+
+    Args:
+        client_id: Twitch application client ID
+        redirect_uri: OAuth redirect URI
+        scopes: List of permission scopes to request
+    """
+    params = urlencode({
+        "client_id": client_id,
+        "redirect_uri": redirect_uri,
+        "response_type": "code",
+        "scope": " ".join(scopes),
+    })
+    return f"{TWITCH_ID_URL}/oauth2/authorize?{params}"
+
+def _request_tokens(payload: dict[str, str], previous: Optional[Tokens] = None) -> Tokens:
+    """POST to the token endpoint and parse the response."""
+    # Only needed when tokens change, so starting with cached tokens skips it
+    import requests
+
+    try:
+        response = requests.post(f"{TWITCH_ID_URL}/oauth2/token", data=payload, timeout=10)
+        data = response.json()
+    except (requests.RequestException, ValueError) as e:
+        raise TokenError(f"Token request failed: {e}") from e
+    if response.status_code != 200 or "access_token" not in data:
+        raise TokenError(f"Token request failed ({response.status_code}): {data.get('message', data)}")
+
+    expires_in = data.get("expires_in")
+    return Tokens(
+        data["access_token"],
+        # Twitch may omit the refresh token on refresh; keep the old one then
+        data.get("refresh_token") or (previous.refresh_token if previous else ""),
+        time.time() + expires_in if expires_in else 0.0,
+        data.get("scope") or (previous.scopes if previous else []),
+    )
+
+def exchange_code(client_id: str, client_secret: str, code: str, redirect_uri: str) -> Tokens:
+    """Exchange an authorization code for tokens.
+
+    Args:
+        client_id: Twitch application client ID
+        client_secret: Twitch application client secret
+        code: Authorization code from the redirect
+        redirect_uri: OAuth redirect URI
+
+    Raises:
+        TokenError: If Twitch rejected the code or could not be reached
+    """
+    return _request_tokens({
+        "client_id": client_id,
+        "client_secret": client_secret,
+        "code": code,
+        "grant_type": "authorization_code",
+        "redirect_uri": redirect_uri,
+    })
+
+def refresh_tokens(client_id: str, client_secret: str, tokens: Tokens) -> Tokens:
+    """Get a new access token with the refresh token.
+
+    Args:
+        client_id: Twitch application client ID
+        client_secret: Twitch application client secret
+        tokens: Current tokens
+
+    Raises:
+        TokenError: If Twitch rejected the refresh token or could not be reached
+    """
+    return _request_tokens({
+        "client_id": client_id,
+        "client_secret": client_secret,
+        "grant_type": "refresh_token",
+        "refresh_token": tokens.refresh_token,
+    }, tokens)
+
+class TokenStore:
+    """Tokens encrypted at rest in a single file."""
+
+    def __init__(self, path: str = TOKEN_FILE, key: str = TOKEN_KEY) -> None:
+        """Initialize the store.
+
+        Args:
+            path: Path of the encrypted token file
+            key: Fernet key; if empty, a key file at "<path>.key" is used (and created)
+        """
+        self.path = path
+        self._fernet = Fernet(key.encode() if key else self._load_key(f"{path}.key"))
+
+    @staticmethod
+    def _load_key(path: str) -> bytes:
+        """Read the key file, creating it (readable by the owner only) if needed."""
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                return f.read().strip()
+
+        key = Fernet.generate_key()
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(key)
+        return key
+
+    def load(self) -> Optional[Tokens]:
+        """Read the stored tokens.
+
+        Returns:
+            The tokens, or None if there are none or they cannot be decrypted
+        """
+        if not os.path.exists(self.path):
+            return None
+
+        try:
+            with open(self.path, "rb") as f:
+                data = json.loads(self._fernet.decrypt(f.read()))
+            return Tokens(**data)
+        except (InvalidToken, ValueError, TypeError) as e:
+            log.warning("Ignoring unreadable token file %s: %s", self.path, e or type(e).__name__)
+            return None
+
+    def save(self, tokens: Tokens) -> None:
+        """Encrypt and write the tokens, replacing the file atomically."""
+        data = self._fernet.encrypt(json.dumps(asdict(tokens)).encode())
+        tmp_path = f"{self.path}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+class TokenManager:
+    """Keeps the bot's tokens persisted and fresh.
+
+    Refreshes are serialized, so a proactive refresh and a refresh after an
+    authentication failure never race each other.
+    """
+
+    def __init__(self, client_id: str, client_secret: str, store: TokenStore) -> None:
+        """Initialize the manager.
+
+        Args:
+            client_id: Twitch application client ID
+            client_secret: Twitch application client secret
+            store: Where the tokens are persisted
+        """
+        self._client_id = client_id
+        self._client_secret = client_secret
+        self.store = store
+        self.tokens: Optional[Tokens] = None
+        self._lock = threading.Lock()
+
+    def set(self, tokens: Tokens) -> None:
+        """Use and persist new tokens."""
+        self.tokens = tokens
+        self.store.save(tokens)
+
+    def load_cached(self, margin: float = TOKEN_REFRESH_MARGIN) -> Optional[Tokens]:
+        """Load stored tokens, refreshing them if they are about to expire.
+
+        Args:
+            margin: Refresh if the access token expires within this many seconds
+
+        Returns:
+            Usable tokens, or None if the user has to authorize again
+        """
+        tokens = self.store.load()
+        if tokens is None:
+            return None
+
+        self.tokens = tokens
+        if not tokens.expires_within(margin):
+            return tokens
+
+        try:
+            return self.refresh()
+        except TokenError as e:
+            log.warning("Cached tokens could not be refreshed: %s", e)
+            return None
+
+    def refresh(self, failed_access_token: str = "") -> Tokens:
+        """Refresh the access token and persist the result.
+
+        Args:
+            failed_access_token: Access token that was just rejected. If the
+                store already holds a different one (another process refreshed
+                it), that one is used instead of refreshing again.
+
+        Raises:
+            TokenError: If Twitch rejected the refresh token
+        """
+        with self._lock:
+            stored = self.store.load()
+            if failed_access_token and stored and stored.access_token != failed_access_token:
+                self.tokens = stored
+                return stored
+
+            current = stored or self.tokens
+            if current is None or not current.refresh_token:
+                raise TokenError("No refresh token available")
+
+            try:
+                tokens = refresh_tokens(self._client_id, self._client_secret, current)
+            except Exception:
+                TOKEN_REFRESHES.inc(result="error")
+                raise
+            TOKEN_REFRESHES.inc(result="ok")
+            self.set(tokens)
+            log.info("Access token refreshed")
+            return tokens
+
+    async def refresh_async(self, failed_access_token: str = "") -> Tokens:
+        """refresh() on a worker thread, so the event loop keeps running."""
+        return await asyncio.to_thread(self.refresh, failed_access_token)
+
+    def seconds_until_refresh(self, margin: float = TOKEN_REFRESH_MARGIN) -> Optional[float]:
+        """Seconds until the access token should be refreshed, or None if its expiry is unknown."""
+        if self.tokens is None or not self.tokens.expires_at:
+            return None
+        return max(0.0, self.tokens.expires_at - margin - time.time())
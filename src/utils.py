@@ -13,4 +13,18 @@ def red(text): return f"{RED}{text}{RESET}"
 def blue(text): return f"{BLUE}{text}{RESET}"
 def cyan(text): return f"{CYAN}{text}{RESET}"
 def yellow(text): return f"{YELLOW}{text}{RESET}"
-def magenta(text): return f"{MAGENTA}{text}{RESET}"
\ No newline at end of file
+def magenta(text): return f"{MAGENTA}{text}{RESET}"
+
+def format_duration(seconds: float) -> str:
+    """Format a duration for chat, e.g. "1 year, 2 months, 3 days".
+
+    Shows at most the three largest non-zero units.
+    """
+    units = [("year", 365 * 86400), ("month", 30 * 86400), ("day", 86400), ("hour", 3600), ("minute", 60), ("second", 1)]
+    parts = []
+    remaining = int(seconds)
+    for name, size in units:
+        count, remaining = divmod(remaining, size)
+        if count:
+            parts.append(f"{count} {name}{'s' if count != 1 else ''}")
+    return ", ".join(parts[:3]) or "0 seconds"
@@ -0,0 +1,283 @@
+# Standard library imports
+import asyncio
+import os
+import sqlite3
+import time
+from typing import Iterable, Optional
+
+# Local imports
+from log import get_logger
+from metrics import counter, gauge, histogram
+
+log = get_logger("watch")
+
+VIEWERS = gauge("nuitbot_watchtime_viewers", "Viewers currently present, by channel")
+FLUSH_SECONDS = histogram("nuitbot_watchtime_flush_seconds", "Time spent writing one watch time batch to the database")
+FLUSHED_ROWS = counter("nuitbot_watchtime_rows_total", "Watch time rows written to the database")
+
+# SQLite database holding the watch time totals
+WATCHTIME_DB = os.getenv("WATCHTIME_DB", os.path.join(os.path.dirname(__file__), "..", "watchtime.db"))
+
+# Seconds between batched writes to the database
+WATCHTIME_FLUSH_SECONDS = float(os.getenv("WATCHTIME_FLUSH_SECONDS", "60"))
+
+# A viewer only seen chatting (no JOIN, not in a chatter snapshot) counts as
+# gone after this many seconds of silence
+WATCHTIME_IDLE_SECONDS = float(os.getenv("WATCHTIME_IDLE_SECONDS", "1800"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS watchtime (
+    channel TEXT NOT NULL,
+    login TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (channel, login)
+)
+"""
+
+_UPSERT = """
+INSERT INTO watchtime (channel, login, seconds, updated_at) VALUES (?, ?, ?, ?)
+ON CONFLICT (channel, login) DO UPDATE SET seconds = excluded.seconds, updated_at = excluded.updated_at
+"""
+
+class _Session:
+    """A viewer's current visit to a channel.
+
+    Attributes:
+        since: Time (monotonic) up to which the visit has been credited
+        last_seen: Time (monotonic) the viewer was last known to be present
+        joined: Whether Twitch reported the viewer as joined (JOIN, NAMES or snapshot)
+    """
+    __slots__ = ("since", "last_seen", "joined")
+
+    def __init__(self, now: float, joined: bool) -> None:
+        self.since = now
+        self.last_seen = now
+        self.joined = joined
+
+class WatchtimeTracker:
+    """Accumulates per-viewer watch time in memory and persists it in batches.
+
+    Presence comes from JOIN/PART, chat activity and periodic chatter
+    snapshots. Events only touch the in-memory tables; open sessions are
+    credited and the changed totals written in one transaction every
+    flush interval, so the database sees one write per viewer per flush
+    no matter how busy the channel is.
+    """
+
+    def __init__(
+        self,
+        path: str = WATCHTIME_DB,
+        flush_interval: float = WATCHTIME_FLUSH_SECONDS,
+        idle_timeout: float = WATCHTIME_IDLE_SECONDS,
+        ignore: Iterable[str] = (),
+    ) -> None:
+        """Initialize the tracker.
+
+        Args:
+            path: Path of the SQLite database
+            flush_interval: Seconds between batched writes
+            idle_timeout: Seconds after which a chat-only viewer counts as gone
+            ignore: Logins that are never tracked (e.g. the bot itself)
+        """
+        self.path = path
+        self._flush_interval = flush_interval
+        self._idle_timeout = idle_timeout
+        self._ignore = {login.lower() for login in ignore}
+
+        # Credited seconds by channel and login, including what is not written yet
+        self._totals: dict[str, dict[str, float]] = {}
+        # Open sessions by channel and login
+        self._sessions: dict[str, dict[str, _Session]] = {}
+        # Logins whose total changed since the last write, by channel
+        self._dirty: dict[str, set[str]] = {}
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._flush_lock = asyncio.Lock()
+
+    def _channel(self, channel: str) -> dict[str, _Session]:
+        """Get the session table of a channel, creating empty tables on first use."""
+        sessions = self._sessions.get(channel)
+        if sessions is None:
+            sessions = self._sessions[channel] = {}
+            self._totals.setdefault(channel, {})
+            self._dirty.setdefault(channel, set())
+            VIEWERS.set_function(lambda: len(sessions), channel=channel)
+        return sessions
+
+    def _open_db(self, channels: list[str]) -> dict[str, dict[str, float]]:
+        """Open the database and read the stored totals (runs on a worker thread)."""
+        db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        # Worker processes share the file, each writing its own channels
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(_SCHEMA)
+        db.commit()
+        self._db = db
+
+        return {
+            channel: dict(db.execute("SELECT login, seconds FROM watchtime WHERE channel = ?", (channel,)))
+            for channel in channels
+        }
+
+    async def open(self, channels: list[str]) -> None:
+        """Open the database and load the stored totals of the given channels.
+
+        Args:
+            channels: Channels to track (without "#" prefix)
+        """
+        stored = await asyncio.to_thread(self._open_db, channels)
+        for channel, totals in stored.items():
+            self._channel(channel)
+            self._totals[channel].update(totals)
+        log.info("Loaded watch time of %s viewers from %s", sum(len(totals) for totals in stored.values()), self.path)
+
+    def _credit(self, channel: str, login: str, session: _Session, until: float) -> None:
+        """Add the uncredited part of a session to the viewer's total."""
+        if until > session.since:
+            totals = self._totals[channel]
+            totals[login] = totals.get(login, 0.0) + (until - session.since)
+            self._dirty[channel].add(login)
+        session.since = until
+
+    def join(self, channel: str, login: str, now: Optional[float] = None) -> None:
+        """Record that a viewer joined a channel."""
+        self._present(channel, login, True, time.monotonic() if now is None else now)
+
+    def seen(self, channel: str, login: str, now: Optional[float] = None) -> None:
+        """Record chat activity, which also proves presence."""
+        self._present(channel, login, False, time.monotonic() if now is None else now)
+
+    def _present(self, channel: str, login: str, joined: bool, now: float) -> None:
+        """Open a session for a viewer, or refresh the one that is open."""
+        if login in self._ignore:
+            return
+
+        sessions = self._channel(channel)
+        session = sessions.get(login)
+        if session is None:
+            sessions[login] = _Session(now, joined)
+        else:
+            session.last_seen = now
+            session.joined = session.joined or joined
+
+    def part(self, channel: str, login: str, now: Optional[float] = None) -> None:
+        """Record that a viewer left a channel, crediting their session."""
+        sessions = self._sessions.get(channel)
+        session = sessions.pop(login, None) if sessions else None
+        if session is not None:
+            self._credit(channel, login, session, time.monotonic() if now is None else now)
+
+    def snapshot(self, channel: str, logins: Iterable[str], now: Optional[float] = None) -> None:
+        """Replace a channel's presence with a full chatter list.
+
+        Viewers missing from the list are credited and their sessions
+        closed; everyone on it is present from now on.
+
+        Args:
+            channel: Channel the list belongs to
+            logins: Logins of everyone currently in chat
+            now: Time (monotonic) of the snapshot
+        """
+        now = time.monotonic() if now is None else now
+        present = {login.lower() for login in logins}
+        sessions = self._channel(channel)
+
+        for login in [login for login in sessions if login not in present]:
+            self._credit(channel, login, sessions.pop(login), now)
+        for login in present:
+            self._present(channel, login, True, now)
+
+    def seconds(self, channel: str, login: str, now: Optional[float] = None) -> float:
+        """Get a viewer's total watch time in a channel, including the open session.
+
+        Args:
+            channel: Channel name (without "#" prefix)
+            login: Viewer login name
+
+        Returns:
+            Watch time in seconds
+        """
+        total = self._totals.get(channel, {}).get(login, 0.0)
+        sessions = self._sessions.get(channel)
+        session = sessions.get(login) if sessions else None
+        if session is not None:
+            total += (time.monotonic() if now is None else now) - session.since
+        return total
+
+    def present(self, channel: str) -> int:
+        """Number of viewers currently present in a channel."""
+        return len(self._sessions.get(channel, ()))
+
+    def _accrue(self, now: float) -> list[tuple[str, str, float, float]]:
+        """Credit every open session up to now and collect the changed rows."""
+        wall_time = time.time()
+        rows = []
+        idle_before = now - self._idle_timeout
+        for channel, sessions in self._sessions.items():
+            dirty = self._dirty[channel]
+            totals = self._totals[channel]
+            expired = []
+            # This runs over every lurker on the event loop, so _credit() is inlined
+            for login, session in sessions.items():
+                until = now
+                if not session.joined and session.last_seen < idle_before:
+                    # Only ever seen chatting and silent for too long: count them until they last spoke
+                    until = session.last_seen
+                    expired.append(login)
+                if until > session.since:
+                    totals[login] = totals.get(login, 0.0) + (until - session.since)
+                    dirty.add(login)
+                    session.since = until
+            for login in expired:
+                del sessions[login]
+
+            rows.extend((channel, login, totals[login], wall_time) for login in dirty)
+            dirty.clear()
+        return rows
+
+    def _write(self, rows: list[tuple[str, str, float, float]]) -> None:
+        """Write a batch of rows in one transaction (runs on a worker thread)."""
+        with self._db:
+            self._db.executemany(_UPSERT, rows)
+
+    async def flush(self, now: Optional[float] = None) -> int:
+        """Credit open sessions and write every changed total in one transaction.
+
+        Returns:
+            Number of rows written
+        """
+        async with self._flush_lock:
+            if self._db is None:
+                return 0
+
+            rows = self._accrue(time.monotonic() if now is None else now)
+            if not rows:
+                return 0
+
+            start = time.perf_counter()
+            try:
+                await asyncio.to_thread(self._write, rows)
+            except sqlite3.Error as e:
+                # Keep the rows so the next flush writes them again
+                log.error("Writing watch time failed: %s", e)
+                for channel, login, _, _ in rows:
+                    self._dirty[channel].add(login)
+                return 0
+
+            FLUSH_SECONDS.observe(time.perf_counter() - start)
+            FLUSHED_ROWS.inc(len(rows))
+            log.debug("Wrote watch time of %d viewers", len(rows))
+            return len(rows)
+
+    async def run(self) -> None:
+        """Flush on a timer until cancelled."""
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            await self.flush()
+
+    async def close(self) -> None:
+        """Write everything that is left and close the database."""
+        await self.flush()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,281 @@
+# Standard library imports
+import asyncio
+import hmac
+import html
+import os
+from dataclasses import asdict
+from functools import lru_cache
+from typing import Awaitable, Callable, Optional
+
+# Third-party imports
+from aiohttp import web
+
+# Local imports
+from log import get_logger
+from metrics import REGISTRY
+from nuitbot import NuitBot
+from overlay import OVERLAY_PORT
+from songs import read_queue
+from tokens import TWITCH_CLIENT_ID, TWITCH_CLIENT_SECRET, TWITCH_REDIRECT_URI, TokenError
+
+log = get_logger("web")
+
+# Address of the web server (the OAuth callback in TWITCH_REDIRECT_URI must point here)
+WEB_HOST = os.getenv("WEB_HOST", "127.0.0.1")
+WEB_PORT = int(os.getenv("WEB_PORT", "5000"))
+
+# Bearer token required by the control API (empty only allows requests to
+# localhost from localhost)
+CONTROL_TOKEN = os.getenv("CONTROL_TOKEN", "")
+
+# Host names that reach the web server only from this machine
+LOOPBACK_HOSTS = frozenset({"localhost", "127.0.0.1", "::1"})
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "template")
+STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
+
+Handler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+
+@lru_cache(maxsize=None)
+def _template(name: str) -> str:
+    """Read a template once."""
+    with open(os.path.join(TEMPLATE_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+def render(name: str, **values) -> web.Response:
+    """Render a template, filling its "{{ key }}" placeholders with HTML-escaped values.
+
+    Args:
+        name: Template file name
+        values: Placeholder values by name
+
+    Returns:
+        The HTML response
+    """
+    text = _template(name)
+    for key, value in values.items():
+        text = text.replace(f"{{{{ {key} }}}}", html.escape(str(value)))
+    return web.Response(text=text, content_type="text/html")
+
+def _is_local(request: web.Request) -> bool:
+    """Check that a request came from this machine and was addressed to it.
+
+    The Host check keeps out web pages that point their own domain at
+    127.0.0.1 (DNS rebinding).
+    """
+    host = request.url.host or ""
+    return request.remote in LOOPBACK_HOSTS and host.strip("[]") in LOOPBACK_HOSTS
+
+@web.middleware
+async def _control_auth(request: web.Request, handler: Handler) -> web.StreamResponse:
+    """Protect the control API.
+
+    Requests need CONTROL_TOKEN if one is set, and have to come from
+    localhost otherwise. Changes must be sent as JSON and not from another
+    site's page, so a web page the streamer opens cannot send them (CSRF).
+    """
+    if not request.path.startswith("/control"):
+        return await handler(request)
+
+    if CONTROL_TOKEN:
+        given = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if not hmac.compare_digest(given.encode(), CONTROL_TOKEN.encode()):
+            return web.json_response({"error": "unauthorized"}, status=401)
+    elif not _is_local(request):
+        return web.json_response({"error": "set CONTROL_TOKEN to use the control API from other hosts"}, status=403)
+
+    if request.method not in ("GET", "HEAD"):
+        # Browsers only send JSON cross-origin after a preflight, which this server never approves
+        if request.content_type != "application/json":
+            return web.json_response({"error": "send Content-Type: application/json"}, status=415)
+        origin = request.headers.get("Origin")
+        if origin is not None and origin != f"{request.scheme}://{request.host}":
+            return web.json_response({"error": "cross-origin request refused"}, status=403)
+    return await handler(request)
+
+def create_app(bot: NuitBot, on_authorized: Callable[[], None], workers: int = 1) -> web.Application:
+    """Build the web app: OAuth callback, metrics, song queues, overlays, status, chat stats and control API.
+
+    Every handler runs on the bot's event loop, so it can read and change
+    bot state directly.
+
+    Args:
+        bot: The bot the pages show and the control API acts on
+        on_authorized: Called once the OAuth callback stored new tokens
+        workers: Number of worker processes the channels run in (chat stats,
+            chat search and the control API are only available when the bot
+            runs in this process)
+
+    Returns:
+        The app
+    """
+    routes = web.RouteTableDef()
+    joined = frozenset(bot.channels.channels)
+
+    def channel_of(request: web.Request) -> str:
+        """The channel named in the URL, which must be one the bot joins."""
+        channel = request.match_info['channel'].lower()
+        if channel not in joined:
+            raise web.HTTPNotFound(text='{"error": "unknown channel"}', content_type="application/json")
+        return channel
+
+    def limit_of(request: web.Request, default: Optional[int], maximum: int) -> Optional[int]:
+        """The limit query parameter, capped at a maximum. Raises ValueError unless it is a positive number."""
+        if 'limit' not in request.query:
+            return default
+        limit = int(request.query['limit'])
+        if limit < 1:
+            raise ValueError(limit)
+        return min(maximum, limit)
+
+    @routes.get('/callback')
+    async def callback(request: web.Request) -> web.Response:
+        # Get authorization code from URL
+        code = request.query.get('code')
+
+        if not code:
+            return web.Response(text="Error: No authorization code received", status=400)
+
+        # Use the authorization code to get a token (saved to the token store)
+        try:
+            await bot.token(TWITCH_CLIENT_ID, TWITCH_CLIENT_SECRET, code, TWITCH_REDIRECT_URI)
+        except TokenError as e:
+            log.error("Authorization failed: %s", e)
+            return web.Response(text=f"Error: {e}", status=502)
+
+        # Start the bot after getting the token
+        on_authorized()
+
+        return render('success.html')
+
+    @routes.get('/metrics')
+    async def metrics(request: web.Request) -> web.Response:
+        # Prometheus text exposition format
+        return web.Response(
+            body=REGISTRY.render().encode(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    @routes.get('/songs/{channel}')
+    async def songs(request: web.Request) -> web.Response:
+        # Song queue for a stream overlay, first entry is playing
+        channel = channel_of(request)
+        if workers > 1:
+            # The queue lives in a worker process; replay its journal instead
+            queue = await asyncio.to_thread(read_queue, channel)
+        else:
+            queue = bot.song_queue(channel).snapshot()
+        return web.json_response({"channel": channel, "queue": queue})
+
+    @routes.get('/overlay/{key}')
+    async def overlay(request: web.Request) -> web.Response:
+        # OBS browser source showing one overlay value, e.g. /overlay/mentality
+        return render('overlay.html', key=request.match_info['key'], port=OVERLAY_PORT)
+
+    @routes.get('/status')
+    async def status(request: web.Request) -> web.Response:
+        # Health of every connection the bot keeps (empty when the bot runs in worker processes)
+        return web.json_response([asdict(connection) for connection in bot.supervisors.status()])
+
+    @routes.get('/trending/{channel}')
+    async def trending(request: web.Request) -> web.Response:
+        # Most used emotes and words in the channel's recent chat, for an overlay
+        channel = channel_of(request)
+        try:
+            limit = limit_of(request, None, 100)
+        except ValueError:
+            return web.json_response({"error": "limit must be a positive number"}, status=400)
+        return web.json_response({"channel": channel, **bot.analytics.trending(channel, limit)})
+
+    @routes.get('/history/{channel}')
+    async def history(request: web.Request) -> web.Response:
+        # Search a channel's chat, e.g. /history/rheddev?q=mentality&user=someone&since=1700000000
+        try:
+            since = float(request.query['since']) if 'since' in request.query else None
+            until = float(request.query['until']) if 'until' in request.query else None
+            limit = limit_of(request, 100, 1000)
+        except ValueError:
+            return web.json_response({"error": "since and until must be Unix times, limit a positive number"}, status=400)
+
+        channel = channel_of(request)
+        records = await bot.history.search(
+            channel, request.query.get('q', ''), request.query.get('user', '').lower(), since, until, limit,
+        )
+        return web.json_response({"channel": channel, "messages": [record._asdict() for record in records]})
+
+    @routes.get('/control')
+    async def control(request: web.Request) -> web.Response:
+        # What the control API can change
+        return web.json_response({
+            "paused": bot.paused,
+            "commands": len(bot.commands),
+            "effects": {"queued": bot.effects.depth, "running": bot.effects.active},
+            "sounds": sorted(bot.audio.sounds),
+        })
+
+    @routes.post('/control/pause')
+    async def pause(request: web.Request) -> web.Response:
+        # Stop running commands and triggers; chat is still read
+        bot.paused = True
+        log.info("Commands paused")
+        return web.json_response({"paused": True})
+
+    @routes.post('/control/resume')
+    async def resume(request: web.Request) -> web.Response:
+        bot.paused = False
+        log.info("Commands resumed")
+        return web.json_response({"paused": False})
+
+    @routes.post('/control/reload')
+    async def reload(request: web.Request) -> web.Response:
+        # Command plugins and per-channel settings
+        reloaded = bot.reload_config()
+        return web.json_response({"reloaded": reloaded, "commands": len(bot.commands)}, status=200 if reloaded else 500)
+
+    @routes.post('/control/effects/{name}')
+    async def effect(request: web.Request) -> web.Response:
+        # Optional JSON body: {"text": "...", "user": "..."} for the mentality effect
+        name = request.match_info['name']
+        try:
+            options = await request.json() if request.can_read_body else {}
+        except ValueError:
+            options = None
+        if not isinstance(options, dict):
+            return web.json_response({"error": "body must be a JSON object"}, status=400)
+
+        try:
+            queued = bot.trigger_effect(name, str(options.get("text", "")), str(options.get("user", "")))
+        except KeyError:
+            return web.json_response({"error": f"unknown effect: {name}"}, status=404)
+        if not queued:
+            return web.json_response({"effect": name, "queued": False}, status=409)
+        return web.json_response({"effect": name, "queued": True, "queue_depth": bot.effects.depth}, status=202)
+
+    app = web.Application(middlewares=[_control_auth])
+    if workers > 1:
+        # The bots run in the workers, so there is nothing here to control, search or count
+        routes = [route for route in routes if not route.path.startswith(('/control', '/history', '/trending'))]
+    app.add_routes(routes)
+    app.router.add_static('/static', STATIC_DIR)
+    return app
+
+async def serve(app: web.Application, host: str = WEB_HOST, port: int = WEB_PORT) -> web.AppRunner:
+    """Start serving the app on the running event loop.
+
+    Args:
+        app: The app from create_app()
+        host: Address to listen on
+        port: Port to listen on
+
+    Returns:
+        The runner; call its cleanup() to stop serving
+    """
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError:
+        await runner.cleanup()
+        raise
+    log.info("Web server listening on http://%s:%s", host, port)
+    return runner
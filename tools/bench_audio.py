@@ -0,0 +1,104 @@
+"""Trigger-to-first-sample latency benchmark for the audio engine.
+
+Measures how long it takes from AudioEngine.play() until the first audible
+block reaches the sink, using a realtime-paced null sink. For comparison it
+also times the old path, the same `aplay <file>` subprocess the bot used to
+spawn per sound, until aplay reports it has opened the device and starts
+playing (its "Playing WAVE" line, printed just before the first samples
+are written). The old path needs aplay and a default ALSA device.
+
+Usage:
+    python tools/bench_audio.py [--sound mentality] [--runs 50]
+"""
+# Standard library imports
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# Local imports
+from audio import AudioEngine, NullSink, load_sounds
+
+SOUND_DIR = os.path.join(os.path.dirname(__file__), "..", "src", "sound")
+
+class SignallingSink(NullSink):
+    """Null sink that signals a thread event on the first audible block."""
+
+    def __init__(self) -> None:
+        super().__init__(realtime=True)
+        self.audible = threading.Event()
+
+    def write(self, data: bytes) -> None:
+        super().write(data)
+        if self.first_sample_at is not None:
+            self.audible.set()
+
+def report(label: str, samples: list[float]) -> None:
+    """Print latency percentiles in milliseconds."""
+    samples = sorted(samples)
+    p50 = samples[len(samples) // 2] * 1000
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000
+    print(f"{label:<40} p50 {p50:8.3f} ms   p99 {p99:8.3f} ms   mean {statistics.mean(samples) * 1000:8.3f} ms")
+
+async def bench_engine(sound: str, runs: int) -> list[float]:
+    """Time play() until the sink sees the first non-silent block."""
+    start = time.perf_counter()
+    sounds = load_sounds(SOUND_DIR)
+    print(f"Preloaded {len(sounds)} sounds in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    latencies = []
+    for _ in range(runs):
+        sink = SignallingSink()
+        engine = AudioEngine(sounds, sink)
+        engine.start()
+
+        voice = engine.play(sound)
+        # Wait in a thread, so the event loop stays free like in the bot
+        await asyncio.to_thread(sink.audible.wait)
+        latencies.append(sink.first_sample_at - voice.triggered_at)
+
+        voice.stop()
+        engine.stop()
+    return latencies
+
+async def bench_aplay(sound: str, runs: int) -> list[float]:
+    """Time the old path: spawn aplay on the WAV file until it starts playing."""
+    path = os.path.join(SOUND_DIR, f"{sound}.wav")
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = await asyncio.create_subprocess_exec("aplay", path, stderr=asyncio.subprocess.PIPE)
+        try:
+            line = await proc.stderr.readline()
+            if not line.startswith(b"Playing"):
+                raise RuntimeError(f"aplay failed: {(line + await proc.stderr.read()).decode(errors='replace').strip()}")
+            latencies.append(time.perf_counter() - start)
+        finally:
+            if proc.returncode is None:
+                proc.kill()
+            await proc.wait()
+    return latencies
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sound", default="mentality")
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    report("AudioEngine.play -> first sample", await bench_engine(args.sound, args.runs))
+    if shutil.which("aplay") is None:
+        print("aplay not found, skipping the old path")
+        return
+    try:
+        report("aplay spawn -> playing (old path)", await bench_aplay(args.sound, args.runs))
+    except RuntimeError as e:
+        print(f"Skipping the old path: {e}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
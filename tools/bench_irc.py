@@ -0,0 +1,114 @@
+"""Microbenchmark for IRC parsing.
+
+Compares the streaming parser in src/irc.py against the original
+PrivateMessage class that parsed every frame as a single PRIVMSG.
+
+Usage:
+    python tools/bench_irc.py [--messages N] [--lines-per-frame N]
+"""
+# Standard library imports
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# Local imports
+from irc import IrcParser
+
+SAMPLE_LINE = (
+    "@badge-info=subscriber/8;badges=subscriber/6,premium/1;client-nonce=4c2d1b;color=#1E90FF;"
+    "display-name=Viewer{n};emotes=;first-msg=0;flags=;id=6b1c1f7a-0d7e-4d0e-9a7a-{n:012d};mod=0;"
+    "returning-chatter=0;room-id=123456789;subscriber=1;tmi-sent-ts=1700000000000;turbo=0;"
+    "user-id={n};user-type= :viewer{n}!viewer{n}@viewer{n}.tmi.twitch.tv PRIVMSG #rheddev :"
+    "this is message number {n} in the raid mentality."
+)
+
+class LegacyPrivateMessage:
+    """Copy of the original eager PrivateMessage parser, kept for comparison."""
+
+    def __init__(self, message: str):
+        message_without_at = message[1:] if message.startswith("@") else message
+        tags_str, command_str = message_without_at.split(" ", 1)
+
+        tags_list: list[str] = tags_str.split(";")
+        tags_dict: dict[str, str] = dict()
+        for tag in tags_list:
+            if "=" in tag:
+                key, value = tag.split("=", 1)
+                tags_dict[key] = value
+
+        user_part, channel_message_part = command_str.split(" PRIVMSG ", 1)
+        user = user_part[1:].split("!")[0]
+
+        channel_part, message_part = channel_message_part.split(" :", 1)
+        channel = channel_part[1:]
+
+        self.tags = tags_dict
+        self.channel = channel
+        self.user = user
+        self.message = message_part.strip()
+
+def build_frames(messages: int, lines_per_frame: int) -> list[str]:
+    """Build websocket frames that each carry several CRLF-terminated lines."""
+    lines = [SAMPLE_LINE.format(n=n) for n in range(messages)]
+    return [
+        "".join(line + "\r\n" for line in lines[i:i + lines_per_frame])
+        for i in range(0, messages, lines_per_frame)
+    ]
+
+def bench_legacy(frames: list[str]) -> int:
+    """Parse frames line by line with the legacy class, reading the message text."""
+    count = 0
+    for frame in frames:
+        for line in frame.split("\r\n"):
+            if "PRIVMSG" in line:
+                message = LegacyPrivateMessage(line)
+                if message.message.endswith("mentality."):
+                    count += 1
+    return count
+
+def bench_streaming(frames: list[str], tags: str) -> int:
+    """Parse frames with the streaming parser.
+
+    Args:
+        frames: Frames to parse
+        tags: "none" to skip tags, "one" to read display-name, "all" to decode every tag
+    """
+    parser = IrcParser()
+    count = 0
+    for frame in frames:
+        for message in parser.feed(frame):
+            if message.command == "PRIVMSG" and message.message.endswith("mentality."):
+                if tags == "one":
+                    message.tag("display-name")
+                elif tags == "all":
+                    message.tags.get("display-name")
+                count += 1
+    return count
+
+def run(label: str, func, *args, repeat: int = 5) -> None:
+    """Run a benchmark a few times and print the best rate."""
+    best = float("inf")
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = func(*args)
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<32} {count / best:>12,.0f} messages/sec")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--lines-per-frame", type=int, default=8)
+    args = parser.parse_args()
+
+    frames = build_frames(args.messages, args.lines_per_frame)
+    run("legacy PrivateMessage", bench_legacy, frames)
+    run("IrcParser (tags untouched)", bench_streaming, frames, "none")
+    run("IrcParser (display-name only)", bench_streaming, frames, "one")
+    run("IrcParser (all tags decoded)", bench_streaming, frames, "all")
+
+if __name__ == "__main__":
+    main()
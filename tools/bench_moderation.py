@@ -0,0 +1,146 @@
+"""Microbenchmark for the moderation filter.
+
+Compares the Aho-Corasick automaton in src/moderation.py against checking
+every banned phrase with `in`, for growing phrase lists. Both scan the same
+normalized messages and must find the same phrases: the `in` check runs on
+collapsed text, and its hits are confirmed with a per-phrase regex that
+requires each letter to be repeated as in the phrase or stretched.
+Normalization is timed on its own, and a few obfuscated and ordinary words
+are checked first.
+
+Usage:
+    python tools/bench_moderation.py [--messages N] [--phrases 100,1000,10000]
+"""
+# Standard library imports
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# Local imports
+from moderation import Automaton, normalize
+
+REPEATS = re.compile(r"(\w)\1+")
+RUNS = re.compile(r"(.)\1*")
+
+CHAT_WORDS = "hello chat what game is this that was close first time here love the stream gg lol pog".split()
+
+# (phrase, message, whether the message should match)
+CASES = [
+    ("bad", "baaad", True), ("bad", "baad", False), ("bad", "B.A.D", True), ("bad", "b4d", True),
+    ("bad", "bad1", True), ("bad", "bad!!", True), ("ass", "a$$", True), ("ass", "asss", True),
+    ("ass", "as", False), ("god", "good game", False), ("god", "goood game", True), ("bot", "boot", False),
+    ("pop", "poop", False), ("kill", "1 kill", True), ("idiot", "1diot", True),
+]
+
+def build_phrases(count: int, rng: random.Random) -> list[str]:
+    """Made-up banned phrases of one to three words."""
+    def word() -> str:
+        return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9)))
+    return list({" ".join(word() for _ in range(rng.randint(1, 3))) for _ in range(count)})
+
+def build_messages(count: int, phrases: list[str], rng: random.Random) -> list[str]:
+    """Chat messages of a few words; one in fifty contains a phrase, some of them obfuscated."""
+    messages = []
+    for _ in range(count):
+        words = rng.choices(CHAT_WORDS, k=rng.randint(2, 12))
+        if rng.random() < 0.02:
+            phrase = rng.choice(phrases)
+            if rng.random() < 0.5:
+                phrase = phrase.upper().replace("O", "0").replace("E", "3")
+            words.insert(rng.randint(0, len(words)), phrase)
+        messages.append(" ".join(words))
+    return messages
+
+def naive_pattern(phrase: str) -> tuple[str, str, re.Pattern]:
+    """The phrase, its collapsed normalized form, and a regex allowing each letter to be stretched."""
+    pattern = normalize(phrase)
+    regex = ""
+    for match in RUNS.finditer(pattern):
+        char, run = re.escape(match.group(1)), len(match.group())
+        if match.group(1) == " ":
+            regex += char
+        else:
+            repeat = f"{char}{{{run},}}" if run >= 3 else f"(?:{char}{{{run}}}|{char}{{3,}})"
+            regex += f"(?<!{char}){repeat}(?!{char})"
+    return phrase, REPEATS.sub(r"\1", pattern), re.compile(regex)
+
+def bench_naive(texts: list[str], patterns: list[tuple[str, str, re.Pattern]]) -> int:
+    """Check every phrase against every message with `in`, confirming hits with the phrase's regex."""
+    count = 0
+    for text in texts:
+        collapsed = REPEATS.sub(r"\1", text)
+        if [phrase for phrase, pattern, regex in patterns if pattern in collapsed and regex.search(text)]:
+            count += 1
+    return count
+
+def bench_automaton(texts: list[str], automaton: Automaton) -> int:
+    """Scan every message once with the automaton."""
+    count = 0
+    for text in texts:
+        if automaton.scan(text):
+            count += 1
+    return count
+
+def check_cases() -> None:
+    """Check the obfuscated and ordinary words with both methods."""
+    failed = 0
+    for phrase, message, expected in CASES:
+        text = normalize(message)
+        found = bool(Automaton([phrase]).scan(text)), bench_naive([text], [naive_pattern(phrase)]) == 1
+        if found != (expected, expected):
+            failed += 1
+            print(f"  WRONG: {message!r} vs {phrase!r}: automaton {found[0]}, `in` checks {found[1]}, expected {expected}")
+    print(f"cases                            {len(CASES) - failed}/{len(CASES)} as expected")
+
+def run(label: str, func, *args, messages: int, repeat: int = 3) -> int:
+    """Run a benchmark a few times and print the best rate."""
+    best = float("inf")
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = func(*args)
+        best = min(best, time.perf_counter() - start)
+    print(f"  {label:<30} {messages / best:>12,.0f} messages/sec   {best / messages * 1e6:8.2f} us/message")
+    return count
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--phrases", default="100,1000,10000", help="comma-separated phrase list sizes")
+    args = parser.parse_args()
+
+    check_cases()
+    rng = random.Random(1)
+    sizes = [int(size) for size in args.phrases.split(",")]
+    all_phrases = build_phrases(max(sizes), rng)
+    messages = build_messages(args.messages, all_phrases[:min(sizes)], rng)
+
+    start = time.perf_counter()
+    texts = [normalize(message) for message in messages]
+    elapsed = time.perf_counter() - start
+    print(f"normalize                        {len(messages) / elapsed:>12,.0f} messages/sec   {elapsed / len(messages) * 1e6:8.2f} us/message")
+
+    for size in sizes:
+        phrases = all_phrases[:size]
+        start = time.perf_counter()
+        automaton = Automaton(phrases)
+        built = time.perf_counter() - start
+        print(f"{size} phrases (automaton built in {built * 1000:.0f} ms)")
+
+        # Phrases are matched in normalized form, so the naive check gets them that way too
+        patterns = [naive_pattern(phrase) for phrase in phrases]
+        naive = run("per-phrase `in` checks", bench_naive, texts, patterns, messages=len(texts), repeat=1)
+        found = run("Aho-Corasick scan", bench_automaton, texts, automaton, messages=len(texts))
+        if naive != found:
+            print(f"  MISMATCH: `in` checks flagged {naive} messages, the automaton {found}")
+        else:
+            print(f"  both flagged {found} messages")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Local stand-in for the OBS WebSocket v5 server.
+
+Speaks enough of the protocol for the bot: the Hello/Identify handshake
+(with or without a password), single requests (op 6) and RequestBatch
+(op 8). Responses can be delayed by a random amount so they come back out
+of order, and fake events can be pushed in between to exercise the client.
+Every request is recorded with its arrival time.
+
+Usage:
+    python tools/fake_obs.py [--port 4455] [--password secret] [--delay 0.05] [--events 0.5]
+    python tools/fake_obs.py --check
+"""
+# Standard library imports
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from typing import Any
+
+# Third-party imports
+import websockets
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# Local imports
+from obs import ObsClient, generate_auth_response
+
+class FakeObs:
+    """Fake OBS WebSocket server that records every request it receives."""
+
+    def __init__(self, password: str = "", delay: float = 0.0, event_interval: float = 0.0) -> None:
+        """Initialize the fake server.
+
+        Args:
+            password: Password clients must authenticate with ("" disables auth)
+            delay: Maximum random delay before answering a request, in seconds
+            event_interval: Seconds between pushed fake events (0 disables them)
+        """
+        self.password = password
+        self.delay = delay
+        self.event_interval = event_interval
+
+        # (arrival time, requestType, requestData) for every request
+        self.requests: list[tuple[float, str, dict[str, Any]]] = []
+
+    async def _respond(self, ws, message: dict[str, Any]) -> None:
+        """Answer a request after a random delay."""
+        if self.delay:
+            await asyncio.sleep(random.uniform(0, self.delay))
+        await ws.send(json.dumps(message))
+
+    def _record(self, request: dict[str, Any]) -> dict[str, Any]:
+        """Record a request and build its successful result."""
+        request_type = request.get("requestType", "")
+        self.requests.append((time.perf_counter(), request_type, request.get("requestData", {})))
+        return {
+            "requestType": request_type,
+            "requestStatus": {"result": True, "code": 100},
+            "responseData": {},
+        }
+
+    async def _push_events(self, ws) -> None:
+        """Push a fake event at a fixed interval."""
+        while True:
+            await asyncio.sleep(self.event_interval)
+            await ws.send(json.dumps({
+                "op": 5,
+                "d": {"eventType": "CurrentProgramSceneChanged", "eventIntent": 4, "eventData": {"sceneName": "Fake"}},
+            }))
+
+    async def handler(self, ws) -> None:
+        """Handle one client connection."""
+        hello: dict[str, Any] = {"obsWebSocketVersion": "5.0.0", "rpcVersion": 1}
+        challenge = salt = ""
+        if self.password:
+            challenge = os.urandom(16).hex()
+            salt = os.urandom(16).hex()
+            hello["authentication"] = {"challenge": challenge, "salt": salt}
+        await ws.send(json.dumps({"op": 0, "d": hello}))
+
+        identify = json.loads(await ws.recv())
+        expected = generate_auth_response(self.password, challenge, salt) if self.password else None
+        if identify.get("op") != 1 or identify["d"].get("authentication") != expected:
+            await ws.close(4009, "Authentication failed")
+            return
+        await ws.send(json.dumps({"op": 2, "d": {"negotiatedRpcVersion": 1}}))
+
+        events = asyncio.create_task(self._push_events(ws)) if self.event_interval else None
+        tasks = set()
+        try:
+            async for raw in ws:
+                data = json.loads(raw)
+                payload = data.get("d", {})
+                if data.get("op") == 6:
+                    response = self._record(payload)
+                    response["requestId"] = payload.get("requestId")
+                    message = {"op": 7, "d": response}
+                elif data.get("op") == 8:
+                    results = [self._record(request) for request in payload.get("requests", [])]
+                    message = {"op": 9, "d": {"requestId": payload.get("requestId"), "results": results}}
+                else:
+                    continue
+
+                task = asyncio.create_task(self._respond(ws, message))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            if events:
+                events.cancel()
+
+    def serve(self, host: str = "localhost", port: int = 4455):
+        """Create the websocket server. Use as ``async with fake.serve(...)``."""
+        return websockets.serve(self.handler, host, port)
+
+async def check(port: int) -> None:
+    """Run the ObsClient against a fake server with pipelined requests."""
+    fake = FakeObs(password="secret", delay=0.05, event_interval=0.01)
+    async with fake.serve("localhost", port):
+        client = ObsClient(f"ws://localhost:{port}", "secret")
+        events = []
+        client.on_event(lambda event_type, data: events.append(event_type))
+        await client.connect()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            client.request("TriggerHotkeyByKeySequence", {"keyId": "OBS_KEY_SCROLLLOCK", "keyModifiers": {"alt": True}})
+            for _ in range(50)
+        ))
+        elapsed = time.perf_counter() - start
+
+        results = await client.batch([
+            ("SetCurrentProgramScene", {"sceneName": "Mentality"}),
+            ("Sleep", {"sleepMillis": 100}),
+            ("SetCurrentProgramScene", {"sceneName": "Main"}),
+        ])
+        await client.close()
+
+    print(f"50 pipelined requests answered in {elapsed * 1000:.1f} ms")
+    print(f"Batch returned {len(results)} results, {len(events)} events received in between")
+    print(f"Fake OBS recorded {len(fake.requests)} requests")
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=4455)
+    parser.add_argument("--password", default="")
+    parser.add_argument("--delay", type=float, default=0.0, help="max random response delay in seconds")
+    parser.add_argument("--events", type=float, default=0.0, help="seconds between fake events")
+    parser.add_argument("--check", action="store_true", help="run the OBS client against the fake server and exit")
+    args = parser.parse_args()
+
+    if args.check:
+        await check(args.port)
+        return
+
+    fake = FakeObs(args.password, args.delay, args.events)
+    async with fake.serve(args.host, args.port):
+        print(f"Fake OBS listening on ws://{args.host}:{args.port}")
+        await asyncio.Future()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,234 @@
+"""Local stand-in for the Twitch IRC WebSocket server.
+
+Accepts the bot's CAP/PASS/NICK login, acknowledges JOINs (as a moderator,
+so the bot uses the moderator rate limit), answers nothing else, and feeds
+chat to every connection once it has joined. Chat comes either from a
+recording made with TWITCH_RECORD_FILE or is generated at a fixed rate.
+Every line the bot sends is recorded with its arrival time.
+
+Usage:
+    python tools/fake_twitch.py [--port 6667] --replay traffic.jsonl [--speed 2]
+    python tools/fake_twitch.py [--port 6667] --rate 500 [--duration 30]
+
+Then run the bot with TWITCH_WS_URI=ws://localhost:6667.
+"""
+# Standard library imports
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import sys
+import time
+from typing import Optional
+
+# Third-party imports
+import websockets
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# Local imports
+from recorder import read_recording
+
+# Plain chat lines mixed in between commands by the synthetic generator
+CHAT_LINES = [
+    "hello chat",
+    "PogChamp PogChamp",
+    "what game is this?",
+    "LUL",
+    "that was close",
+    "first time here, love the stream",
+]
+
+def privmsg(channel: str, user: str, text: str, mod: bool = False) -> str:
+    """Build a tagged PRIVMSG line as Twitch sends it."""
+    badges = "moderator/1" if mod else ""
+    tags = f"@badges={badges};color=#1E90FF;display-name={user};mod={int(mod)};tmi-sent-ts={int(time.time() * 1000)}"
+    return f"{tags} :{user.lower()}!{user.lower()}@{user.lower()}.tmi.twitch.tv PRIVMSG #{channel} :{text}"
+
+class FakeTwitch:
+    """Fake Twitch IRC server that replays or generates chat."""
+
+    def __init__(self, nick: str = "nuitbot") -> None:
+        """Initialize the fake server.
+
+        Args:
+            nick: Nickname used in the server's replies
+        """
+        self.nick = nick
+        self.connections: set = set()
+        self.joined: dict[str, object] = {}
+        self._all_joined = asyncio.Event()
+        self._expected: set[str] = set()
+
+        # (arrival time, line) for every line the bot sent
+        self.received: list[tuple[float, str]] = []
+        self.sent_lines = 0
+
+    def expect(self, channels: list[str]) -> None:
+        """Set the channels the bot must join before chat starts."""
+        self._expected = {channel.lower().lstrip("#") for channel in channels}
+
+    async def wait_joined(self, timeout: float = 30.0) -> None:
+        """Wait until every expected channel was joined."""
+        await asyncio.wait_for(self._all_joined.wait(), timeout)
+
+    async def handler(self, ws) -> None:
+        """Handle one bot connection."""
+        self.connections.add(ws)
+        try:
+            async for frame in ws:
+                now = time.perf_counter()
+                replies = []
+                for line in frame.split("\r\n"):
+                    if not line:
+                        continue
+                    self.received.append((now, line))
+                    if line.startswith("NICK "):
+                        replies.append(f":tmi.twitch.tv 001 {self.nick} :Welcome, GLHF!")
+                    elif line.startswith("JOIN #"):
+                        channel = line[6:].strip().lower()
+                        self.joined[channel] = ws
+                        replies.append(f":{self.nick}!{self.nick}@{self.nick}.tmi.twitch.tv JOIN #{channel}")
+                        replies.append(f"@badges=moderator/1;mod=1 :tmi.twitch.tv USERSTATE #{channel}")
+                    elif line.startswith("PART #"):
+                        self.joined.pop(line[6:].strip().lower(), None)
+                if replies:
+                    await ws.send("\r\n".join(replies) + "\r\n")
+                if self._expected and self._expected <= set(self.joined):
+                    self._all_joined.set()
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self.connections.discard(ws)
+            for channel, owner in list(self.joined.items()):
+                if owner is ws:
+                    del self.joined[channel]
+
+    async def _send(self, lines: list[str]) -> None:
+        """Send lines to the connections that joined their channels, one frame per connection."""
+        frames: dict[object, list[str]] = {}
+        for line in lines:
+            # "... PRIVMSG #channel :text" -> channel
+            _, _, rest = line.partition(" PRIVMSG #")
+            ws = self.joined.get(rest.partition(" ")[0]) if rest else None
+            if ws is None and len(self.connections) == 1:
+                ws = next(iter(self.connections))
+            if ws is not None:
+                frames.setdefault(ws, []).append(line)
+
+        for ws, batch in frames.items():
+            try:
+                await ws.send("\r\n".join(batch) + "\r\n")
+                self.sent_lines += len(batch)
+            except websockets.exceptions.ConnectionClosed:
+                pass
+
+    async def replay(self, path: str, speed: float = 1.0, rate: float = 0.0) -> None:
+        """Replay a recording.
+
+        Args:
+            path: Recording made with TWITCH_RECORD_FILE
+            speed: Play back this many times faster than recorded
+            rate: If set, ignore the recorded timing and send this many frames per second
+        """
+        previous = 0.0
+        for timestamp, frame in read_recording(path):
+            if rate:
+                await asyncio.sleep(1 / rate)
+            else:
+                # Timestamps restart when several sessions share a file
+                await asyncio.sleep(max(0.0, timestamp - previous) / speed)
+                previous = timestamp
+            await self._send([line for line in frame.split("\r\n") if line and not line.startswith("PING")])
+
+    async def generate(
+        self,
+        channels: list[str],
+        rate: float,
+        duration: float,
+        commands: Optional[list[tuple[float, str]]] = None,
+        tick: float = 0.01,
+    ) -> dict[str, float]:
+        """Send synthetic chat at a fixed rate.
+
+        Lines are sent in one frame per tick, like Twitch batches busy chat.
+
+        Args:
+            channels: Channels to send to, round-robin
+            rate: Messages per second
+            duration: Seconds to keep sending
+            commands: (probability, text) pairs; "{id}" in the text is
+                replaced with a unique id for latency measurement
+            tick: Seconds between frames
+
+        Returns:
+            Send time by message text, for every command sent with an "{id}" placeholder
+        """
+        commands = commands or []
+        sent_at: dict[str, float] = {}
+        ids = itertools.count()
+        users = [f"Viewer{i}" for i in range(500)]
+        channel_cycle = itertools.cycle([channel.lower().lstrip("#") for channel in channels])
+
+        start = time.perf_counter()
+        generated = 0
+        while time.perf_counter() - start < duration:
+            # Catch up on every message due so far, even if a tick ran late
+            count = int((time.perf_counter() - start) * rate) - generated
+            generated += count
+            lines = []
+            for _ in range(count):
+                text = random.choice(CHAT_LINES)
+                roll = random.random()
+                for probability, template in commands:
+                    if roll < probability:
+                        if "{id}" in template:
+                            text = template.replace("{id}", str(next(ids)))
+                            sent_at[text] = time.perf_counter()
+                        else:
+                            text = template
+                        break
+                    roll -= probability
+                lines.append(privmsg(next(channel_cycle), random.choice(users), text))
+            if lines:
+                await self._send(lines)
+            # Sleep to the next tick boundary so slow sends do not drift the rate
+            next_tick = start + (int((time.perf_counter() - start) / tick) + 1) * tick
+            await asyncio.sleep(max(0.0, next_tick - time.perf_counter()))
+        return sent_at
+
+    def serve(self, host: str = "localhost", port: int = 6667):
+        """Create the websocket server. Use as ``async with fake.serve(...)``."""
+        return websockets.serve(self.handler, host, port, max_size=None)
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6667)
+    parser.add_argument("--channel", action="append", default=[], help="channel to send synthetic chat to (repeatable)")
+    parser.add_argument("--replay", help="recording made with TWITCH_RECORD_FILE")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier")
+    parser.add_argument("--rate", type=float, default=0.0, help="messages (or replayed frames) per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of synthetic chat")
+    args = parser.parse_args()
+
+    fake = FakeTwitch()
+    channels = args.channel or ["rheddev"]
+    fake.expect([] if args.replay else channels)
+    async with fake.serve(args.host, args.port):
+        print(f"Fake Twitch listening on ws://{args.host}:{args.port}")
+        while True:
+            # Wait for the bot to (re)connect and join before sending chat
+            while not fake.joined:
+                await asyncio.sleep(0.1)
+            if args.replay:
+                await fake.replay(args.replay, args.speed, args.rate)
+            else:
+                await fake.wait_joined()
+                await fake.generate(channels, args.rate or 10.0, args.duration, [(0.05, "!discord")])
+            print(f"Sent {fake.sent_lines} lines, received {len(fake.received)} lines from the bot")
+            await asyncio.Future()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,211 @@
+"""End-to-end load test: the real bot against local Twitch and OBS stand-ins.
+
+Starts tools/fake_twitch.py and tools/fake_obs.py servers in-process, runs
+NuitBot's real connection loop against them, and sends synthetic chat (or a
+recording) at the requested rate. A share of the chat is "!lt <id>" and
+"!ltobs <id>" commands from tools/loadtest_plugin.py, and the script reports
+command-to-reply and command-to-OBS latency percentiles.
+
+Mixed load: --cpu-share adds "!ltcpu <id>" commands that each burn
+--cpu-ms of CPU in a worker process, and --cpu-inline runs them on the
+event loop instead, to compare what heavy handlers do to everyone else's
+reply latency and to event loop lag.
+
+By default the chat rate limits and the global per-viewer cooldown are
+lifted so the numbers show the bot's own pipeline; pass --rate-limits to
+keep them.
+
+Usage:
+    python tools/loadtest.py [--rate 500] [--duration 10] [--channels 4] [--shards 2]
+    python tools/loadtest.py --replay traffic.jsonl [--speed 10]
+    python tools/loadtest.py --cpu-share 0.02 --cpu-ms 20 [--cpu-inline]
+"""
+# Standard library imports
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+# Third-party imports
+import websockets
+
+TWITCH_PORT = 16667
+OBS_PORT = 14455
+
+def report(label: str, samples: list[float]) -> None:
+    """Print latency percentiles in milliseconds."""
+    if not samples:
+        print(f"{label:<28} no samples")
+        return
+    samples = sorted(samples)
+
+    def percentile(q: float) -> float:
+        return samples[min(len(samples) - 1, int(len(samples) * q))] * 1000
+
+    print(
+        f"{label:<28} n {len(samples):6d}   p50 {percentile(0.5):8.2f} ms   p90 {percentile(0.9):8.2f} ms   "
+        f"p99 {percentile(0.99):8.2f} ms   max {samples[-1] * 1000:8.2f} ms   mean {statistics.mean(samples) * 1000:8.2f} ms"
+    )
+
+def configure(args: argparse.Namespace) -> None:
+    """Point the bot at the stand-ins. Must run before nuitbot is imported."""
+    os.environ.update({
+        "TWITCH_WS_URI": f"ws://localhost:{args.twitch_port}",
+        "OBS_HOST": "localhost",
+        "OBS_PORT": str(args.obs_port),
+        "OBS_PASSWORD": "",
+        "AUDIO_SINK": "null",
+        "NUITBOT_PLUGINS": "plugins.basic,loadtest_plugin",
+        "TWITCH_SHARDS": str(args.shards),
+        "TWITCH_RECORD_FILE": "",
+        "WATCHTIME_DB": ":memory:",
+        "HISTORY_DIR": tempfile.mkdtemp(prefix="nuitbot-history-"),
+        "LOADTEST_CPU_MS": str(args.cpu_ms),
+        "LOADTEST_CPU_INLINE": "1" if args.cpu_inline else "",
+    })
+    if args.offload_workers is not None:
+        os.environ["OFFLOAD_WORKERS"] = str(args.offload_workers)
+    if not args.rate_limits:
+        os.environ["GLOBAL_USER_COOLDOWN"] = "0"
+        os.environ["OFFLOAD_PER_HANDLER"] = os.environ["OFFLOAD_MAX_PENDING"] = "1000000"
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+async def run(args: argparse.Namespace) -> None:
+    # Imported after configure() so the bot reads the overridden environment
+    import nuitbot
+    from fake_obs import FakeObs
+    from fake_twitch import FakeTwitch
+    from log import setup_logging
+    from metrics import REGISTRY
+    from outbound import TokenBucket
+    from recorder import read_recording
+
+    setup_logging(args.log_level)
+    nuitbot.NO_CHANCE = 0
+
+    if args.replay:
+        # Join every channel that appears in the recording
+        channels = sorted({
+            line.partition(" PRIVMSG #")[2].partition(" ")[0]
+            for _, frame in read_recording(args.replay)
+            for line in frame.split("\r\n")
+            if " PRIVMSG #" in line
+        }) or ["rheddev"]
+    else:
+        channels = [f"loadtest{i}" for i in range(args.channels)]
+
+    fake_twitch = FakeTwitch()
+    fake_twitch.expect(channels)
+    fake_obs = FakeObs(delay=args.obs_delay)
+
+    async with fake_obs.serve("localhost", args.obs_port), fake_twitch.serve("localhost", args.twitch_port):
+        bot = nuitbot.NuitBot("nuitbot", channels)
+        if not args.rate_limits:
+            unlimited = TokenBucket(10 ** 9, 1.0)
+            bot.channels.limits.user = unlimited
+            bot.channels.limits.moderator = unlimited
+        bot_task = asyncio.create_task(bot.run())
+
+        await fake_twitch.wait_joined()
+        print(f"Bot joined {len(channels)} channels on {len(bot.channels.shards)} shards")
+
+        start = time.perf_counter()
+        if args.replay:
+            await fake_twitch.replay(args.replay, args.speed, args.rate or 0.0)
+            sent_at: dict[str, float] = {}
+        else:
+            sent_at = await fake_twitch.generate(
+                channels,
+                args.rate or 200.0,
+                args.duration,
+                [(args.command_share, "!lt {id}"), (args.obs_share, "!ltobs {id}"), (args.cpu_share, "!ltcpu {id}")],
+            )
+        elapsed = time.perf_counter() - start
+
+        # Give the bot time to work through its backlog
+        replies_expected = sum(1 for text in sent_at if text.startswith("!lt "))
+        cpu_expected = sum(1 for text in sent_at if text.startswith("!ltcpu "))
+        obs_expected = len(sent_at) - replies_expected - cpu_expected
+        deadline = time.perf_counter() + args.drain
+        while time.perf_counter() < deadline:
+            replies = sum(1 for _, line in fake_twitch.received if " :lt " in line)
+            cpu_replies = sum(1 for _, line in fake_twitch.received if " :ltcpu " in line)
+            if replies >= replies_expected and cpu_replies >= cpu_expected and len(fake_obs.requests) >= obs_expected:
+                break
+            await asyncio.sleep(0.05)
+
+        bot._signal_handler()
+        try:
+            await asyncio.wait_for(bot_task, 15)
+        except (asyncio.TimeoutError, websockets.exceptions.WebSocketException):
+            bot_task.cancel()
+
+    # Command-to-reply: match "lt <id>" replies to "!lt <id>" commands
+    def latencies(command: str) -> list[float]:
+        # Match "<command> <id>" replies to "!<command> <id>" commands
+        samples = []
+        for received_at, line in fake_twitch.received:
+            _, sep, text = line.partition(f" :{command} ")
+            if sep and f"!{command} {text}" in sent_at:
+                samples.append(received_at - sent_at[f"!{command} {text}"])
+        return samples
+
+    reply_latencies = latencies("lt")
+    cpu_latencies = latencies("ltcpu")
+
+    # Command-to-OBS: requests arrive in the order the commands were handled
+    obs_sent = sorted(sent_at_time for text, sent_at_time in sent_at.items() if text.startswith("!ltobs "))
+    obs_received = [received_at for received_at, request_type, _ in fake_obs.requests if request_type == "TriggerHotkeyByKeySequence"]
+    obs_latencies = [received_at - sent for sent, received_at in zip(obs_sent, obs_received)]
+
+    print(f"Sent {fake_twitch.sent_lines} chat lines in {elapsed:.1f} s ({fake_twitch.sent_lines / elapsed:.0f} msg/s)")
+    print(f"Bot sent {sum(1 for _, line in fake_twitch.received if line.startswith('PRIVMSG '))} chat lines")
+    report("command -> reply", reply_latencies)
+    report("command -> OBS request", obs_latencies)
+    if cpu_expected:
+        report(f"ltcpu -> reply ({'inline' if args.cpu_inline else 'offloaded'})", cpu_latencies)
+    if len(reply_latencies) < replies_expected or len(obs_latencies) < obs_expected or len(cpu_latencies) < cpu_expected:
+        print(
+            f"Missing: {replies_expected - len(reply_latencies)} replies, {obs_expected - len(obs_latencies)} OBS requests, "
+            f"{cpu_expected - len(cpu_latencies)} cpu command replies"
+        )
+
+    parse = REGISTRY.get("nuitbot_irc_parse_seconds")
+    lag = REGISTRY.get("nuitbot_event_loop_lag_seconds")
+    print(f"Bot metrics: parse p99 <= {parse.quantile(0.99) * 1000:.2f} ms per frame, event loop lag p99 <= {lag.quantile(0.99) * 1000:.2f} ms")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, help="chat messages per second (default 200), or replayed frames per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of synthetic chat")
+    parser.add_argument("--channels", type=int, default=1, help="number of synthetic channels")
+    parser.add_argument("--shards", type=int, default=1, help="IRC connections to spread channels over")
+    parser.add_argument("--command-share", type=float, default=0.05, help="share of chat that is a !lt command")
+    parser.add_argument("--obs-share", type=float, default=0.01, help="share of chat that is a !ltobs command")
+    parser.add_argument("--cpu-share", type=float, default=0.0, help="share of chat that is a CPU-heavy !ltcpu command")
+    parser.add_argument("--cpu-ms", type=float, default=20.0, help="milliseconds of CPU each !ltcpu burns")
+    parser.add_argument("--cpu-inline", action="store_true", help="run !ltcpu on the event loop instead of a worker process")
+    parser.add_argument("--offload-workers", type=int, help="worker processes for CPU-bound commands (default OFFLOAD_WORKERS)")
+    parser.add_argument("--obs-delay", type=float, default=0.0, help="max random fake OBS response delay in seconds")
+    parser.add_argument("--replay", help="replay a recording made with TWITCH_RECORD_FILE instead of synthetic chat")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier")
+    parser.add_argument("--rate-limits", action="store_true", help="keep Twitch's chat rate limits and the global cooldown")
+    parser.add_argument("--drain", type=float, default=10.0, help="max seconds to wait for outstanding replies")
+    parser.add_argument("--twitch-port", type=int, default=TWITCH_PORT)
+    parser.add_argument("--obs-port", type=int, default=OBS_PORT)
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    configure(args)
+    try:
+        asyncio.run(run(args))
+    finally:
+        shutil.rmtree(os.environ["HISTORY_DIR"], ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
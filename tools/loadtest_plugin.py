@@ -0,0 +1,44 @@
+"""Commands used by tools/loadtest.py to measure end-to-end latency.
+
+Loaded as a regular command plugin (NUITBOT_PLUGINS=plugins.basic,loadtest_plugin)
+with the tools directory on sys.path. Not meant for real channels.
+"""
+# Standard library imports
+import os
+import time
+
+# Local imports
+from commands import CommandContext, CommandRegistry
+
+# Milliseconds of CPU each "!ltcpu" burns, and whether it runs on the event
+# loop (an ordinary handler) instead of in a worker process
+CPU_MS = float(os.getenv("LOADTEST_CPU_MS", "20"))
+CPU_INLINE = os.getenv("LOADTEST_CPU_INLINE", "") == "1"
+
+async def echo(bot, message, args):
+    """Reply with the message id, so the reply can be matched to the command."""
+    await bot.reply(message, f"lt {args}")
+
+async def obs_hotkey(bot, message, args):
+    """Trigger an OBS hotkey, like the effect commands do."""
+    await bot.obs.trigger_hotkey("OBS_KEY_F13")
+
+def burn(args: str, context: CommandContext) -> str:
+    """Keep the CPU busy for CPU_MS, like a heavy handler, then reply with the message id."""
+    end = time.perf_counter() + CPU_MS / 1000
+    while time.perf_counter() < end:
+        pass
+    return f"ltcpu {args}"
+
+async def burn_inline(bot, message, args):
+    """The same work on the event loop, for comparison."""
+    await bot.reply(message, burn(args, None))
+
+def setup(registry: CommandRegistry) -> None:
+    """Register the load-test commands."""
+    registry.register("lt", echo)
+    registry.register("ltobs", obs_hotkey)
+    if CPU_INLINE:
+        registry.register("ltcpu", burn_inline)
+    else:
+        registry.register("ltcpu", burn, cpu_bound=True)